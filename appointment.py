@@ -4,11 +4,16 @@ Appointment class for the Hospital Management System
 """
 
 from typing import Dict
+from record import Record
 
 
-class Appointment:
+class Appointment(Record):
     """Appointment class for scheduling patient-doctor meetings"""
     
+    # Serialized field order, shared by to_dict and to_record
+    FIELDS = ('appointment_id', 'patient_id', 'doctor_id', 'date', 'time',
+              'status')
+    
     def __init__(self, appointment_id: int, patient_id: int, doctor_id: int, 
                  date: str, time: str):
         self._appointment_id = appointment_id
@@ -30,23 +35,43 @@ class Appointment:
     def doctor_id(self):
         return self._doctor_id
     
+    @property
+    def date(self):
+        return self._date
+    
+    @property
+    def time(self):
+        return self._time
+    
     @property
     def status(self):
         return self._status
     
     def cancel_appointment(self):
         """Cancel the appointment"""
+        self.before_change()
         self._status = "Cancelled"
+        self.mark_dirty()
     
     def complete_appointment(self):
         """Mark appointment as completed"""
+        self.before_change()
         self._status = "Completed"
+        self.mark_dirty()
     
     def reschedule(self, new_date: str, new_time: str):
         """Reschedule the appointment"""
+        self.before_change()
         self._date = new_date
         self._time = new_time
         self._status = "Rescheduled"
+        self.mark_dirty()
+    
+    def reassign_patient(self, patient_id: int):
+        """Move this appointment to another patient, e.g. when merging duplicates"""
+        self.before_change()
+        self._patient_id = patient_id
+        self.mark_dirty()
     
     def display_details(self) -> str:
         """Display appointment details"""
@@ -79,3 +104,17 @@ class Appointment:
         )
         appointment._status = data.get('status', 'Scheduled')
         return appointment
+    
+    def to_record(self) -> tuple:
+        """Convert appointment object to a compact tuple in FIELDS order"""
+        return (self._appointment_id, self._patient_id, self._doctor_id,
+                self._date, self._time, self._status)
+    
+    @staticmethod
+    def from_record(record) -> 'Appointment':
+        """Create appointment object from a tuple produced by to_record"""
+        appointment = Appointment.__new__(Appointment)
+        (appointment._appointment_id, appointment._patient_id,
+         appointment._doctor_id, appointment._date, appointment._time,
+         appointment._status) = record
+        return appointment
@@ -0,0 +1,314 @@
+"""
+Read-only archive of closed appointments and paid bills
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from appointment import Appointment
+from billing import Billing
+
+
+class ArchiveFile:
+    """Fixed-width records in a memory-mapped file with in-memory offset indexes.
+
+    Records are never turned into objects in bulk: lookups by id or by an
+    indexed column bisect compact sorted arrays and decode only the rows
+    they return. Subclasses define the row layout.
+    """
+
+    MAGIC = b"MCARCH"
+    VERSION = 1
+    _header = struct.Struct("<6sHI")
+
+    # Row layout, struct prefix covering id + indexed columns, column names
+    ROW: struct.Struct = None
+    PREFIX: struct.Struct = None
+    INDEXED: tuple = ()
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._count = 0
+        # (sorted keys, matching row numbers) per index
+        self._ids = (array('I'), array('I'))
+        self._indexes = {name: (array('I'), array('I')) for name in self.INDEXED}
+        self.max_id = 0
+        self._open()
+
+    # ==================== ROW LAYOUT ====================
+
+    def to_row(self, entity) -> Optional[bytes]:
+        """Encode an entity, or return None if it does not fit the layout"""
+        raise NotImplementedError
+
+    def from_row(self, row: tuple):
+        """Create a detached entity from an unpacked row"""
+        raise NotImplementedError
+
+    def _summarize(self, prefix: tuple):
+        """Update running totals from the prefix of one row"""
+
+    @staticmethod
+    def _text(value: str, width: int) -> Optional[bytes]:
+        encoded = value.encode('utf-8')
+        return encoded if len(encoded) <= width else None
+
+    @staticmethod
+    def _str(raw: bytes) -> str:
+        return raw.rstrip(b"\x00").decode('utf-8')
+
+    # ==================== FILE ====================
+
+    def _open(self):
+        if not os.path.exists(self._path):
+            return
+        self._file = open(self._path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size <= self._header.size:
+            return
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, row_size = self._header.unpack_from(self._map, 0)
+        if magic != self.MAGIC or row_size != self.ROW.size:
+            raise ValueError(f"Not a compatible archive file: {self._path}")
+        # A torn append at the end is ignored
+        self._count = (size - self._header.size) // self.ROW.size
+        self._build_indexes()
+
+    def _build_indexes(self):
+        columns = [array('I') for _ in range(1 + len(self.INDEXED))]
+        body = memoryview(self._map)[self._header.size:
+                                     self._header.size + self._count * self.ROW.size]
+        prefix_fmt = self.PREFIX.format + f"{self.ROW.size - self.PREFIX.size}x"
+        for prefix in struct.iter_unpack(prefix_fmt, body):
+            for column, value in zip(columns, prefix):
+                column.append(value)
+            self._summarize(prefix)
+        body.release()
+        self._ids = self._sorted(columns[0])
+        if columns[0]:
+            self.max_id = max(columns[0])
+        for name, column in zip(self.INDEXED, columns[1:]):
+            self._indexes[name] = self._sorted(column)
+
+    @staticmethod
+    def _sorted(keys: array) -> tuple:
+        rows = array('I', range(len(keys)))
+        if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+            rows = array('I', sorted(rows, key=keys.__getitem__))
+            keys = array('I', (keys[r] for r in rows))
+        return keys, rows
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, entities: list) -> list:
+        """Append entities durably; returns the ones that were archived"""
+        rows = []
+        archived = []
+        for entity in entities:
+            row = self.to_row(entity)
+            if row is not None:
+                rows.append(row)
+                archived.append(entity)
+        if not rows:
+            return archived
+        new_file = not os.path.exists(self._path) or os.path.getsize(self._path) == 0
+        self.close()
+        try:
+            with open(self._path, 'ab') as f:
+                if new_file:
+                    f.write(self._header.pack(self.MAGIC, self.VERSION, self.ROW.size))
+                else:
+                    # Drop a torn row left by an interrupted append
+                    f.truncate(self._header.size + self._count * self.ROW.size)
+                f.write(b"".join(rows))
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            self._count = 0
+            self._indexes = {name: (array('I'), array('I')) for name in self.INDEXED}
+            self._ids = (array('I'), array('I'))
+            self._reset_totals()
+            self._open()
+        return archived
+
+    def _reset_totals(self):
+        """Clear running totals before indexes are rebuilt"""
+
+    # ==================== QUERIES ====================
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def row_offset(self, row_number: int) -> int:
+        """Byte offset of a row in the file, for readers mapping it themselves"""
+        return self._header.size + row_number * self.ROW.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, record_id: int) -> bool:
+        keys, _ = self._ids
+        i = bisect_left(keys, record_id)
+        return i < len(keys) and keys[i] == record_id
+
+    def _row(self, row_number: int):
+        offset = self._header.size + row_number * self.ROW.size
+        return self.from_row(self.ROW.unpack_from(self._map, offset))
+
+    def get(self, record_id: int):
+        """Get a detached copy of an archived record by id"""
+        keys, rows = self._ids
+        i = bisect_left(keys, record_id)
+        if i < len(keys) and keys[i] == record_id:
+            return self._row(rows[i])
+        return None
+
+    def find(self, column: str, value: int) -> list:
+        """Get detached copies of every archived record with column == value"""
+        keys, rows = self._indexes[column]
+        start = bisect_left(keys, value)
+        end = bisect_right(keys, value, start)
+        return [self._row(r) for r in sorted(rows[start:end])]
+
+    def __iter__(self) -> Iterator:
+        """Decode archived records one at a time, in archive order"""
+        for row_number in range(self._count):
+            yield self._row(row_number)
+
+    def iter_ordered(self, after: Optional[int] = None,
+                     descending: bool = False) -> Iterator:
+        """Decode archived records one at a time in id order, starting past `after`"""
+        keys, rows = self._ids
+        if descending:
+            end = len(keys) if after is None else bisect_left(keys, after)
+            for i in range(end - 1, -1, -1):
+                yield self._row(rows[i])
+        else:
+            start = 0 if after is None else bisect_right(keys, after)
+            for i in range(start, len(keys)):
+                yield self._row(rows[i])
+
+
+class AppointmentArchive(ArchiveFile):
+    """Completed and cancelled appointments"""
+
+    ROW = struct.Struct("<III32s16s12s")
+    PREFIX = struct.Struct("<III")
+    INDEXED = ('patient_id', 'doctor_id')
+    STATUSES = ("Completed", "Cancelled")
+
+    def __init__(self, path: str):
+        # (doctor id, date as stored) -> completed appointments, counted on first use
+        self._completed_by_day: Optional[Dict[Tuple[int, str], int]] = None
+        super().__init__(path)
+
+    def _reset_totals(self):
+        self._completed_by_day = None
+
+    def completed_by_day(self) -> Dict[Tuple[int, str], int]:
+        """Completed appointments per doctor and date, from one pass over the rows"""
+        if self._completed_by_day is None:
+            counts: Dict[Tuple[int, str], int] = {}
+            if self._count:
+                body = memoryview(self._map)[self._header.size:
+                                             self._header.size + self._count * self.ROW.size]
+                for row in self.ROW.iter_unpack(body):
+                    if row[5].rstrip(b"\x00") == b"Completed":
+                        key = (row[2], self._str(row[3]))
+                        counts[key] = counts.get(key, 0) + 1
+                body.release()
+            self._completed_by_day = counts
+        return self._completed_by_day
+
+    def to_row(self, appointment: Appointment) -> Optional[bytes]:
+        date = self._text(appointment.date, 32)
+        time = self._text(appointment.time, 16)
+        if date is None or time is None:
+            return None
+        return self.ROW.pack(appointment.appointment_id, appointment.patient_id,
+                             appointment.doctor_id, date, time,
+                             appointment.status.encode('utf-8'))
+
+    def from_row(self, row: tuple) -> Appointment:
+        return Appointment.from_record((row[0], row[1], row[2], self._str(row[3]),
+                                        self._str(row[4]), self._str(row[5])))
+
+
+class BillArchive(ArchiveFile):
+    """Paid bills"""
+
+    ROW = struct.Struct("<IIddd20s8s")
+    PREFIX = struct.Struct("<IId")
+    INDEXED = ('patient_id',)
+
+    def __init__(self, path: str):
+        self.revenue = 0.0
+        # patient id -> total of that patient's archived bills
+        self.paid_by_patient: Dict[int, float] = {}
+        super().__init__(path)
+
+    def _summarize(self, prefix: tuple):
+        self.revenue += prefix[2]
+        self.paid_by_patient[prefix[1]] = self.paid_by_patient.get(prefix[1], 0.0) + prefix[2]
+
+    def _reset_totals(self):
+        self.revenue = 0.0
+        self.paid_by_patient = {}
+
+    def to_row(self, bill: Billing) -> Optional[bytes]:
+        date = self._text(bill.date, 20)
+        if date is None:
+            return None
+        return self.ROW.pack(bill.bill_id, bill.patient_id, bill.total,
+                             bill._consultation_fee, bill._medication_fee,
+                             date, bill.payment_status.encode('utf-8'))
+
+    def from_row(self, row: tuple) -> Billing:
+        return Billing.from_record((row[0], row[1], row[3], row[4], row[2],
+                                    self._str(row[5]), self._str(row[6])))
+
+
+class Archive:
+    """Archival tier holding closed appointments and paid bills"""
+
+    def __init__(self, base_path: str):
+        self.appointments = AppointmentArchive(base_path + ".appointments.archive")
+        self.bills = BillArchive(base_path + ".bills.archive")
+
+    @staticmethod
+    def is_closed_appointment(appointment: Appointment) -> bool:
+        return appointment.status in AppointmentArchive.STATUSES
+
+    @staticmethod
+    def is_closed_bill(bill: Billing) -> bool:
+        return bill.payment_status == "Paid"
+
+    def close(self):
+        self.appointments.close()
+        self.bills.close()
+
+    def counts(self) -> dict:
+        """Number of archived records per section"""
+        return {'appointments': len(self.appointments), 'bills': len(self.bills)}
+
+    def archived_ids(self, section: str, records: List) -> set:
+        """Ids among the given active records that are already archived"""
+        archive = self.appointments if section == 'appointments' else self.bills
+        if not len(archive):
+            return set()
+        id_attr = 'appointment_id' if section == 'appointments' else 'bill_id'
+        return {getattr(r, id_attr) for r in records
+                if getattr(r, id_attr) in archive}
@@ -0,0 +1,294 @@
+"""
+Append-only audit log of every change, with per-record offset indexes
+"""
+
+import marshal
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from encryption import SALT_SIZE, DecryptionError, RecordCipher
+from events import OPERATIONS
+from serializers import SECTIONS
+
+
+# Section codes stored in entries; new sections may only be appended
+AUDIT_SECTIONS = ('patients', 'doctors', 'appointments', 'bills', 'payments', 'invoices')
+# Size at which the active segment is sealed and a new one started
+SEGMENT_BYTES = 16 * 1024 * 1024
+
+
+class AuditLog:
+    """Segmented log of (time, actor, operation, record, changed values) entries.
+
+    Each entry is a fixed 18-byte header (body length, section, operation,
+    record id, timestamp) followed by a marshalled (actor, values) body,
+    where values pairs field positions with new values; segments started
+    while `encrypt()` is true have their bodies encrypted. Entries are buffered and
+    written out by flush(), which the system calls on every save, so
+    auditing adds no writes of its own.
+
+    Once a segment reaches `segment_bytes` it is sealed with an index file
+    of sorted (section, record id) keys and entry offsets, so a record's
+    history bisects each segment's index and reads only its own entries.
+    The active segment's index lives in memory and is rebuilt from that
+    one segment on open. With `max_segments`, the oldest sealed segments
+    are deleted beyond that count.
+    """
+
+    MAGIC = b"MCAUDT"
+    INDEX_MAGIC = b"MCAIDX"
+    VERSION = 1
+    # magic, version, flags (1 = encrypted), salt
+    _header = struct.Struct(f"<6sHH{SALT_SIZE}s")
+    _entry = struct.Struct("<IBBId")
+    _index_header = struct.Struct("<6sHI")
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES,
+                 max_segments: Optional[int] = None, passphrase: Optional[str] = None,
+                 encrypt: Callable[[], bool] = lambda: False):
+        self._directory = directory
+        self._segment_bytes = segment_bytes
+        self._max_segments = max_segments
+        self._passphrase = passphrase
+        # Asked when a segment starts, so it follows the data file format
+        self._encrypt = encrypt
+        self._lock = threading.RLock()
+        self._opened = False
+        self._file = None
+        self._segment = 0
+        self._size = 0
+        self._cipher: Optional[RecordCipher] = None
+        # Active segment: key -> offsets of its entries
+        self._active: Dict[int, List[int]] = {}
+        # Sealed segment -> (sorted keys, offsets), read on first lookup
+        self._indexes: Dict[int, Tuple[array, array]] = {}
+        self._ciphers: Dict[int, Optional[RecordCipher]] = {}
+        self.entries = 0
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def segments(self) -> List[int]:
+        """Numbers of the segments on disk, oldest first"""
+        if not os.path.isdir(self._directory):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(self._directory)
+                      if name.endswith(".log") and name[:-4].isdigit())
+
+    # ==================== WRITING ====================
+
+    def append(self, section: str, record_ids: List[int], operation: str, actor: str,
+               values: List[tuple], timestamp: float):
+        """Log one operation on several records.
+
+        values[i] holds the (field position, new value) pairs of record_ids[i].
+        """
+        section_code = AUDIT_SECTIONS.index(section)
+        operation_code = OPERATIONS.index(operation)
+        with self._lock:
+            if not self._opened:
+                self._open()
+            for record_id, changed in zip(record_ids, values):
+                body = marshal.dumps((actor, changed))
+                if self._cipher is not None:
+                    body = self._cipher.encrypt(body, section, record_id)
+                entry = self._entry.pack(len(body), section_code, operation_code,
+                                         record_id, timestamp) + body
+                key = section_code << 32 | record_id
+                self._active.setdefault(key, []).append(self._size)
+                self._file.write(entry)
+                self._size += len(entry)
+                self.entries += 1
+                if self._size >= self._segment_bytes:
+                    self._rotate()
+
+    def flush(self, fsync: bool = True):
+        """Write buffered entries out, e.g. together with a data save"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                if fsync:
+                    os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self.flush()
+                self._file.close()
+                self._file = None
+            self._opened = False
+
+    def _open(self):
+        os.makedirs(self._directory, exist_ok=True)
+        segments = self.segments()
+        self._segment = segments[-1] if segments else 1
+        path = self._path(self._segment)
+        if not segments or os.path.getsize(path) < self._header.size:
+            self._start(path)
+            self._opened = True
+            return
+        self._cipher = self._segment_cipher(self._segment)
+        self._active, end = self._scan(self._segment)
+        self._file = open(path, 'r+b', buffering=1 << 16)
+        # Drop a torn entry left by a crash mid-write
+        self._file.truncate(end)
+        self._file.seek(end)
+        self._size = end
+        self._opened = True
+        if self._encrypt() != (self._cipher is not None):
+            # The data file was encrypted or decrypted since; follow it
+            self._rotate()
+
+    def _start(self, path: str):
+        encrypt = self._encrypt()
+        if encrypt and not self._passphrase:
+            raise DecryptionError("Cannot encrypt the audit log without a passphrase")
+        salt = os.urandom(SALT_SIZE) if encrypt else bytes(SALT_SIZE)
+        self._cipher = RecordCipher(self._passphrase, salt) if encrypt else None
+        self._ciphers[self._segment] = self._cipher
+        self._file = open(path, 'wb', buffering=1 << 16)
+        self._file.write(self._header.pack(self.MAGIC, self.VERSION, int(encrypt), salt))
+        self._size = self._header.size
+        self._active = {}
+
+    def _rotate(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._write_index(self._segment, self._active)
+        self._segment += 1
+        self._start(self._path(self._segment))
+        if self._max_segments is not None:
+            for old in self.segments()[:-self._max_segments]:
+                for path in (self._path(old), self._index_path(old)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                self._indexes.pop(old, None)
+                self._ciphers.pop(old, None)
+
+    def _write_index(self, segment: int, index: Dict[int, List[int]]) -> Tuple[array, array]:
+        keys = array('Q')
+        offsets = array('I')
+        for key in sorted(index):
+            for offset in index[key]:
+                keys.append(key)
+                offsets.append(offset)
+        path = self._index_path(segment)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(self._index_header.pack(self.INDEX_MAGIC, self.VERSION, len(keys)))
+            keys.tofile(f)
+            offsets.tofile(f)
+        os.replace(path + ".tmp", path)
+        self._indexes[segment] = (keys, offsets)
+        return keys, offsets
+
+    # ==================== READING ====================
+
+    def history(self, section: str, record_id: int) -> List[dict]:
+        """Every logged change of one record, oldest first"""
+        key = AUDIT_SECTIONS.index(section) << 32 | record_id
+        found = []
+        with self._lock:
+            if not self._opened:
+                if not self.segments():
+                    return []
+                self._open()
+            self._file.flush()
+            for segment in self.segments():
+                if segment == self._segment:
+                    offsets = self._active.get(key, [])
+                else:
+                    keys, all_offsets = self._index(segment)
+                    offsets = all_offsets[bisect_left(keys, key):bisect_right(keys, key)]
+                if offsets:
+                    found.extend(self._read(segment, offsets))
+        return found
+
+    def _index(self, segment: int) -> Tuple[array, array]:
+        index = self._indexes.get(segment)
+        if index is not None:
+            return index
+        path = self._index_path(segment)
+        keys = array('Q')
+        offsets = array('I')
+        try:
+            with open(path, 'rb') as f:
+                magic, _, count = self._index_header.unpack(f.read(self._index_header.size))
+                if magic != self.INDEX_MAGIC:
+                    raise ValueError(f"Not an audit index file: {path}")
+                keys.fromfile(f, count)
+                offsets.fromfile(f, count)
+        except FileNotFoundError:
+            # Sealed by a run that stopped before writing the index
+            return self._write_index(segment, self._scan(segment)[0])
+        index = self._indexes[segment] = (keys, offsets)
+        return index
+
+    def _read(self, segment: int, offsets) -> List[dict]:
+        cipher = self._segment_cipher(segment)
+        entries = []
+        with open(self._path(segment), 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                length, section_code, operation_code, record_id, timestamp = \
+                    self._entry.unpack(f.read(self._entry.size))
+                section = AUDIT_SECTIONS[section_code]
+                body = f.read(length)
+                if cipher is not None:
+                    body = cipher.decrypt(body, section, record_id)
+                actor, changed = marshal.loads(body)
+                fields = SECTIONS[section].FIELDS
+                entries.append({
+                    'time': datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+                    'timestamp': timestamp,
+                    'actor': actor,
+                    'operation': OPERATIONS[operation_code],
+                    'section': section,
+                    'record_id': record_id,
+                    'changes': {fields[position]: value for position, value in changed}
+                })
+        return entries
+
+    def _scan(self, segment: int) -> Tuple[Dict[int, List[int]], int]:
+        """Index of a segment read from its entries, and where the last whole one ends"""
+        index: Dict[int, List[int]] = {}
+        with open(self._path(segment), 'rb') as f:
+            raw = f.read()
+        pos = self._header.size
+        while pos + self._entry.size <= len(raw):
+            length, section_code, _, record_id, _ = self._entry.unpack_from(raw, pos)
+            end = pos + self._entry.size + length
+            if end > len(raw):
+                break
+            index.setdefault(section_code << 32 | record_id, []).append(pos)
+            pos = end
+        return index, min(pos, len(raw))
+
+    def _segment_cipher(self, segment: int) -> Optional[RecordCipher]:
+        if segment in self._ciphers:
+            return self._ciphers[segment]
+        with open(self._path(segment), 'rb') as f:
+            magic, _, flags, salt = self._header.unpack(f.read(self._header.size))
+        if magic != self.MAGIC:
+            raise ValueError(f"Not an audit log segment: {self._path(segment)}")
+        cipher = None
+        if flags & 1:
+            if not self._passphrase:
+                raise DecryptionError("The audit log is encrypted; a passphrase is needed")
+            cipher = RecordCipher(self._passphrase, salt)
+        self._ciphers[segment] = cipher
+        return cipher
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self._directory, f"{segment:06d}.log")
+
+    def _index_path(self, segment: int) -> str:
+        return os.path.join(self._directory, f"{segment:06d}.idx")
@@ -0,0 +1,1115 @@
+"""
+Benchmarks for MediCare Hospital Management System
+Run: python benchmark.py <benchmark> [--records N]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from patient import Patient
+from doctor import Doctor
+from appointment import Appointment
+from billing import Billing
+from payment import Payment
+
+
+# Passphrase for benchmarks of the encrypted format
+BENCH_PASSPHRASE = "benchmark"
+
+
+def build_dataset(records: int, seed: int = 42) -> dict:
+    """Build a synthetic dataset with `records` patients, appointments and bills"""
+    rng = random.Random(seed)
+    diseases = ["Diabetes", "Hypertension", "Asthma", "Migraine", "Flu",
+                "Arthritis", "Bronchitis", "Anemia"]
+    statuses = ["Scheduled", "Completed", "Cancelled", "Rescheduled"]
+    doctors = [Doctor(i, f"Doctor {i}", rng.randint(30, 65), "M",
+                      f"0300{i:07d}", rng.choice(["Cardiology", "Neurology",
+                                                  "Pediatrics", "General"]),
+                      "Mon-Fri")
+               for i in range(1, max(2, records // 100) + 1)]
+    patients = []
+    for i in range(1, records + 1):
+        p = Patient(i, f"Patient {i}", rng.randint(1, 90), rng.choice("MF"),
+                    f"0321{i:07d}", rng.choice(diseases))
+        patients.append(p)
+    appointments = []
+    for i in range(1, records + 1):
+        a = Appointment(i, rng.randint(1, records), rng.randint(1, len(doctors)),
+                        f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-2026",
+                        f"{rng.randint(9, 16):02d}:00")
+        a._status = rng.choice(statuses)
+        appointments.append(a)
+    bills = []
+    for i in range(1, records + 1):
+        b = Billing(i, rng.randint(1, records), float(rng.randint(10, 200)),
+                    float(rng.randint(0, 500)))
+        b._date = f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:00"
+        if rng.random() < 0.7:
+            b._payment_status = "Paid"
+        bills.append(b)
+    # Partial payments on a third of the unpaid bills
+    payments = []
+    for b in bills:
+        if b.payment_status != "Paid" and rng.random() < 0.33:
+            p = Payment(len(payments) + 1, b.bill_id, b.patient_id, round(b.total / 2, 2))
+            p._date = b.date
+            payments.append(p)
+    return {'patients': patients, 'doctors': doctors,
+            'appointments': appointments, 'bills': bills, 'payments': payments,
+            'invoices': []}
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def bench_serialization(records: int):
+    """Compare save/load speed and size of every data file format"""
+    from serializers import (SERIALIZERS, SECTIONS, JsonSerializer, detect_serializer,
+                             get_serializer)
+
+    data = build_dataset(records)
+
+    def legacy_save():
+        return json.dumps({name: [e.to_dict() for e in data[name]]
+                           for name in SECTIONS}, indent=2).encode('utf-8')
+
+    def legacy_load(raw):
+        loaded = json.loads(raw)
+        return {name: [cls.from_dict(d) for d in loaded[name]]
+                for name, cls in SECTIONS.items()}
+
+    print(f"Serialization benchmark: {records} patients/appointments/bills")
+    print(f"{'Format':<14}{'Size KB':>10}{'Save ms':>10}{'Load ms':>10}")
+    legacy, save_ms = _timed(legacy_save)
+    _, load_ms = _timed(legacy_load, legacy)
+    print(f"{'legacy':<14}{len(legacy) / 1024:>10.0f}{save_ms:>10.1f}{load_ms:>10.1f}")
+    assert JsonSerializer().encode(data) == legacy, "json format drifted from legacy"
+    for name in SERIALIZERS:
+        serializer = get_serializer(name, BENCH_PASSPHRASE)
+        raw, save_ms = _timed(serializer.encode, data)
+        decoded, load_ms = _timed(detect_serializer(raw, BENCH_PASSPHRASE).decode, raw)
+        # Round-trip compatibility check
+        for section in SECTIONS:
+            assert ([e.to_record() for e in decoded[section]] ==
+                    [e.to_record() for e in data[section]]), (name, section)
+        print(f"{name:<14}{len(raw) / 1024:>10.0f}{save_ms:>10.1f}{load_ms:>10.1f}")
+
+
+def _load_system(system, data: dict):
+    system._patients = data['patients']
+    system._doctors = data['doctors']
+    system._appointments = data['appointments']
+    system._bills = data['bills']
+    system._payments = data['payments']
+    system._invoices = data['invoices']
+
+
+def bench_group_commit(records: int, threads: int = 4, seconds: float = 2.0):
+    """Measure save requests and durable commits per second per durability mode"""
+    from hospital_system import HospitalSystem
+
+    data = build_dataset(records)
+    modes = [("strict", True), ("strict", False), ("group", True), ("deferred", True)]
+    print(f"Group commit benchmark: {records} records, {threads} writer threads")
+    print(f"{'Mode':<18}{'Saves/s':>10}{'Commits/s':>11}{'Avg save ms':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for durability, fsync in modes:
+            path = os.path.join(tmp, f"{durability}-{fsync}.bin")
+            system = HospitalSystem(path, data_format="binary",
+                                    durability=durability, fsync=fsync)
+            _load_system(system, data)
+            latencies = []
+            deadline = time.perf_counter() + seconds
+
+            def writer(offset):
+                i = offset
+                while time.perf_counter() < deadline:
+                    data['bills'][i % len(data['bills'])].mark_as_paid()
+                    start = time.perf_counter()
+                    system.save_data()
+                    latencies.append(time.perf_counter() - start)
+                    i += threads
+
+            workers = [threading.Thread(target=writer, args=(n,))
+                       for n in range(threads)]
+            start = time.perf_counter()
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            system.close()
+            elapsed = time.perf_counter() - start
+            committer = system.committer
+            label = durability + ("" if fsync else " (no fsync)")
+            print(f"{label:<18}{committer.requests / elapsed:>10.0f}"
+                  f"{committer.commits / elapsed:>11.1f}"
+                  f"{sum(latencies) / len(latencies) * 1000:>13.2f}")
+
+
+def bench_dirty_save(records: int):
+    """Compare full re-encoding with dirty-tracked encoding after one change"""
+    from serializers import SERIALIZERS, get_serializer
+
+    data = build_dataset(records)
+    print(f"Dirty-tracking benchmark: {records} records, one bill changed per save")
+    print(f"{'Format':<14}{'Full ms':>10}{'Cold ms':>10}{'1 dirty ms':>12}")
+    for name in SERIALIZERS:
+        serializer = get_serializer(name, BENCH_PASSPHRASE)
+        _, full_ms = _timed(serializer.encode, data)
+        _, cold_ms = _timed(serializer.encode_cached, data)
+        bill = data['bills'][records // 2]
+        bill._payment_status = "Unpaid" if bill.payment_status == "Paid" else "Paid"
+        bill.mark_dirty()
+        warm, warm_ms = _timed(serializer.encode_cached, data)
+        if name == "encrypted":
+            # Fresh nonces make every encoding differ; compare contents instead
+            assert ([e.to_record() for e in serializer.decode(warm)['bills']] ==
+                    [e.to_record() for e in data['bills']]), name
+        else:
+            assert warm == serializer.encode(data), name
+        print(f"{name:<14}{full_ms:>10.1f}{cold_ms:>10.1f}{warm_ms:>12.1f}")
+
+
+def bench_split_storage(records: int):
+    """Compare startup and per-write I/O of single-file and split storage"""
+    from hospital_system import HospitalSystem
+
+    layouts = [("single", {}), ("split", {'storage': "split"}),
+               ("split+monthly", {'storage': "split", 'partition_by_month': True})]
+    print(f"Split storage benchmark: {records} records, binary format")
+    print(f"{'Layout':<16}{'Open ms':>9}{'Bill clerk ms':>15}{'Bytes/bill':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, options in layouts:
+            path = os.path.join(tmp, f"{label}.bin")
+            system = HospitalSystem(path, data_format="binary", fsync=False, **options)
+            _load_system(system, build_dataset(records))
+            system.save_data()
+
+            start = time.perf_counter()
+            system = HospitalSystem(path, data_format="binary", fsync=False, **options)
+            open_ms = (time.perf_counter() - start) * 1000
+            # A billing clerk only needs patients and bills
+            instrumentation = system.enable_instrumentation()
+            start = time.perf_counter()
+            system.generate_bill(1, 50.0, 10.0)
+            clerk_ms = (time.perf_counter() - start) * 1000
+            system.generate_bill(2, 50.0, 10.0)
+            written = instrumentation.get_metrics()['methods']['generate_bill']['bytes_persisted']
+            print(f"{label:<16}{open_ms:>9.1f}{clerk_ms:>15.1f}{written // 2:>12}")
+
+
+def bench_archive(records: int):
+    """Compare resident memory and lookups before and after archiving closed records"""
+    import tracemalloc
+    from hospital_system import HospitalSystem
+
+    print(f"Archive benchmark: {records} records, binary format")
+    print(f"{'State':<16}{'Active objs':>12}{'Memory MB':>11}{'Open ms':>9}"
+          f"{'1k patient lookups ms':>23}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hospital.bin")
+        system = HospitalSystem(path, data_format="binary", fsync=False)
+        _load_system(system, build_dataset(records))
+        system.save_data()
+        system.close()
+        for state in ("before", "after"):
+            if state == "after":
+                system = HospitalSystem(path, data_format="binary", fsync=False)
+                system.archive_closed()
+                system.close()
+            tracemalloc.start()
+            start = time.perf_counter()
+            system = HospitalSystem(path, data_format="binary", fsync=False)
+            open_ms = (time.perf_counter() - start) * 1000
+            memory = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+            tracemalloc.stop()
+            start = time.perf_counter()
+            for patient_id in range(1, 1001):
+                system.get_patient_bills(patient_id)
+            lookup_ms = (time.perf_counter() - start) * 1000
+            active = len(system.get_all_appointments()) + len(system.get_all_bills())
+            print(f"{state:<16}{active:>12}{memory:>11.1f}{open_ms:>9.1f}{lookup_ms:>23.1f}")
+            system.close()
+
+
+def bench_cache(records: int):
+    """Measure rendering a full bill listing cold and from the row cache"""
+    from hospital_system import HospitalSystem
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.json"),
+                                cache_size=records)
+        _load_system(system, build_dataset(records))
+        bills = system.get_all_bills()
+        print(f"Cache benchmark: rendering {len(bills)} bills")
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            for bill in bills:
+                system.format_record(bill)
+            print(f"{label:<6}{(time.perf_counter() - start) * 1000:>10.1f} ms")
+        print(system.cache_stats()['rows'])
+
+
+def bench_pagination(records: int, page_size: int = 50):
+    """Measure fetching first, middle and last pages against copying the full list"""
+    import tracemalloc
+    from hospital_system import HospitalSystem
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"),
+                                data_format="binary", fsync=False)
+        _load_system(system, build_dataset(records))
+        system.archive_closed()
+        print(f"Pagination benchmark: {records} appointments "
+              f"({len(system.archive.appointments)} archived), page size {page_size}")
+        print(f"{'Query':<36}{'ms':>9}{'Peak KB':>10}")
+
+        def measure(label, func):
+            _, ms = _timed(func)
+            # Measured in a second run; tracing would distort the timing
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            print(f"{label:<36}{ms:>9.2f}{peak:>10.0f}")
+
+        middle = (records // 2,)
+        measure("full list (active + archived)", lambda: (
+            list(system.get_all_appointments()) +
+            list(system.iter_archived_appointments())))
+        measure("first page by id", lambda: system.page_appointments(page_size))
+        measure("middle page by id (cursor)",
+                lambda: system.page_appointments(page_size, cursor=middle))
+        measure("last page by id", lambda: system.page_appointments(
+            page_size, descending=True))
+        measure("first page by date", lambda: system.page_appointments(
+            page_size, sort_by='date'))
+        measure("first page, doctor 1", lambda: system.page_appointments(
+            page_size, doctor_id=1))
+        measure("first page, one month", lambda: system.page_appointments(
+            page_size, date_from="01-06-2026", date_to="30-06-2026"))
+        system.close()
+
+
+def bench_cascade(records: int, deletes: int = 1000):
+    """Measure cascading patient deletes one at a time and in bulk, then compaction"""
+    from hospital_system import HospitalSystem
+
+    print(f"Cascade benchmark: {records} patients/appointments/bills, "
+          f"{deletes} patients deleted per run")
+    print(f"{'Mode':<16}{'Total ms':>10}{'Per patient ms':>16}{'Records removed':>17}"
+          f"{'Compact ms':>12}")
+    rng = random.Random(7)
+    for mode in ("single", "bulk"):
+        with tempfile.TemporaryDirectory() as tmp:
+            system = HospitalSystem(os.path.join(tmp, "hospital.bin"),
+                                    data_format="binary", durability="deferred",
+                                    fsync=False, compact_ratio=None)
+            _load_system(system, build_dataset(records))
+            before = len(system.get_all_appointments()) + len(system.get_all_bills())
+            targets = rng.sample(range(1, records + 1), min(deletes, records))
+            start = time.perf_counter()
+            if mode == "single":
+                for patient_id in targets:
+                    system.delete_patient(patient_id)
+            else:
+                system.delete_patients(targets)
+            ms = (time.perf_counter() - start) * 1000
+            removed = before - len(system.get_all_appointments()) - len(system.get_all_bills())
+            _, compact_ms = _timed(system.compact)
+            print(f"{mode:<16}{ms:>10.1f}{ms / len(targets):>16.3f}{removed:>17}"
+                  f"{compact_ms:>12.1f}")
+            system.close()
+
+
+def bench_snapshot(records: int, writes: int = 10000):
+    """Measure snapshot creation and the copy-on-write cost paid by writers"""
+    import tracemalloc
+    from hospital_system import HospitalSystem
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"),
+                                data_format="binary", durability="deferred",
+                                fsync=False)
+        _load_system(system, build_dataset(records))
+        print(f"Snapshot benchmark: {records} records per section")
+
+        costs = []
+        for _ in range(5):
+            with system.snapshot() as snapshot:
+                costs.append(snapshot.creation_ms)
+        tracemalloc.start()
+        snapshot = system.snapshot()
+        memory = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+        snapshot.release()
+        print(f"creation: {min(costs):.2f} ms best, {sum(costs) / len(costs):.2f} ms avg, "
+              f"{memory:.0f} KB")
+
+        bills = system.get_all_bills()
+        rng = random.Random(3)
+        for label, hold in (("no snapshot", False), ("snapshot held", True)):
+            targets = rng.sample(bills, min(writes, len(bills)))
+            snapshot = system.snapshot() if hold else None
+            start = time.perf_counter()
+            # Mutate through the record hooks only, to time just the copying
+            for bill in targets:
+                bill.before_change()
+                bill._payment_status = "Unpaid" if bill.payment_status == "Paid" else "Paid"
+                bill.mark_dirty()
+            ms = (time.perf_counter() - start) * 1000
+            copied = snapshot.preserved if snapshot else 0
+            print(f"{len(targets)} bill updates, {label:<14}{ms:>9.1f} ms"
+                  f"  ({copied} records copied)")
+            if snapshot:
+                snapshot.release()
+
+        # A report on a snapshot is unaffected by a writer running alongside
+        snapshot = system.snapshot()
+        expected = snapshot.get_statistics()
+        stop = threading.Event()
+
+        def writer():
+            while not stop.is_set():
+                bill = rng.choice(bills)
+                bill.before_change()
+                bill._payment_status = "Paid"
+                bill.mark_dirty()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        stats, ms = _timed(snapshot.get_statistics)
+        stop.set()
+        thread.join()
+        assert stats == expected, "snapshot statistics changed under a writer"
+        print(f"statistics on a snapshot with a concurrent writer: {ms:.1f} ms, "
+              f"consistent ({snapshot.preserved} records copied)")
+        snapshot.release()
+        system.close()
+
+
+def bench_reports(records: int, chunk_size: int = 100000):
+    """Measure the month-end report engine across worker counts"""
+    from hospital_system import HospitalSystem
+    from reports import ReportEngine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"),
+                                data_format="binary", durability="deferred",
+                                fsync=False)
+        _load_system(system, build_dataset(records))
+        system.archive_closed()
+        print(f"Report benchmark: {records} bills and appointments "
+              f"({len(system.archive.bills)} bills archived), {os.cpu_count()} CPU(s)")
+        print(f"{'Workers':<9}{'Chunks':>7}{'Prepare ms':>12}{'Compute ms':>12}"
+              f"{'Merge ms':>10}{'Total ms':>10}{'Speedup':>9}")
+
+        baseline = None
+        expected = None
+        for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+            engine = ReportEngine(system, workers=workers, chunk_size=chunk_size)
+            report, ms = _timed(engine.month_end_report)
+            result = {key: report[key] for key in
+                      ('revenue_by_patient', 'unpaid_balances', 'doctor_utilization')}
+            if expected is None:
+                expected, baseline = result, ms
+            assert result == expected, f"report with {workers} workers differs"
+            timings = report['timings']
+            print(f"{workers:<9}{report['chunks']:>7}{timings['prepare_ms']:>12.1f}"
+                  f"{timings['compute_ms']:>12.1f}{timings['merge_ms']:>10.1f}"
+                  f"{ms:>10.1f}{baseline / ms:>8.2f}x")
+
+        report, ms = _timed(ReportEngine(system).month_end_report, "2026-06")
+        print(f"one month (2026-06): {ms:.1f} ms, revenue ${report['total_revenue']:.2f}")
+        system.close()
+
+
+def bench_ledger(records: int, queries: int = 1000):
+    """Compare ledger balance and top-debtor queries against scanning the bills"""
+    import heapq
+    from hospital_system import HospitalSystem
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"),
+                                data_format="binary", durability="deferred",
+                                fsync=False)
+        _load_system(system, build_dataset(records))
+        print(f"Ledger benchmark: {records} bills, "
+              f"{len(system.get_all_bills())} active")
+        _, build_ms = _timed(lambda: system.ledger)
+        print(f"ledger build: {build_ms:.1f} ms")
+
+        def scan_outstanding(patient_id):
+            received = {}
+            for payment in system.get_all_payments():
+                received[payment.bill_id] = received.get(payment.bill_id, 0.0) + payment.amount
+            return sum(b.total - received.get(b.bill_id, 0.0) for b in system.get_all_bills()
+                       if b.patient_id == patient_id and b.payment_status != "Paid")
+
+        def scan_top(k):
+            balances = {}
+            unpaid = set()
+            for bill in system.get_all_bills():
+                if bill.payment_status != "Paid":
+                    unpaid.add(bill.bill_id)
+                    balances[bill.patient_id] = balances.get(bill.patient_id, 0.0) + bill.total
+            for payment in system.get_all_payments():
+                if payment.bill_id in unpaid:
+                    balances[payment.patient_id] -= payment.amount
+            return heapq.nlargest(k, balances.items(), key=lambda item: item[1])
+
+        rng = random.Random(5)
+        patient_ids = [rng.randint(1, records) for _ in range(queries)]
+        scans = min(queries, 10)
+        _, scan_ms = _timed(lambda: [scan_outstanding(p) for p in patient_ids[:scans]])
+        _, ledger_ms = _timed(lambda: [system.get_patient_balance(p) for p in patient_ids])
+        print(f"{'Query':<28}{'Scan ms':>10}{'Ledger ms':>11}")
+        print(f"{'balance of one patient':<28}{scan_ms / scans:>10.3f}"
+              f"{ledger_ms / queries:>11.4f}")
+        expected, scan_ms = _timed(scan_top, 100)
+        top, ledger_ms = _timed(system.top_debtors, 100)
+        assert [round(b, 2) for _, b in expected] == [b for _, b in top], "top debtors differ"
+        print(f"{'top 100 debtors':<28}{scan_ms:>10.3f}{ledger_ms:>11.4f}")
+
+        unpaid = [b for b in system.get_all_bills() if b.payment_status != "Paid"]
+        targets = rng.sample(unpaid, min(queries, len(unpaid)))
+        start = time.perf_counter()
+        for bill in targets:
+            system.record_payment(bill.bill_id, round(system.get_bill_balance(bill.bill_id) / 2, 2))
+        ms = (time.perf_counter() - start) * 1000
+        _, top_ms = _timed(system.top_debtors, 100)
+        print(f"{len(targets)} partial payments: {ms / len(targets):.3f} ms each, "
+              f"top 100 afterwards {top_ms:.3f} ms")
+        system.close()
+
+
+def bench_invoicing(records: int, manual: int = 50):
+    """Compare a batch invoicing run against one generate_bill call per appointment"""
+    from hospital_system import CONSULTATION_FEES, HospitalSystem
+
+    for label, data_format in (("json", "json"), ("binary", "binary")):
+        with tempfile.TemporaryDirectory() as tmp:
+            system = HospitalSystem(os.path.join(tmp, "hospital" + (
+                ".json" if data_format == "json" else ".bin")),
+                data_format=data_format, fsync=False)
+            _load_system(system, build_dataset(records))
+            system.save_data()
+            completed = [a for a in system.iter_appointments(
+                status="Completed", date_from="01-06-2026", date_to="30-06-2026")]
+            print(f"Invoicing benchmark ({label}): {records} appointments, "
+                  f"{len(completed)} completed in 2026-06")
+
+            # Per-appointment bills with a save each, as staff do by hand; these
+            # are not linked to their appointments, so the batch run bills all
+            doctors = {d.person_id: d for d in system.get_all_doctors()}
+            sample = completed[:manual]
+            start = time.perf_counter()
+            for appointment in sample:
+                fee = CONSULTATION_FEES.get(doctors[appointment.doctor_id].specialization, 60.0)
+                system.generate_bill(appointment.patient_id, fee, 0.0)
+            ms = (time.perf_counter() - start) * 1000
+            print(f"generate_bill x{len(sample):<6}{ms:>10.1f} ms  "
+                  f"({len(sample) / ms * 1000:>9.0f} bills/s)")
+
+            result = system.invoice_completed_appointments("01-06-2026", "30-06-2026")
+            print(f"batch run         {result['ms']:>10.1f} ms  "
+                  f"({result['billed'] / result['ms'] * 1000:>9.0f} bills/s, "
+                  f"{result['billed']} billed)")
+            again = system.invoice_completed_appointments("01-06-2026", "30-06-2026")
+            assert again['billed'] == 0, "re-run billed twice"
+            print(f"re-run            {again['ms']:>10.1f} ms  "
+                  f"({again['already_billed']} already billed, 0 new)")
+            system.close()
+
+
+_STARTUP_SCRIPTS = {
+    # Everything loaded before the menu can be shown
+    'eager': """
+import time
+start = time.perf_counter()
+from hospital_system import HospitalSystem
+system = HospitalSystem({path!r}, data_format={data_format!r})
+ready = time.perf_counter()
+print(ready - start, ready - start)
+""",
+    # Menu shown once the console is constructed; data keeps loading behind it
+    'background': """
+import time
+start = time.perf_counter()
+from console_interface import ConsoleInterface
+interface = ConsoleInterface()
+ready = time.perf_counter()
+interface.wait_for_data()
+print(ready - start, time.perf_counter() - start)
+""",
+}
+
+
+def bench_startup(records: int, runs: int = 3):
+    """Time from process start to a usable menu, and until all data is loaded"""
+    import subprocess
+    import sys
+    from hospital_system import HospitalSystem
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    print(f"Startup benchmark: {records} records per section (best of {runs})")
+    print(f"{'Format':<10}{'Mode':<12}{'Menu ms':>10}{'Data ms':>10}")
+    for data_format in ("json", "binary"):
+        with tempfile.TemporaryDirectory() as tmp:
+            # The console opens hospital_data.json and detects the format
+            path = os.path.join(tmp, "hospital_data.json")
+            system = HospitalSystem(path, data_format=data_format, fsync=False)
+            _load_system(system, build_dataset(records))
+            system.save_data()
+            system.close()
+            for mode, script in _STARTUP_SCRIPTS.items():
+                code = script.format(path=path, data_format=data_format)
+                timings = []
+                for _ in range(runs):
+                    out = subprocess.run([sys.executable, "-c", code], cwd=tmp,
+                                         env=dict(os.environ, PYTHONPATH=repo),
+                                         input="", capture_output=True, text=True,
+                                         check=True).stdout
+                    timings.append([float(v) * 1000 for v in out.split()[-2:]])
+                menu, data = min(timings)
+                print(f"{data_format:<10}{mode:<12}{menu:>10.1f}{data:>10.1f}")
+
+def bench_cli(records: int, commands: int = 200, processes: int = 5):
+    """A script of commands: one process per command, per-command saves, one batch"""
+    import contextlib
+    import io
+    import subprocess
+    import sys
+    import cli
+    from hospital_system import HospitalSystem
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    print(f"CLI benchmark: {records} records per section, {commands} commands")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hospital_data.json")
+        system = HospitalSystem(path, data_format="binary", fsync=False)
+        data = build_dataset(records)
+        _load_system(system, data)
+        system.save_data()
+        system.close()
+        unpaid = [b.bill_id for b in data['bills'] if b.payment_status != "Paid"]
+        script = os.path.join(tmp, "commands.txt")
+        with open(script, 'w') as f:
+            for i in range(commands):
+                if i % 2:
+                    f.write(f"pay {unpaid[i]}\n")
+                else:
+                    f.write(f"bill {i % records + 1} 50 {i % 7}\n")
+        with open(script) as f:
+            lines = [line.split() for line in f]
+
+        # Separate processes, as a shell loop over single commands would run
+        start = time.perf_counter()
+        for tokens in lines[:processes]:
+            subprocess.run([sys.executable, os.path.join(repo, "cli.py"),
+                            "--data-file", path] + tokens,
+                           cwd=tmp, capture_output=True, check=True)
+        per_process = (time.perf_counter() - start) / processes
+        print(f"{'process per command':<24}{per_process * commands:>10.3f}s "
+              f"(estimated from {processes})")
+
+        system = HospitalSystem(path, data_format="binary", fsync=False)
+        parser = cli.build_parser()
+        _, ms = _timed(lambda: [cli._execute(parser, system, "bench", tokens)
+                                for tokens in lines[processes:]])
+        system.close()
+        print(f"{'save per command':<24}"
+              f"{ms / 1000 * commands / (commands - processes):>10.3f}s")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, ms = _timed(cli.main, ["--data-file", path, "run", script])
+        print(f"{'one batch':<24}{ms / 1000:>10.3f}s")
+
+def bench_scheduling(records: int, moves: int = 2000):
+    """Slot conflict checks by history scan and by slot index, then reschedules"""
+    from hospital_system import HospitalSystem
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"), data_format="binary",
+                                durability="deferred", fsync=False)
+        data = build_dataset(records)
+        _load_system(system, data)
+        doctors = len(data['doctors'])
+        print(f"Scheduling benchmark: {records} appointments over {doctors} doctors, "
+              f"{moves} moves")
+        slots = [(rng.randint(1, doctors), f"{rng.randint(1, 28):02d}-"
+                  f"{rng.randint(1, 12):02d}-2026", f"{rng.randint(9, 16):02d}:00")
+                 for _ in range(moves)]
+        refs = system._refs('doctor_appointments')
+
+        def scan(doctor_id, date, time):
+            # The conflict check schedule_appointment used to run
+            return not any(a.date == date and a.time == time and a.status == "Scheduled"
+                           for a in refs.get(doctor_id))
+
+        _, scan_ms = _timed(lambda: [scan(*slot) for slot in slots])
+        _, build_ms = _timed(lambda: system.slots)
+        _, index_ms = _timed(lambda: [system.slots.is_free(*slot) for slot in slots])
+        print(f"{'Check':<16}{'Total ms':>10}{'Per check us':>14}")
+        print(f"{'scan':<16}{scan_ms:>10.1f}{scan_ms * 1000 / moves:>14.2f}")
+        print(f"{'index':<16}{index_ms:>10.1f}{index_ms * 1000 / moves:>14.2f}"
+              f"   (built in {build_ms:.0f} ms)")
+
+        active = [a.appointment_id for a in data['appointments']
+                  if a.status in ("Scheduled", "Rescheduled")]
+        moved = 0
+        start = time.perf_counter()
+        with system.batch():
+            for appointment_id, (_, date, hour) in zip(rng.sample(active, min(moves, len(active))), slots):
+                try:
+                    system.reschedule_appointment(appointment_id, date, hour)
+                    moved += 1
+                except ValueError:
+                    pass
+            _, day_ms = _timed(lambda: [system.complete_doctor_day(doctor_id, date)
+                                        for doctor_id, date, _ in slots[:100]])
+        ms = (time.perf_counter() - start) * 1000 - day_ms
+        print(f"reschedule: {moved} moved in {ms:.1f} ms; "
+              f"complete-day: {day_ms / 100:.3f} ms per doctor day")
+        system.close()
+
+def bench_utilization(records: int, queries: int = 100):
+    """Per-doctor day load and least-loaded routing: appointment scans vs counters"""
+    from hospital_system import HospitalSystem
+    from schedule import ACTIVE_STATUSES, slot_day
+
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"), data_format="binary",
+                                durability="deferred", fsync=False)
+        _load_system(system, build_dataset(records))
+        doctors = system.get_all_doctors()
+        print(f"Utilization benchmark: {records} appointments over {len(doctors)} doctors, "
+              f"{queries} queries")
+        dates = [f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+                 for _ in range(queries)]
+        # Completed appointments count towards a day's load too
+        counted = ACTIVE_STATUSES + ("Completed",)
+
+        def scan(date):
+            # What it took before: every doctor's appointments, one by one
+            least = None
+            for doctor in doctors:
+                if doctor.specialization != "Cardiology":
+                    continue
+                booked = sum(1 for a in system.get_doctor_appointments(doctor.person_id)
+                             if a.status in counted and slot_day(a.date) == date)
+                if least is None or booked < least[0]:
+                    least = (booked, doctor.person_id)
+            return least
+
+        _, scan_ms = _timed(lambda: [scan(date) for date in dates[:10]])
+        _, build_ms = _timed(lambda: (system.slots, system.rota))
+        _, load_ms = _timed(lambda: [system.get_utilization(date) for date in dates])
+        _, route_ms = _timed(lambda: [system.least_loaded_doctor("Cardiology", date)
+                                      for date in dates])
+        print(f"{'Query':<28}{'ms per query':>14}")
+        print(f"{'scan (least loaded)':<28}{scan_ms / 10:>14.3f}")
+        print(f"{'least_loaded_doctor':<28}{route_ms / queries:>14.3f}")
+        print(f"{'get_utilization (all)':<28}{load_ms / queries:>14.3f}")
+        print(f"counters built in {build_ms:.0f} ms")
+        system.close()
+
+def bench_dedupe(records: int, checks: int = 200):
+    """Duplicate check on registration (full scan vs blocking index) and batch dedupe"""
+    from dedupe import DUPLICATE_THRESHOLD, similarity
+    from hospital_system import HospitalSystem
+
+    rng = random.Random(13)
+    first = ["Ali", "Ahmed", "Sara", "Fatima", "John", "Mary", "Omar", "Ayesha",
+             "Bilal", "Hina", "David", "Zainab", "Usman", "Maria", "Imran", "Nadia"]
+    last = ["Khan", "Malik", "Smith", "Hussain", "Butt", "Jones", "Raza", "Qureshi",
+            "Sheikh", "Brown", "Chaudhry", "Mirza", "Iqbal", "Taylor", "Baig", "Aslam"]
+    patients = []
+    for i in range(1, records + 1):
+        if i > 1 and rng.random() < 0.01:
+            # A re-registration with a typo or reformatted number
+            original = patients[rng.randrange(len(patients))]
+            name = original.name.replace("a", "e", 1)
+            patient = Patient(i, name, original.age, original.gender,
+                              "+92 " + original.contact[1:], original.disease)
+        else:
+            patient = Patient(i, f"{rng.choice(first)} {rng.choice(last)}",
+                              rng.randint(1, 90), rng.choice("MF"), f"0321{i:07d}", "Flu")
+        patients.append(patient)
+    print(f"Dedupe benchmark: {records} patients, about 1% re-registered")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"), data_format="binary",
+                                durability="deferred", fsync=False)
+        system._patients = patients
+        probes = [rng.choice(patients) for _ in range(checks)]
+
+        def scan(probe):
+            return [p for p in patients
+                    if similarity(probe.name, probe.contact, probe.age, probe.gender, p)
+                    >= DUPLICATE_THRESHOLD]
+
+        _, scan_ms = _timed(lambda: [scan(probe) for probe in probes[:3]])
+        _, build_ms = _timed(lambda: system.duplicates)
+        _, index_ms = _timed(lambda: [system.find_possible_duplicates(
+            p.name, p.contact, p.age, p.gender) for p in probes])
+        print(f"{'Registration check':<24}{'ms per check':>14}")
+        print(f"{'full scan':<24}{scan_ms / 3:>14.3f}")
+        print(f"{'blocking index':<24}{index_ms / checks:>14.3f}"
+              f"   (built in {build_ms:.0f} ms)")
+        result = system.dedupe_patients(merge=True)
+        print(f"batch dedupe + merge: {len(result['groups'])} groups, "
+              f"{result['merged']} merged in {result['ms']:.0f} ms")
+        system.close()
+
+
+def bench_versioning(records: int, threads: int = 8, updates: int = 2000):
+    """Compare-and-set updates from several threads: per-record lock stripes
+    against one global lock, and retries when all threads edit one record"""
+    from hospital_system import HospitalSystem
+    from record import StaleRecordError
+
+    print(f"Versioning benchmark: {threads} threads x {updates} updates, {records} patients")
+    global_lock = threading.RLock()
+
+    def run(tmp, lock_of, shared):
+        # A fresh system per case so earlier updates do not skew later ones
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"), data_format="binary",
+                                durability="deferred", fsync=False)
+        system._patients = build_dataset(records)['patients']
+        ids = [p.person_id for p in system._patients]
+        share = max(1, len(ids) // threads)
+        counts = {'contended': 0, 'stale': 0}
+        guard = threading.Lock()
+
+        def worker(n):
+            rng = random.Random(n)
+            contended = stale = 0
+            for i in range(updates):
+                patient_id = ids[0] if shared else ids[(n * share + rng.randrange(share)) % len(ids)]
+                while True:
+                    version = system.get_patient(patient_id).version
+                    lock = lock_of(system, patient_id)
+                    if not lock.acquire(blocking=False):
+                        contended += 1
+                        lock.acquire()
+                    try:
+                        system.update_patient(patient_id, expected_version=version,
+                                              disease=f"Case {n}-{i}")
+                        break
+                    except StaleRecordError:
+                        stale += 1
+                    finally:
+                        lock.release()
+            with guard:
+                counts['contended'] += contended
+                counts['stale'] += stale
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        # Saves are held back so the timing covers only the updates
+        with system.batch():
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+            counts['ms'] = (time.perf_counter() - start) * 1000
+        counts['versions'] = sum(p.version for p in system._patients)
+        system.close()
+        return counts
+
+    cases = [
+        ("different records, global lock", lambda system, _: global_lock, False),
+        ("different records, striped", lambda system, i: system._record_lock('patients', i), False),
+        ("one shared record, striped", lambda system, i: system._record_lock('patients', i), True)
+    ]
+    print(f"{'Case':<34}{'ms':>10}{'updates/s':>12}{'contended':>11}{'stale':>8}{'lost':>6}")
+    for label, lock_of, shared in cases:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run(tmp, lock_of, shared)
+        rate = threads * updates / (result['ms'] / 1000)
+        # Every successful update bumps exactly one version
+        lost = threads * updates - result['versions']
+        print(f"{label:<34}{result['ms']:>10.1f}{rate:>12.0f}"
+              f"{result['contended']:>11}{result['stale']:>8}{lost:>6}")
+
+
+def bench_encryption(records: int, saves: int = 100):
+    """Cost of the encrypted format against plain binary: key derivation,
+    load, and saves after one change, next to encrypting the whole file"""
+    from encryption import RecordCipher, derive_keys
+    from hospital_system import HospitalSystem
+
+    print(f"Encryption benchmark: {records} records per section, "
+          f"{saves} saves of one changed bill")
+    _, derive_ms = _timed(derive_keys, BENCH_PASSPHRASE, os.urandom(16))
+    print(f"key derivation: {derive_ms:.0f} ms, once per session")
+    print(f"{'Format':<22}{'Full save ms':>14}{'Load ms':>10}{'Save after change ms':>22}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("binary", "encrypted"):
+            path = os.path.join(tmp, f"hospital-{name}.dat")
+            system = HospitalSystem(path, data_format=name, fsync=False,
+                                    passphrase=BENCH_PASSPHRASE, load=False)
+            _load_system(system, build_dataset(records))
+            _, full_ms = _timed(system._write_data)
+            system.close()
+            system, load_ms = _timed(lambda: HospitalSystem(
+                path, data_format=name, fsync=False, passphrase=BENCH_PASSPHRASE))
+            # The first save after loading encodes every record once
+            system._write_data()
+            bills = system._bills
+            start = time.perf_counter()
+            for i in range(saves):
+                bill = bills[(i * 7919) % len(bills)]
+                bill._payment_status = "Unpaid" if bill.payment_status == "Paid" else "Paid"
+                bill.mark_dirty()
+                system._write_data()
+            save_ms = (time.perf_counter() - start) * 1000 / saves
+            print(f"{name:<22}{full_ms:>14.1f}{load_ms:>10.1f}{save_ms:>22.2f}")
+            if name == "binary":
+                # Encrypting the whole file instead, as one blob per save
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                cipher = RecordCipher(BENCH_PASSPHRASE, os.urandom(16))
+                _, blob_ms = _timed(cipher.encrypt, raw)
+                whole_ms = save_ms + blob_ms
+            system.close()
+        print(f"{'binary + whole file':<22}{'':>14}{'':>10}{whole_ms:>22.2f}")
+
+
+def bench_audit(records: int, updates: int = 50000, lookups: int = 200):
+    """Overhead of audit logging per change, entry size, and history lookups
+    through the segment indexes against scanning the log"""
+    from hospital_system import HospitalSystem
+
+    print(f"Audit benchmark: {updates} disease updates over {records} patients")
+    rng = random.Random(5)
+    targets = [rng.randint(1, records) for _ in range(updates)]
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for audit in (False, True):
+            system = HospitalSystem(os.path.join(tmp, f"audit-{audit}.bin"),
+                                    data_format="binary", durability="deferred",
+                                    fsync=False, audit=audit,
+                                    audit_segment_bytes=1024 * 1024)
+            system._patients = build_dataset(records)['patients']
+            start = time.perf_counter()
+            # Saves are held back so the timing covers the updates themselves
+            with system.batch():
+                for i, patient_id in enumerate(targets):
+                    system.update_patient(patient_id, disease=f"Case {i}")
+                timings[audit] = (time.perf_counter() - start) * 1000
+            system.flush()
+        log = system.audit_log
+        size = sum(os.path.getsize(os.path.join(log.directory, name))
+                   for name in os.listdir(log.directory) if name.endswith(".log"))
+        sample = system.get_history('patients', targets[0])[-1]
+        print(f"{'update, no audit':<28}{timings[False] * 1000 / updates:>10.1f} us")
+        print(f"{'update, audited':<28}{timings[True] * 1000 / updates:>10.1f} us")
+        print(f"entry size: {size / updates:.0f} bytes "
+              f"(as a JSON line: {len(json.dumps(sample)) + 1}), "
+              f"{len(log.segments())} segments of 1 MB")
+
+        probes = [rng.choice(targets) for _ in range(lookups)]
+        system.close()
+        system = HospitalSystem(os.path.join(tmp, "audit-True.bin"), data_format="binary",
+                                fsync=False, audit_segment_bytes=1024 * 1024)
+        _, index_ms = _timed(lambda: [system.get_history('patients', p) for p in probes])
+        log = system.audit_log
+
+        def scan(patient_id):
+            # What a lookup costs without indexes: read every entry header
+            found = 0
+            for segment in log.segments():
+                index, _ = log._scan(segment)
+                found += len(index.get(patient_id, ()))
+            return found
+
+        _, scan_ms = _timed(lambda: [scan(p) for p in probes[:5]])
+        print(f"{'History lookup':<28}{'ms each':>10}")
+        print(f"{'full log scan':<28}{scan_ms / 5:>10.2f}")
+        print(f"{'segment indexes':<28}{index_ms / lookups:>10.2f}")
+        system.close()
+
+
+def bench_search(records: int, queries: int = 100):
+    """Disease queries through the inverted index against substring scans,
+    and the cost of keeping the index current"""
+    from hospital_system import HospitalSystem
+
+    data = build_dataset(records)
+    rng = random.Random(9)
+    qualifiers = ["", "", "Chronic ", "Mild ", "Acute ", "Type 2 "]
+    for patient in data['patients']:
+        # Free text as clinicians type it, sometimes with a second condition
+        text = rng.choice(qualifiers) + patient.disease
+        if rng.random() < 0.2:
+            text += ", " + rng.choice(["hypertension", "asthma", "anemia"])
+        patient._disease = text
+    print(f"Search benchmark: {records} patients")
+    searches = [("diabetes or hypertension", lambda d: "diabetes" in d or "hypertension" in d),
+                ("chronic asthma", lambda d: "chronic" in d and "asthma" in d),
+                ("bronch* not acute", lambda d: "bronch" in d and "acute" not in d)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        system = HospitalSystem(os.path.join(tmp, "hospital.bin"), data_format="binary",
+                                durability="deferred", fsync=False, audit=False)
+        system._patients = data['patients']
+        _, build_ms = _timed(lambda: system.diseases)
+        print(f"index built in {build_ms:.0f} ms")
+        print(f"{'Query':<28}{'Matches':>9}{'Scan ms':>10}{'Count ms':>10}{'Top 20 ms':>11}")
+        for query, matches in searches:
+            def scan():
+                return [p for p in data['patients']
+                        if not p.is_deleted and matches(p.disease.lower())]
+            found, scan_ms = _timed(scan)
+            counted, count_ms = _timed(lambda: [system.count_patients_by_disease(query)
+                                                for _ in range(queries)])
+            _, top_ms = _timed(lambda: [system.search_patients_by_disease(query, limit=20)
+                                        for _ in range(queries)])
+            assert counted[0]['count'] == len(found), query
+            print(f"{query:<28}{len(found):>9}{scan_ms:>10.1f}"
+                  f"{count_ms / queries:>10.2f}{top_ms / queries:>11.2f}")
+        # Enough updates to spread the occasional posting set resize
+        updates = 20000
+        ids = [rng.randint(1, records) for _ in range(updates)]
+        system.get_patient(1)  # builds the id lookup outside the timing
+        with system.batch():
+            _, indexed_ms = _timed(lambda: [system.update_patient(i, disease="Migraine, anemia")
+                                            for i in ids])
+        system._diseases = None
+        with system.batch():
+            _, plain_ms = _timed(lambda: [system.update_patient(i, disease="Acute migraine")
+                                          for i in ids])
+        print(f"update_patient: {indexed_ms * 1000 / updates:.1f} us with the index, "
+              f"{plain_ms * 1000 / updates:.1f} us without")
+        system.close()
+
+
+def bench_gui(records: int, repeats: int = 5, pause: float = 0.1):
+    """Latency of GUI actions: full save and table rebuild after each one,
+    against deferred saves and targeted row updates from the view-model"""
+    import statistics
+    from hospital_system import HospitalSystem
+    from viewmodel import ROWS, ViewModel
+
+    print(f"GUI benchmark: {records} records per section, "
+          f"{repeats} of each action {pause * 1000:.0f} ms apart")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hospital_data.json")
+        system = HospitalSystem(path)
+        _load_system(system, build_dataset(records))
+        system.save_data()
+        system.close()
+
+        def refresh_all(system):
+            # What the old handlers did: statistics and all four tables
+            system.get_statistics()
+            for section, listing in (('patients', system.get_all_patients),
+                                     ('doctors', system.get_all_doctors),
+                                     ('appointments', system.get_all_appointments),
+                                     ('bills', system.get_all_bills)):
+                row = ROWS[section]
+                for record in listing():
+                    row(record)
+
+        results = {}
+        modes = (("refresh_all", "strict"), ("view-model", "deferred"))
+        for run, (mode, durability) in enumerate(modes):
+            system = HospitalSystem(path, durability=durability)
+            if mode == "view-model":
+                # As the GUI does on its loading thread
+                system.prepare_indexes()
+            view = ViewModel(system)
+            for section in ROWS:
+                view.watch(section)
+            unpaid = iter([b.bill_id for b in system.get_all_bills()
+                           if b.payment_status != "Paid"])
+            doctors = len(system.get_all_doctors())
+            actions = [
+                ("add patient", lambda i: system.add_patient(
+                    f"New Patient {i}", 30, "F", f"0333{i:07d}", "Flu")),
+                # A value new to each run, as unchanged updates publish nothing
+                ("update disease", lambda i: system.update_patient(
+                    i + 1, disease=("Asthma", "Diabetes")[run])),
+                ("book appointment", lambda i: system.schedule_appointment(
+                    i + 1, i % doctors + 1, f"{i % 28 + 1:02d}-01-{2027 + run}", "10:00 AM")),
+                ("generate bill", lambda i: system.generate_bill(i + 1, 50.0, 20.0)),
+                ("mark bill paid", lambda i: system.mark_bill_paid(next(unpaid))),
+                ("delete patient", lambda i: system.delete_patient(records - run * repeats - i))
+            ]
+            for name, action in actions:
+                times = []
+                for i in range(repeats):
+                    time.sleep(pause)
+                    start = time.perf_counter()
+                    action(i)
+                    if mode == "refresh_all":
+                        refresh_all(system)
+                    else:
+                        changes = view.take_changes()
+                        assert changes, name
+                    times.append((time.perf_counter() - start) * 1000)
+                results[mode, name] = times
+            view.close()
+            system.close()
+
+        print(f"{'Action':<20}{'refresh_all ms':>16}{'view-model ms':>15}{'max':>9}")
+        for name, _ in actions:
+            old = results["refresh_all", name]
+            new = results["view-model", name]
+            print(f"{name:<20}{statistics.median(old):>16.1f}"
+                  f"{statistics.median(new):>15.2f}{max(new):>9.2f}")
+
+
+BENCHMARKS = {
+    'serialization': bench_serialization,
+    'group-commit': bench_group_commit,
+    'dirty-save': bench_dirty_save,
+    'split-storage': bench_split_storage,
+    'archive': bench_archive,
+    'cache': bench_cache,
+    'pagination': bench_pagination,
+    'cascade': bench_cascade,
+    'snapshot': bench_snapshot,
+    'reports': bench_reports,
+    'ledger': bench_ledger,
+    'invoicing': bench_invoicing,
+    'startup': bench_startup,
+    'cli': bench_cli,
+    'scheduling': bench_scheduling,
+    'utilization': bench_utilization,
+    'dedupe': bench_dedupe,
+    'versioning': bench_versioning,
+    'encryption': bench_encryption,
+    'audit': bench_audit,
+    'search': bench_search,
+    'gui': bench_gui
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MediCare HMS benchmarks")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['all'])
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    names = sorted(BENCHMARKS) if args.benchmark == 'all' else [args.benchmark]
+    for name in names:
+        BENCHMARKS[name](args.records)
+        print()
+
+
+if __name__ == "__main__":
+    main()
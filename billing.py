@@ -5,11 +5,16 @@ Billing class for the Hospital Management System
 
 from datetime import datetime
 from typing import Dict
+from record import Record
 
 
-class Billing:
+class Billing(Record):
     """Billing class for managing patient charges"""
     
+    # Serialized field order, shared by to_dict and to_record
+    FIELDS = ('bill_id', 'patient_id', 'consultation_fee', 'medication_fee',
+              'total', 'date', 'payment_status')
+    
     def __init__(self, bill_id: int, patient_id: int, consultation_fee: float, 
                  medication_fee: float):
         self._bill_id = bill_id
@@ -32,6 +37,10 @@ class Billing:
     def total(self):
         return self._total
     
+    @property
+    def date(self):
+        return self._date
+    
     @property
     def payment_status(self):
         return self._payment_status
@@ -42,7 +51,15 @@ class Billing:
     
     def mark_as_paid(self):
         """Mark bill as paid"""
+        self.before_change()
         self._payment_status = "Paid"
+        self.mark_dirty()
+    
+    def reassign_patient(self, patient_id: int):
+        """Move this bill to another patient, e.g. when merging duplicates"""
+        self.before_change()
+        self._patient_id = patient_id
+        self.mark_dirty()
     
     def display_bill(self) -> str:
         """Display formatted bill"""
@@ -85,3 +102,17 @@ class Billing:
         billing._payment_status = data.get('payment_status', 'Unpaid')
         return billing
     
+    def to_record(self) -> tuple:
+        """Convert billing object to a compact tuple in FIELDS order"""
+        return (self._bill_id, self._patient_id, self._consultation_fee,
+                self._medication_fee, self._total, self._date,
+                self._payment_status)
+    
+    @staticmethod
+    def from_record(record) -> 'Billing':
+        """Create billing object from a tuple produced by to_record"""
+        billing = Billing.__new__(Billing)
+        (billing._bill_id, billing._patient_id, billing._consultation_fee,
+         billing._medication_fee, billing._total, billing._date,
+         billing._payment_status) = record
+        return billing
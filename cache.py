@@ -0,0 +1,107 @@
+"""
+Bounded LRU cache with hit/miss counters
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class LRUCache:
+    """Least-recently-used cache holding at most `maxsize` entries"""
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 1000, name: str = "cache"):
+        if maxsize < 0:
+            raise ValueError("Cache size cannot be negative")
+        self.name = name
+        self._maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None,
+            valid: Callable[[Any], bool] = None) -> Any:
+        """Get a cached value and mark it most recently used.
+        
+        If `valid` is given, a value it rejects is dropped and counted as
+        a miss.
+        """
+        with self._lock:
+            value = self._data.get(key, self._MISSING)
+            if value is not self._MISSING and valid is not None and not valid(value):
+                del self._data[key]
+                value = self._MISSING
+            if value is self._MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry if full"""
+        if self._maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop one entry if present"""
+        with self._lock:
+            if self._data.pop(key, self._MISSING) is not self._MISSING:
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches the predicate"""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def resize(self, maxsize: int):
+        """Change the capacity, evicting entries if it shrinks"""
+        with self._lock:
+            self._maxsize = maxsize
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        """Get counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self._maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    def reset_stats(self):
+        """Reset the counters without dropping entries"""
+        self.hits = self.misses = self.evictions = self.invalidations = 0
@@ -0,0 +1,468 @@
+"""
+Command-line batch mode for MediCare Hospital Management System
+Run: python cli.py [--data-file FILE] <command> [args]
+     python cli.py run commands.txt
+
+Every command of a run shares one process and one save at the end. Each
+command prints one JSON line with its result and timing, followed by a
+summary line that also says whether the final save succeeded.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import sys
+import time
+from itertools import islice
+from typing import List, Optional
+
+
+# ==================== COMMANDS ====================
+# Each takes the system and parsed arguments and returns a JSON-ready result
+
+def _record(entity) -> Optional[dict]:
+    return entity.to_dict() if entity is not None else None
+
+
+def _add_patient(system, args):
+    return _record(system.add_patient(args.name, args.age, args.gender, args.contact,
+                                      args.disease, allow_duplicates=not args.no_duplicates))
+
+
+def _add_doctor(system, args):
+    return _record(system.add_doctor(args.name, args.age, args.gender, args.contact,
+                                     args.specialization, args.availability))
+
+
+def _get(system, args):
+    getter = {'patient': system.get_patient, 'doctor': system.get_doctor,
+              'appointment': system.get_appointment, 'bill': system.get_bill}[args.kind]
+    entity = getter(args.id)
+    if entity is None:
+        raise ValueError(f"{args.kind.capitalize()} {args.id} not found")
+    result = _record(entity)
+    # Pass it back as --expect-version to refuse overwriting newer changes
+    result['version'] = entity.version
+    return result
+
+
+def _update_patient(system, args):
+    if not system.update_patient(args.patient_id, expected_version=args.expect_version,
+                                 disease=args.disease):
+        raise ValueError(f"Patient {args.patient_id} not found")
+    return {'version': system.get_patient(args.patient_id).version}
+
+
+def _update_doctor(system, args):
+    if not system.update_doctor(args.doctor_id, expected_version=args.expect_version,
+                                availability=args.availability):
+        raise ValueError(f"Doctor {args.doctor_id} not found")
+    return {'version': system.get_doctor(args.doctor_id).version}
+
+
+# Filters accepted by each section's iter_* method, by option name
+_LIST_FILTERS = {
+    'patients': {'name': 'name', 'disease': 'disease'},
+    'doctors': {'specialization': 'specialization'},
+    'appointments': {'status': 'status', 'patient': 'patient_id', 'doctor': 'doctor_id',
+                     'date_from': 'date_from', 'date_to': 'date_to'},
+    'bills': {'status': 'status', 'patient': 'patient_id',
+              'date_from': 'date_from', 'date_to': 'date_to'}
+}
+
+
+def _list(system, args):
+    filters = {}
+    for option, value in vars(args).items():
+        if value is None or option not in ('name', 'disease', 'specialization', 'status',
+                                           'patient', 'doctor', 'date_from', 'date_to'):
+            continue
+        if option not in _LIST_FILTERS[args.section]:
+            raise ValueError(f"{args.section} cannot be filtered by --{option.replace('_', '-')}")
+        filters[_LIST_FILTERS[args.section][option]] = value
+    stream = getattr(system, 'iter_' + args.section)(**filters)
+    return [entity.to_dict() for entity in islice(stream, args.limit)]
+
+
+def _schedule(system, args):
+    return _record(system.schedule_appointment(args.patient_id, args.doctor_id,
+                                               args.date, args.time))
+
+
+def _reschedule(system, args):
+    return _record(system.reschedule_appointment(args.appointment_id, args.date, args.time))
+
+
+def _complete(system, args):
+    return _apply_each(_read_ids(args), system.complete_appointment)
+
+
+def _complete_day(system, args):
+    return [appointment.to_dict()
+            for appointment in system.complete_doctor_day(args.doctor_id, args.date)]
+
+
+def _read_ids(args) -> List[int]:
+    """Ids from the command line plus the first column of --file, if given"""
+    ids = list(args.ids)
+    if args.file:
+        with open(args.file) as f:
+            for line in f:
+                field = line.split(',')[0].strip()
+                # Skips blank lines, comments and a header row
+                if field.isdigit():
+                    ids.append(int(field))
+    if not ids:
+        raise ValueError("No ids given")
+    return ids
+
+
+def _apply_each(ids: List[int], action) -> dict:
+    done = []
+    missing = []
+    for record_id in ids:
+        (done if action(record_id) else missing).append(record_id)
+    return {'done': len(done), 'not_found': missing}
+
+
+def _cancel(system, args):
+    return _apply_each(_read_ids(args), system.cancel_appointment)
+
+
+def _bill(system, args):
+    return _record(system.generate_bill(args.patient_id, args.consultation_fee,
+                                        args.medication_fee))
+
+
+def _pay(system, args):
+    return _apply_each(_read_ids(args), system.mark_bill_paid)
+
+
+def _payment(system, args):
+    payment = system.record_payment(args.bill_id, args.amount)
+    result = payment.to_dict()
+    result['remaining'] = system.get_bill_balance(args.bill_id)
+    return result
+
+
+def _delete(system, args):
+    delete = system.delete_patients if args.kind == 'patient' else system.delete_doctors
+    ids = _read_ids(args)
+    return {'deleted': delete(ids, cascade=not args.no_cascade), 'requested': len(ids)}
+
+
+def _invoice(system, args):
+    return system.invoice_completed_appointments(args.date_from, args.date_to)
+
+
+def _balance(system, args):
+    return system.get_patient_balance(args.patient_id)
+
+
+def _top_debtors(system, args):
+    return [{'patient_id': patient_id, 'outstanding': outstanding}
+            for patient_id, outstanding in system.top_debtors(args.k)]
+
+
+def _utilization(system, args):
+    if args.doctor is not None:
+        return system.get_doctor_utilization(args.doctor, args.date, args.to)
+    return {str(doctor_id): load for doctor_id, load
+            in system.get_utilization(args.date, args.specialization).items()}
+
+
+def _least_loaded(system, args):
+    doctor = system.least_loaded_doctor(args.specialization, args.date)
+    if doctor is None:
+        raise ValueError(f"No {args.specialization} doctor has a free slot on {args.date}")
+    result = doctor.to_dict()
+    result['load'] = system.get_utilization(args.date)[doctor.person_id]
+    return result
+
+
+def _duplicates(system, args):
+    if args.merge:
+        return system.dedupe_patients(args.threshold, merge=True)
+    return [[patient.to_dict() for patient in group]
+            for group in system.find_duplicate_patients(args.threshold)]
+
+
+def _stats(system, args):
+    return system.get_statistics()
+
+
+def _search(system, args):
+    result = system.count_patients_by_disease(args.query)
+    if not args.count:
+        result['patients'] = [patient.to_dict() for patient in
+                              system.search_patients_by_disease(args.query, args.limit)]
+    return result
+
+
+def _history(system, args):
+    return system.get_history(args.section, args.id, args.field)
+
+
+def _report(system, args):
+    from reports import ReportEngine
+    report = ReportEngine(system, workers=args.workers).month_end_report(args.month)
+    # JSON object keys must be strings
+    for key in ('revenue_by_patient', 'unpaid_balances', 'doctor_utilization'):
+        report[key] = {str(k): v for k, v in report[key].items()}
+    return report
+
+
+def _archive(system, args):
+    return system.archive_closed()
+
+
+def _compact(system, args):
+    return system.compact()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="MediCare HMS batch mode: one JSON line per command")
+    parser.add_argument('--data-file', default="hospital_data.json")
+    parser.add_argument('--format', dest='data_format', default=None,
+                        help="format to save in (default: that of the existing file)")
+    parser.add_argument('--stop-on-error', action='store_true',
+                        help="skip the remaining commands after a failure")
+    parser.add_argument('--actor', help="name changes are audited under "
+                                        "(default: the login name)")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    def command(name: str, handler, help_text: str) -> argparse.ArgumentParser:
+        sub = commands.add_parser(name, help=help_text)
+        sub.set_defaults(handler=handler)
+        return sub
+
+    def ids(sub: argparse.ArgumentParser, what: str):
+        sub.add_argument('ids', nargs='*', type=int, metavar='ID')
+        sub.add_argument('--file', help=f"file with one {what} id per line (or CSV first column)")
+
+    sub = command('run', None, "run commands from files ('-' for stdin), one per line")
+    sub.add_argument('files', nargs='+')
+
+    sub = command('add-patient', _add_patient, "register a patient")
+    for name in ('name', 'age', 'gender', 'contact', 'disease'):
+        sub.add_argument(name, type=int if name == 'age' else str)
+    sub.add_argument('--no-duplicates', action='store_true',
+                     help="fail if the patient looks already registered")
+
+    sub = command('add-doctor', _add_doctor, "register a doctor")
+    for name in ('name', 'age', 'gender', 'contact', 'specialization', 'availability'):
+        sub.add_argument(name, type=int if name == 'age' else str)
+
+    sub = command('get', _get, "show one record")
+    sub.add_argument('kind', choices=('patient', 'doctor', 'appointment', 'bill'))
+    sub.add_argument('id', type=int)
+
+    sub = command('update-patient', _update_patient, "change a patient's disease")
+    sub.add_argument('patient_id', type=int)
+    sub.add_argument('disease')
+    sub.add_argument('--expect-version', type=int,
+                     help="fail if the patient changed since `get` showed this version")
+
+    sub = command('update-doctor', _update_doctor, "change a doctor's availability")
+    sub.add_argument('doctor_id', type=int)
+    sub.add_argument('availability')
+    sub.add_argument('--expect-version', type=int,
+                     help="fail if the doctor changed since `get` showed this version")
+
+    sub = command('list', _list, "list records in id order")
+    sub.add_argument('section', choices=sorted(_LIST_FILTERS))
+    sub.add_argument('--limit', type=int, default=100)
+    sub.add_argument('--name')
+    sub.add_argument('--disease')
+    sub.add_argument('--specialization')
+    sub.add_argument('--status')
+    sub.add_argument('--patient', type=int)
+    sub.add_argument('--doctor', type=int)
+    sub.add_argument('--from', dest='date_from')
+    sub.add_argument('--to', dest='date_to')
+
+    sub = command('schedule', _schedule, "schedule an appointment")
+    sub.add_argument('patient_id', type=int)
+    sub.add_argument('doctor_id', type=int)
+    sub.add_argument('date')
+    sub.add_argument('time')
+
+    ids(command('cancel', _cancel, "cancel appointments"), "appointment")
+
+    sub = command('reschedule', _reschedule, "move an appointment to a free slot")
+    sub.add_argument('appointment_id', type=int)
+    sub.add_argument('date')
+    sub.add_argument('time')
+
+    ids(command('complete', _complete, "mark appointments as completed"), "appointment")
+
+    sub = command('complete-day', _complete_day, "complete a doctor's appointments on one day")
+    sub.add_argument('doctor_id', type=int)
+    sub.add_argument('date', nargs='?', help="default: today")
+
+    sub = command('bill', _bill, "generate a bill")
+    sub.add_argument('patient_id', type=int)
+    sub.add_argument('consultation_fee', type=float)
+    sub.add_argument('medication_fee', type=float)
+
+    ids(command('pay', _pay, "mark bills as paid, e.g. from a remittance file"), "bill")
+
+    sub = command('payment', _payment, "record a partial payment")
+    sub.add_argument('bill_id', type=int)
+    sub.add_argument('amount', type=float)
+
+    sub = command('delete', _delete, "delete patients or doctors")
+    sub.add_argument('kind', choices=('patient', 'doctor'))
+    ids(sub, "patient or doctor")
+    sub.add_argument('--no-cascade', action='store_true',
+                     help="fail instead of deleting their appointments and bills")
+
+    sub = command('invoice', _invoice, "bill completed appointments not billed yet")
+    sub.add_argument('--from', dest='date_from')
+    sub.add_argument('--to', dest='date_to')
+
+    sub = command('balance', _balance, "outstanding and paid totals of a patient")
+    sub.add_argument('patient_id', type=int)
+
+    sub = command('top-debtors', _top_debtors, "patients owing the most")
+    sub.add_argument('-k', type=int, default=10)
+
+    sub = command('utilization', _utilization, "booked slots against doctors' working hours")
+    sub.add_argument('date')
+    sub.add_argument('--specialization')
+    sub.add_argument('--doctor', type=int, help="one doctor, over DATE to --to")
+    sub.add_argument('--to')
+
+    sub = command('least-loaded', _least_loaded, "doctor to route a new patient to")
+    sub.add_argument('specialization')
+    sub.add_argument('date')
+
+    sub = command('duplicates', _duplicates, "find (and --merge) duplicate patients")
+    sub.add_argument('--threshold', type=float, default=0.8)
+    sub.add_argument('--merge', action='store_true',
+                     help="merge each group into its oldest registration")
+
+    command('stats', _stats, "system statistics")
+
+    sub = command('search', _search, "find patients by disease, e.g. 'diabetes or hypertension'")
+    sub.add_argument('query')
+    sub.add_argument('--limit', type=int, default=100)
+    sub.add_argument('--count', action='store_true', help="only count the matches")
+
+    sub = command('history', _history, "audited changes of one record, oldest first")
+    sub.add_argument('section', choices=('patients', 'doctors', 'appointments', 'bills',
+                                         'payments', 'invoices'))
+    sub.add_argument('id', type=int)
+    sub.add_argument('--field', help="only changes to this field, e.g. disease")
+
+    sub = command('report', _report, "month-end report")
+    sub.add_argument('--month', help="YYYY-MM (default: all time)")
+    sub.add_argument('--workers', type=int, default=None)
+
+    command('archive', _archive, "archive closed appointments and paid bills")
+    command('compact', _compact, "drop deleted records for good")
+    return parser
+
+
+# ==================== RUNNER ====================
+
+def _emit(line: dict):
+    print(json.dumps(line, default=str), flush=True)
+
+
+def _command_lines(files: List[str]):
+    for path in files:
+        f = sys.stdin if path == '-' else open(path)
+        try:
+            for number, line in enumerate(f, 1):
+                tokens = shlex.split(line, comments=True)
+                if tokens:
+                    yield f"{path}:{number}", tokens
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def _execute(parser: argparse.ArgumentParser, system, source: str, tokens: List[str]) -> dict:
+    """Parse and run one command; never raises"""
+    line = {'command': " ".join(tokens), 'source': source}
+    start = time.perf_counter()
+    try:
+        args = parser.parse_args(tokens)
+        if args.handler is None:
+            raise ValueError("'run' cannot be used inside a command file")
+        line['result'] = args.handler(system, args)
+        line['ok'] = True
+    except SystemExit:
+        # argparse already printed the usage error to stderr
+        line['ok'] = False
+        line['error'] = "invalid arguments"
+    except (ValueError, LookupError, OSError) as e:
+        line['ok'] = False
+        line['error'] = str(e)
+    line['ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return line
+
+
+def _data_format(path: str) -> str:
+    """Format of an existing data file, so saving keeps it"""
+    from serializers import detect_serializer
+    if not os.path.exists(path):
+        return "json"
+    with open(path, 'rb') as f:
+        return detect_serializer(f.read(64)).name
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        batch = list(_command_lines(args.files))
+    else:
+        batch = [("argv", list(argv if argv is not None else sys.argv[1:]))]
+
+    from hospital_system import HospitalSystem
+    from persistence import PersistenceError
+    start = time.perf_counter()
+    system = HospitalSystem(args.data_file,
+                            data_format=args.data_format or _data_format(args.data_file))
+    load_ms = (time.perf_counter() - start) * 1000
+    failed = 0
+    executed = 0
+    error = None
+    try:
+        with system.batch(), system.acting_as(args.actor):
+            for source, tokens in batch:
+                line = _execute(parser, system, source, tokens)
+                executed += 1
+                failed += not line['ok']
+                _emit(line)
+                if failed and args.stop_on_error:
+                    break
+            flush_start = time.perf_counter()
+        # The single save of the whole batch happens when the block ends
+        system.flush()
+    except PersistenceError as e:
+        # The commands above only changed memory; none of it reached the disk
+        error = str(e)
+    finally:
+        try:
+            system.close()
+        except PersistenceError as e:
+            error = error or str(e)
+    flush_ms = (time.perf_counter() - flush_start) * 1000
+    summary = {'summary': True, 'commands': executed, 'failed': failed,
+               'skipped': len(batch) - executed, 'saved': error is None,
+               'load_ms': round(load_ms, 3), 'flush_ms': round(flush_ms, 3),
+               'total_ms': round((time.perf_counter() - start) * 1000, 3)}
+    if error is not None:
+        summary['error'] = error
+    _emit(summary)
+    return 1 if failed or error is not None else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
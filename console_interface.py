@@ -1,12 +1,56 @@
 
+import heapq
+import threading
+
 from hospital_system import HospitalSystem
+from persistence import PersistenceError
 
 
 class ConsoleInterface:
     """Console-based user interface"""
     
+    # Records shown per page in list views
+    PAGE_SIZE = 20
+    
     def __init__(self):
-        self.hospital = HospitalSystem()
+        # The menu comes up right away; data loads on a background thread
+        self.hospital = HospitalSystem(load=False)
+        self._load_progress = (0, 1)
+        self._load_error = None
+        self._loader = threading.Thread(target=self._load_data, daemon=True)
+        self._loader.start()
+    
+    def _load_data(self):
+        # An error would otherwise end with the thread and leave the menu
+        # running on empty data, which the next save writes over the file
+        try:
+            self.hospital.load_data(self._on_load_progress)
+        except Exception as e:
+            self._load_error = e
+    
+    def _on_load_progress(self, stage: str, done: int, total: int):
+        self._load_progress = (done, total)
+    
+    def wait_for_data(self):
+        """Block until the background load has finished, showing its progress.
+        
+        Re-raises an error that stopped the load (e.g. DecryptionError).
+        """
+        if self._loader.is_alive():
+            while self._loader.is_alive():
+                done, total = self._load_progress
+                print(f"\r⏳ Loading data... {done * 100 // total}%", end="", flush=True)
+                self._loader.join(0.1)
+            print("\r" + " " * 30 + "\r", end="", flush=True)
+        if self._load_error is not None:
+            raise self._load_error
+    
+    def _handle(self, action):
+        """Run a menu action, reporting a failed save instead of ending the session"""
+        try:
+            action()
+        except PersistenceError as e:
+            print(f"❌ {e}")
     
     def display_menu(self):
         """Display main menu"""
@@ -33,23 +77,32 @@ class ConsoleInterface:
             print("4. Search Patient by Name")
             print("5. Update Patient")
             print("6. Delete Patient")
-            print("7. Back to Main Menu")
+            print("7. Restore Deleted Patient")
+            print("8. Find & Merge Duplicates")
+            print("9. Search Patients by Disease")
+            print("10. Back to Main Menu")
             
             choice = input("\nEnter choice: ")
             
             if choice == '1':
-                self.add_patient()
+                self._handle(self.add_patient)
             elif choice == '2':
-                self.view_patients()
+                self._handle(self.view_patients)
             elif choice == '3':
-                self.search_patient_by_id()
+                self._handle(self.search_patient_by_id)
             elif choice == '4':
-                self.search_patient_by_name()
+                self._handle(self.search_patient_by_name)
             elif choice == '5':
-                self.update_patient()
+                self._handle(self.update_patient)
             elif choice == '6':
-                self.delete_patient()
+                self._handle(self.delete_patient)
             elif choice == '7':
+                self._handle(self.restore_patient)
+            elif choice == '8':
+                self._handle(self.merge_duplicates)
+            elif choice == '9':
+                self._handle(self.search_patients_by_disease)
+            elif choice == '10':
                 break
             else:
                 print("❌ Invalid choice!")
@@ -68,21 +121,24 @@ class ConsoleInterface:
                 print("❌ Invalid age!")
                 return
             
+            matches = self.hospital.find_possible_duplicates(name, contact, age, gender)
+            if matches:
+                print("\n⚠️  This patient may already be registered:")
+                for match, score in matches[:5]:
+                    print(f"   {self.hospital.format_record(match)} (match {score:.0%})")
+                if input("Register anyway? (yes/no): ").lower() != 'yes':
+                    return
+            
             patient = self.hospital.add_patient(name, age, gender, contact, disease)
             print(f"\n✅ Patient added successfully! ID: {patient.person_id}")
         except ValueError as e:
             print(f"❌ Error: {e}")
     
     def view_patients(self):
-        """View all patients"""
+        """View all patients, one page at a time"""
         print("\n--- All Patients ---")
-        patients = self.hospital.get_all_patients()
-        if not patients:
-            print("No patients found.")
-            return
-        
-        for patient in patients:
-            print(patient.display_info())
+        self.show_pages(lambda cursor: self.hospital.page_patients(
+            self.PAGE_SIZE, cursor=cursor), "No patients found.")
     
     def search_patient_by_id(self):
         """Search patient by ID"""
@@ -90,7 +146,7 @@ class ConsoleInterface:
             patient_id = int(input("\nEnter Patient ID: "))
             patient = self.hospital.get_patient(patient_id)
             if patient:
-                print("\n" + patient.display_info())
+                print("\n" + self.hospital.format_record(patient))
             else:
                 print("❌ Patient not found.")
         except ValueError:
@@ -103,10 +159,26 @@ class ConsoleInterface:
         if patients:
             print(f"\n--- Found {len(patients)} patient(s) ---")
             for patient in patients:
-                print(patient.display_info())
+                print(self.hospital.format_record(patient))
         else:
             print("❌ No patients found with that name.")
     
+    def search_patients_by_disease(self):
+        """Search patients by disease words, e.g. 'diabetes or hypertension'"""
+        query = input("\nDiseases (words, AND/OR/NOT, prefix*): ").strip()
+        try:
+            counts = self.hospital.count_patients_by_disease(query)
+            patients = self.hospital.search_patients_by_disease(query, limit=self.PAGE_SIZE)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
+        words = ", ".join(f"{word}: {count}" for word, count in counts['words'].items())
+        print(f"\n--- {counts['count']} patient(s) match ({words}) ---")
+        for patient in patients:
+            print(self.hospital.format_record(patient))
+        if counts['count'] > len(patients):
+            print(f"... showing the first {len(patients)}")
+    
     def update_patient(self):
         """Update patient information"""
         try:
@@ -136,6 +208,7 @@ class ConsoleInterface:
                 return
             
             print(f"\nPatient: {patient.name}")
+            self.warn_dependents('patients', patient_id)
             confirm = input("Are you sure? (yes/no): ").lower()
             
             if confirm == 'yes':
@@ -146,6 +219,40 @@ class ConsoleInterface:
         except ValueError:
             print("❌ Invalid ID")
     
+    def restore_patient(self):
+        """Bring back a deleted patient and the records deleted with them"""
+        try:
+            patient_id = int(input("\nEnter Patient ID to restore: "))
+            if self.hospital.restore_patient(patient_id):
+                print("✅ Patient restored successfully!")
+            else:
+                print("❌ No deleted patient with that ID (it may have been compacted).")
+        except ValueError:
+            print("❌ Invalid ID")
+    
+    def merge_duplicates(self):
+        """List groups of duplicate registrations and merge each into its oldest"""
+        groups = self.hospital.find_duplicate_patients()
+        if not groups:
+            print("\n✅ No duplicate patients found.")
+            return
+        print(f"\n--- {len(groups)} group(s) of possible duplicates ---")
+        for group in groups:
+            print()
+            for patient in group:
+                print(f"   {self.hospital.format_record(patient)}")
+        if input("\nMerge each group into its oldest record? (yes/no): ").lower() == 'yes':
+            result = self.hospital.dedupe_patients(merge=True)
+            print(f"✅ Merged {result['merged']} duplicate(s), "
+                  f"moved {result['moved']} record(s).")
+    
+    def warn_dependents(self, section: str, owner_id: int):
+        """Tell the user which active records a delete will also remove"""
+        dependents = self.hospital.get_dependents(section, owner_id)
+        counts = [f"{len(records)} {name}" for name, records in dependents.items() if records]
+        if counts:
+            print(f"⚠️  This also deletes {' and '.join(counts)}.")
+    
     # ==================== DOCTOR MENU ====================
     
     def doctor_menu(self):
@@ -157,21 +264,24 @@ class ConsoleInterface:
             print("3. Search Doctor by ID")
             print("4. Search Doctor by Specialization")
             print("5. Delete Doctor")
-            print("6. Back to Main Menu")
+            print("6. Restore Deleted Doctor")
+            print("7. Back to Main Menu")
             
             choice = input("\nEnter choice: ")
             
             if choice == '1':
-                self.add_doctor()
+                self._handle(self.add_doctor)
             elif choice == '2':
-                self.view_doctors()
+                self._handle(self.view_doctors)
             elif choice == '3':
-                self.search_doctor_by_id()
+                self._handle(self.search_doctor_by_id)
             elif choice == '4':
-                self.search_doctor_by_specialization()
+                self._handle(self.search_doctor_by_specialization)
             elif choice == '5':
-                self.delete_doctor()
+                self._handle(self.delete_doctor)
             elif choice == '6':
+                self._handle(self.restore_doctor)
+            elif choice == '7':
                 break
             else:
                 print("❌ Invalid choice!")
@@ -198,15 +308,10 @@ class ConsoleInterface:
             print(f"❌ Error: {e}")
     
     def view_doctors(self):
-        """View all doctors"""
+        """View all doctors, one page at a time"""
         print("\n--- All Doctors ---")
-        doctors = self.hospital.get_all_doctors()
-        if not doctors:
-            print("No doctors found.")
-            return
-        
-        for doctor in doctors:
-            print(doctor.display_info())
+        self.show_pages(lambda cursor: self.hospital.page_doctors(
+            self.PAGE_SIZE, cursor=cursor), "No doctors found.")
     
     def search_doctor_by_id(self):
         """Search doctor by ID"""
@@ -214,7 +319,7 @@ class ConsoleInterface:
             doctor_id = int(input("\nEnter Doctor ID: "))
             doctor = self.hospital.get_doctor(doctor_id)
             if doctor:
-                print("\n" + doctor.display_info())
+                print("\n" + self.hospital.format_record(doctor))
             else:
                 print("❌ Doctor not found.")
         except ValueError:
@@ -227,7 +332,7 @@ class ConsoleInterface:
         if doctors:
             print(f"\n--- Found {len(doctors)} doctor(s) ---")
             for doctor in doctors:
-                print(doctor.display_info())
+                print(self.hospital.format_record(doctor))
         else:
             print("❌ No doctors found with that specialization.")
     
@@ -241,6 +346,7 @@ class ConsoleInterface:
                 return
             
             print(f"\nDoctor: {doctor.name}")
+            self.warn_dependents('doctors', doctor_id)
             confirm = input("Are you sure? (yes/no): ").lower()
             
             if confirm == 'yes':
@@ -251,6 +357,17 @@ class ConsoleInterface:
         except ValueError:
             print("❌ Invalid ID")
     
+    def restore_doctor(self):
+        """Bring back a deleted doctor and the appointments deleted with them"""
+        try:
+            doctor_id = int(input("\nEnter Doctor ID to restore: "))
+            if self.hospital.restore_doctor(doctor_id):
+                print("✅ Doctor restored successfully!")
+            else:
+                print("❌ No deleted doctor with that ID (it may have been compacted).")
+        except ValueError:
+            print("❌ Invalid ID")
+    
     # ==================== APPOINTMENT MENU ====================
     
     def appointment_menu(self):
@@ -262,21 +379,30 @@ class ConsoleInterface:
             print("3. View Patient Appointments")
             print("4. View Doctor Appointments")
             print("5. Cancel Appointment")
-            print("6. Back to Main Menu")
+            print("6. Reschedule Appointment")
+            print("7. Complete Appointment")
+            print("8. Complete Doctor's Day")
+            print("9. Back to Main Menu")
             
             choice = input("\nEnter choice: ")
             
             if choice == '1':
-                self.schedule_appointment()
+                self._handle(self.schedule_appointment)
             elif choice == '2':
-                self.view_appointments()
+                self._handle(self.view_all_appointments)
             elif choice == '3':
-                self.view_patient_appointments()
+                self._handle(self.view_patient_appointments)
             elif choice == '4':
-                self.view_doctor_appointments()
+                self._handle(self.view_doctor_appointments)
             elif choice == '5':
-                self.cancel_appointment()
+                self._handle(self.cancel_appointment)
             elif choice == '6':
+                self._handle(self.reschedule_appointment)
+            elif choice == '7':
+                self._handle(self.complete_appointment)
+            elif choice == '8':
+                self._handle(self.complete_doctor_day)
+            elif choice == '9':
                 break
             else:
                 print("❌ Invalid choice!")
@@ -296,18 +422,28 @@ class ConsoleInterface:
         except ValueError as e:
             print(f"❌ Error: {e}")
     
-  
-
-
     def view_all_appointments(self):
-      print("\n--- All Appointments ---")
-      appointments = self.hospital.get_all_appointments()
-      if not appointments:
-            print("No appointments found.")
-            return
-        
-      for appt in appointments:
-            print(appt.display_details())
+        """View appointments page by page, optionally filtered"""
+        print("\n--- All Appointments ---")
+        print("Filters (leave blank for any):")
+        try:
+            filters = {}
+            status = input("Status (Scheduled/Completed/Cancelled/Rescheduled): ").strip()
+            if status:
+                filters['status'] = status.capitalize()
+            doctor_id = input("Doctor ID: ").strip()
+            if doctor_id:
+                filters['doctor_id'] = int(doctor_id)
+            filters['date_from'] = input("From date (DD-MM-YYYY): ").strip() or None
+            filters['date_to'] = input("To date (DD-MM-YYYY): ").strip() or None
+            sort_by = 'date' if input("Sort by date? (yes/no): ").lower() == 'yes' else 'id'
+            
+            print()
+            self.show_pages(lambda cursor: self.hospital.page_appointments(
+                self.PAGE_SIZE, cursor=cursor, sort_by=sort_by, **filters),
+                "No appointments found.")
+        except ValueError as e:
+            print(f"❌ Error: {e}")
     
     def view_patient_appointments(self):
         """View appointments for a specific patient"""
@@ -317,7 +453,7 @@ class ConsoleInterface:
             if appointments:
                 print(f"\n--- Appointments for Patient {patient_id} ---")
                 for appt in appointments:
-                    print(appt.display_details())
+                    print(self.hospital.format_record(appt))
             else:
                 print("❌ No appointments found for this patient.")
         except ValueError:
@@ -331,7 +467,7 @@ class ConsoleInterface:
             if appointments:
                 print(f"\n--- Appointments for Doctor {doctor_id} ---")
                 for appt in appointments:
-                    print(appt.display_details())
+                    print(self.hospital.format_record(appt))
             else:
                 print("❌ No appointments found for this doctor.")
         except ValueError:
@@ -346,7 +482,7 @@ class ConsoleInterface:
                 print("❌ Appointment not found.")
                 return
             
-            print(f"\n{appointment.display_details()}")
+            print(f"\n{self.hospital.format_record(appointment)}")
             confirm = input("Cancel this appointment? (yes/no): ").lower()
             
             if confirm == 'yes':
@@ -357,6 +493,40 @@ class ConsoleInterface:
         except ValueError:
             print("❌ Invalid ID")
     
+    def reschedule_appointment(self):
+        """Move an appointment to another date and time"""
+        print("\n--- Reschedule Appointment ---")
+        try:
+            appt_id = int(input("Appointment ID: "))
+            date = input("New Date (DD-MM-YYYY): ").strip()
+            time = input("New Time (HH:MM): ").strip()
+            
+            appointment = self.hospital.reschedule_appointment(appt_id, date, time)
+            print(f"\n✅ {self.hospital.format_record(appointment)}")
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+    
+    def complete_appointment(self):
+        """Mark an appointment as completed"""
+        try:
+            appt_id = int(input("\nEnter Appointment ID to complete: "))
+            if self.hospital.complete_appointment(appt_id):
+                print("✅ Appointment completed!")
+            else:
+                print("❌ No scheduled appointment with that ID.")
+        except ValueError:
+            print("❌ Invalid ID")
+    
+    def complete_doctor_day(self):
+        """Complete all of a doctor's appointments on one day"""
+        try:
+            doctor_id = int(input("\nEnter Doctor ID: "))
+            date = input("Date (DD-MM-YYYY, blank for today): ").strip() or None
+            completed = self.hospital.complete_doctor_day(doctor_id, date)
+            print(f"✅ {len(completed)} appointment(s) completed.")
+        except ValueError:
+            print("❌ Invalid ID")
+    
     # ==================== BILLING MENU ====================
     
     def billing_menu(self):
@@ -367,19 +537,31 @@ class ConsoleInterface:
             print("2. View All Bills")
             print("3. View Patient Bills")
             print("4. Mark Bill as Paid")
-            print("5. Back to Main Menu")
+            print("5. Record Partial Payment")
+            print("6. Patient Balance")
+            print("7. Top Debtors")
+            print("8. Invoice Completed Appointments")
+            print("9. Back to Main Menu")
             
             choice = input("\nEnter choice: ")
             
             if choice == '1':
-                self.generate_bill()
+                self._handle(self.generate_bill)
             elif choice == '2':
-                self.view_bills()
+                self._handle(self.view_bills)
             elif choice == '3':
-                self.view_patient_bills()
+                self._handle(self.view_patient_bills)
             elif choice == '4':
-                self.mark_bill_paid()
+                self._handle(self.mark_bill_paid)
             elif choice == '5':
+                self._handle(self.record_payment)
+            elif choice == '6':
+                self._handle(self.show_patient_balance)
+            elif choice == '7':
+                self._handle(self.show_top_debtors)
+            elif choice == '8':
+                self._handle(self.invoice_completed_appointments)
+            elif choice == '9':
                 break
             else:
                 print("❌ Invalid choice!")
@@ -395,20 +577,17 @@ class ConsoleInterface:
             bill = self.hospital.generate_bill(patient_id, consultation_fee, 
                                               medication_fee)
             print("\n✅ Bill Generated!")
-            print(bill.display_bill())
+            print(self.hospital.format_record(bill))
         except ValueError as e:
             print(f"❌ Error: {e}")
     
     def view_bills(self):
-        """View all bills"""
+        """View bills page by page, optionally only paid or unpaid ones"""
         print("\n--- All Bills ---")
-        bills = self.hospital.get_all_bills()
-        if not bills:
-            print("No bills found.")
-            return
-        
-        for bill in bills:
-            print(bill.display_bill())
+        status = input("Status (Paid/Unpaid, blank for all): ").strip().capitalize()
+        self.show_pages(lambda cursor: self.hospital.page_bills(
+            self.PAGE_SIZE, cursor=cursor, status=status or None),
+            "No bills found.")
     
     def view_patient_bills(self):
         """View bills for a specific patient"""
@@ -421,7 +600,7 @@ class ConsoleInterface:
             
             print(f"\n--- Bills for Patient {patient_id} ---")
             for bill in bills:
-                print(bill.display_bill())
+                print(self.hospital.format_record(bill))
         except ValueError:
             print("❌ Invalid ID")
     
@@ -436,10 +615,100 @@ class ConsoleInterface:
         except ValueError:
             print("❌ Invalid ID")
     
+    def record_payment(self):
+        """Record a full or partial payment against a bill"""
+        try:
+            bill_id = int(input("\nEnter Bill ID: "))
+            print(f"Amount due: ${self.hospital.get_bill_balance(bill_id):.2f}")
+            amount = float(input("Payment Amount: $"))
+            payment = self.hospital.record_payment(bill_id, amount)
+            print(f"✅ Payment recorded! Remaining: "
+                  f"${self.hospital.get_bill_balance(bill_id):.2f}")
+            print(self.hospital.format_record(payment))
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+    
+    def show_patient_balance(self):
+        """Show what a patient owes and has paid"""
+        try:
+            patient_id = int(input("\nEnter Patient ID: "))
+            balance = self.hospital.get_patient_balance(patient_id)
+            print(f"\n💰 Patient {patient_id}: outstanding ${balance['outstanding']:.2f}, "
+                  f"paid ${balance['paid']:.2f}")
+        except ValueError:
+            print("❌ Invalid ID")
+    
+    def show_top_debtors(self):
+        """List the patients with the largest outstanding balances"""
+        debtors = self.hospital.top_debtors(10)
+        if not debtors:
+            print("\nNo outstanding balances.")
+            return
+        print("\n--- Top Debtors ---")
+        for patient_id, outstanding in debtors:
+            patient = self.hospital.get_patient(patient_id)
+            name = patient.name if patient else "(deleted)"
+            print(f"   {patient_id}: {name} owes ${outstanding:.2f}")
+    
+    def invoice_completed_appointments(self):
+        """Bill all completed appointments in a date range that have no bill yet"""
+        print("\n--- Invoice Completed Appointments ---")
+        date_from = input("From date (DD-MM-YYYY, blank for any): ").strip() or None
+        date_to = input("To date (DD-MM-YYYY, blank for any): ").strip() or None
+        try:
+            result = self.hospital.invoice_completed_appointments(date_from, date_to)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            return
+        print(f"✅ Billed {result['billed']} appointment(s) for ${result['amount']:.2f}; "
+              f"{result['already_billed']} already billed, {result['skipped']} skipped.")
+        print(f"⏱️  {result['scanned']} appointment(s) in {result['ms']:.1f} ms "
+              f"({result['per_second']:.0f}/s)")
+    
     # ==================== REPORTS ====================
     
     def reports_menu(self):
-        """Display system statistics and reports"""
+        """Reports and statistics submenu"""
+        while True:
+            print("\n--- Reports & Statistics ---")
+            print("1. System Statistics")
+            print("2. Performance Metrics")
+            print("3. Enable/Disable Instrumentation")
+            print("4. Profile System Calls")
+            print("5. Export Metrics to JSON")
+            print("6. Archive Closed Records")
+            print("7. Compact Deleted Records")
+            print("8. Month-End Report")
+            print("9. Doctor Load & Routing")
+            print("10. Back to Main Menu")
+            
+            choice = input("\nEnter choice: ")
+            
+            if choice == '1':
+                self._handle(self.show_statistics)
+            elif choice == '2':
+                self._handle(self.show_performance_metrics)
+            elif choice == '3':
+                self._handle(self.toggle_instrumentation)
+            elif choice == '4':
+                self._handle(self.profile_system_calls)
+            elif choice == '5':
+                self._handle(self.export_metrics)
+            elif choice == '6':
+                self._handle(self.archive_closed_records)
+            elif choice == '7':
+                self._handle(self.compact_deleted_records)
+            elif choice == '8':
+                self._handle(self.month_end_report)
+            elif choice == '9':
+                self._handle(self.doctor_load)
+            elif choice == '10':
+                break
+            else:
+                print("❌ Invalid choice!")
+    
+    def show_statistics(self):
+        """Display system statistics"""
         print("\n" + "="*50)
         print("           SYSTEM STATISTICS")
         print("="*50)
@@ -464,6 +733,178 @@ class ConsoleInterface:
         print("\n" + "="*50)
         input("\nPress Enter to continue...")
     
+    def show_performance_metrics(self):
+        """Display cache counters and per-method latencies and persisted bytes"""
+        print("\n--- Cache Statistics ---")
+        for name, s in self.hospital.cache_stats().items():
+            print(f"{name:<10} size {s['size']}/{s['maxsize']}, hits {s['hits']}, "
+                  f"misses {s['misses']}, hit rate {s['hit_rate']:.0%}, "
+                  f"evictions {s['evictions']}")
+        
+        instrumentation = self.hospital.instrumentation
+        if instrumentation is None:
+            print("\nInstrumentation is disabled; enable it to see method timings.")
+            return
+        
+        metrics = instrumentation.get_metrics()
+        print("\n" + "="*70)
+        print(f"  PERFORMANCE METRICS (since {metrics['since']})")
+        print("="*70)
+        if not metrics['methods']:
+            print("No calls recorded yet.")
+        else:
+            print(f"{'Method':<32}{'Calls':>7}{'Avg ms':>9}{'Max ms':>9}{'Bytes':>12}")
+            print("-"*70)
+            for name, m in metrics['methods'].items():
+                print(f"{name:<32}{m['calls']:>7}{m['avg_ms']:>9.2f}"
+                      f"{m['max_ms']:>9.2f}{m['bytes_persisted']:>12}")
+        if instrumentation.last_profile:
+            print("\n--- Last Profile ---")
+            print(instrumentation.last_profile)
+        print("="*70)
+    
+    def toggle_instrumentation(self):
+        """Turn instrumentation on or off"""
+        if self.hospital.instrumentation is None:
+            self.hospital.enable_instrumentation()
+            print("✅ Instrumentation enabled.")
+        else:
+            self.hospital.disable_instrumentation()
+            print("✅ Instrumentation disabled.")
+    
+    def profile_system_calls(self):
+        """Attach cProfile to system calls for a time window"""
+        try:
+            seconds = float(input("\nProfile for how many seconds? "))
+            if seconds <= 0:
+                print("❌ Duration must be positive")
+                return
+            output_file = input("Save raw profile to (blank to skip): ").strip()
+            instrumentation = self.hospital.enable_instrumentation()
+            instrumentation.start_profiling(seconds, output_file or None)
+            print(f"✅ Profiling system calls for the next {seconds:g} seconds.")
+        except ValueError:
+            print("❌ Invalid duration")
+    
+    def export_metrics(self):
+        """Export collected metrics as JSON"""
+        instrumentation = self.hospital.instrumentation
+        if instrumentation is None:
+            print("❌ Instrumentation is disabled. Enable it first.")
+            return
+        
+        path = input("\nExport file [metrics.json]: ").strip() or "metrics.json"
+        try:
+            instrumentation.export_json(path)
+            print(f"✅ Metrics exported to {path}")
+        except OSError as e:
+            print(f"❌ Error: {e}")
+    
+    def archive_closed_records(self):
+        """Move closed appointments and paid bills to the read-only archive"""
+        confirm = input("\nArchive completed/cancelled appointments and paid bills? (yes/no): ").lower()
+        if confirm != 'yes':
+            return
+        try:
+            moved = self.hospital.archive_closed()
+            print(f"✅ Archived {moved['appointments']} appointment(s) "
+                  f"and {moved['bills']} bill(s).")
+        except OSError as e:
+            print(f"❌ Error: {e}")
+    
+    def compact_deleted_records(self):
+        """Permanently drop deleted records from memory and the data file"""
+        pending = self.hospital.deleted_counts()
+        if not any(pending.values()):
+            print("\nNo deleted records to compact.")
+            return
+        print("\nDeleted records: " +
+              ", ".join(f"{count} {name}" for name, count in pending.items() if count))
+        confirm = input("Remove them for good? They cannot be restored afterwards. (yes/no): ").lower()
+        if confirm != 'yes':
+            return
+        removed = self.hospital.compact()
+        print(f"✅ Compacted {sum(removed.values())} record(s).")
+    
+    def month_end_report(self):
+        """Revenue by patient, unpaid balances and doctor utilization"""
+        # Pulls in multiprocessing, so only loaded when a report is run
+        from reports import ReportEngine
+        month = input("\nMonth (YYYY-MM, blank for all time): ").strip() or None
+        report = ReportEngine(self.hospital).month_end_report(month)
+        top = 10
+        
+        print("\n" + "="*50)
+        print(f"      MONTH-END REPORT ({month or 'all time'})")
+        print("="*50)
+        print(f"\n💰 Revenue: ${report['total_revenue']:.2f}, "
+              f"unpaid: ${report['total_unpaid']:.2f}")
+        
+        print(f"\nTop {top} patients by revenue:")
+        revenue = report['revenue_by_patient']
+        for patient_id in heapq.nlargest(top, revenue, key=revenue.get):
+            print(f"   Patient {patient_id}: ${revenue[patient_id]:.2f}")
+        
+        print(f"\nLargest unpaid balances:")
+        unpaid = report['unpaid_balances']
+        for patient_id in heapq.nlargest(top, unpaid, key=unpaid.get):
+            print(f"   Patient {patient_id}: ${unpaid[patient_id]:.2f}")
+        
+        print("\nDoctor utilization (completed / non-cancelled):")
+        utilization = report['doctor_utilization']
+        for doctor_id in sorted(utilization):
+            entry = utilization[doctor_id]
+            print(f"   Doctor {doctor_id}: {entry['utilization']:.0%} "
+                  f"of {entry['total']} appointment(s)")
+        
+        timings = report['timings']
+        print(f"\n⏱️  {report['chunks']} chunk(s) on {report['workers']} worker(s): "
+              f"{sum(timings.values()):.1f} ms")
+        input("\nPress Enter to continue...")
+    
+    def doctor_load(self):
+        """Booked slots per doctor on a day and the doctor to route a new patient to"""
+        try:
+            date = input("\nDate (DD-MM-YYYY): ").strip()
+            specialization = input("Specialization (blank for all): ").strip() or None
+            load = self.hospital.get_utilization(date, specialization)
+            
+            print(f"\n--- Doctor Load on {date} ---")
+            for doctor_id, entry in load.items():
+                if entry['capacity']:
+                    print(f"   Doctor {doctor_id}: {entry['booked']}/{entry['capacity']} "
+                          f"slots ({entry['utilization']:.0f}%)")
+                elif entry['booked']:
+                    print(f"   Doctor {doctor_id}: {entry['booked']} booked while off duty")
+            if specialization:
+                doctor = self.hospital.least_loaded_doctor(specialization, date)
+                if doctor:
+                    print(f"\n➡️  Least loaded: Dr. {doctor.name} (ID {doctor.person_id})")
+                else:
+                    print("\n❌ No doctor of that specialization has a free slot.")
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+    
+    # ==================== PAGING ====================
+    
+    def show_pages(self, fetch_page, empty_message: str):
+        """Print records page by page until the user stops or they run out"""
+        cursor = None
+        shown = 0
+        while True:
+            page = fetch_page(cursor)
+            for entity in page:
+                print(self.hospital.format_record(entity))
+            shown += len(page)
+            if not page.has_more:
+                break
+            answer = input(f"\n-- {shown} shown. Enter for more, 'q' to stop: ")
+            if answer.strip().lower() == 'q':
+                break
+            cursor = page.next_cursor
+        if not shown:
+            print(empty_message)
+    
     # ==================== MAIN LOOP ====================
     
     def run(self):
@@ -473,6 +914,7 @@ class ConsoleInterface:
         while True:
             self.display_menu()
             choice = input("\nEnter your choice: ")
+            self.wait_for_data()
             
             if choice == '1':
                 self.patient_menu()
@@ -487,6 +929,7 @@ class ConsoleInterface:
             elif choice == '6':
                 print("\n✅ Thank you for using MediCare HMS!")
                 print("🏥 System shutting down...")
+                self.hospital.close()
                 break
             else:
                 print("❌ Invalid choice! Please try again.")
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+Duplicate patient detection: blocking keys plus a similarity score
+"""
+
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# Score from which two registrations count as the same person
+DUPLICATE_THRESHOLD = 0.8
+# Trailing digits of a contact number compared for blocking
+CONTACT_DIGITS = 7
+# Neighbours each patient is compared with inside a large block
+BLOCK_WINDOW = 50
+# Score weights: name similarity, then a matching contact number, or a
+# same-sounding name when either contact is missing
+NAME_WEIGHT = 0.7
+CONTACT_WEIGHT = 0.3
+SOUND_WEIGHT = 0.15
+MISMATCH_PENALTY = 0.2
+
+_SOUNDEX_CODES = {letter: str(code)
+                  for code, letters in enumerate(("bfpv", "cgjkqsxz", "dt", "l", "mn", "r"), 1)
+                  for letter in letters}
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+_NON_DIGITS = re.compile(r"\D+")
+
+
+@lru_cache(maxsize=65536)
+def soundex(word: str) -> str:
+    """American Soundex code of a word, e.g. Robert and Rupert -> R163.
+
+    Words that are not all letters are their own code.
+    """
+    word = word.lower()
+    if not word.isalpha():
+        return word
+    code = word[0].upper()
+    last = _SOUNDEX_CODES.get(word[0])
+    for letter in word[1:]:
+        digit = _SOUNDEX_CODES.get(letter)
+        if digit is not None and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in "hw":
+            # h and w do not separate letters with the same code
+            last = digit
+    return code.ljust(4, "0")
+
+
+def name_tokens(name: str) -> List[str]:
+    """Lower-case name words without punctuation, titles kept out"""
+    return [token for token in _NON_WORD.sub(" ", name.lower()).split()
+            if token not in ("mr", "mrs", "ms", "miss", "dr")]
+
+
+def contact_digits(contact: str) -> str:
+    """Last CONTACT_DIGITS digits of a contact ('' if it has fewer)"""
+    digits = _NON_DIGITS.sub("", contact)
+    return digits[-CONTACT_DIGITS:] if len(digits) >= CONTACT_DIGITS else ""
+
+
+def blocking_keys(name: str, contact: str) -> Set[tuple]:
+    """Keys under which possible duplicates of a registration are looked up.
+
+    Names are keyed by the Soundex codes of their words in any order (so
+    "John Smith", "Jon Smyth" and "Smith, John" share a key) and contacts
+    by their trailing digits.
+    """
+    keys = set()
+    codes = sorted(soundex(token) for token in name_tokens(name))
+    if codes:
+        keys.add(('name',) + tuple(codes))
+    if len(codes) > 2:
+        # Middle names are often left out
+        keys.add(('name', codes[0], codes[-1]))
+    digits = contact_digits(contact)
+    if digits:
+        keys.add(('contact', digits))
+    return keys
+
+
+def similarity(name: str, contact: str, age: Optional[int], gender: Optional[str],
+               other) -> float:
+    """How likely a registration and an existing patient are the same person (0-1).
+
+    Mostly name similarity, raised by a matching contact number (or, when
+    either has none, a name that sounds the same) and lowered by ages more
+    than a year apart or a different gender. Namesakes with different
+    contact numbers stay below the default threshold.
+    """
+    tokens = " ".join(sorted(name_tokens(name)))
+    other_tokens = " ".join(sorted(name_tokens(other.name)))
+    score = NAME_WEIGHT * SequenceMatcher(None, tokens, other_tokens).ratio()
+    digits = contact_digits(contact)
+    other_digits = contact_digits(other.contact)
+    if digits and digits == other_digits:
+        score += CONTACT_WEIGHT
+    elif not (digits and other_digits) and _same_sounding(tokens, other_tokens):
+        score += SOUND_WEIGHT
+    if age is not None and abs(age - other.age) > 1:
+        score -= MISMATCH_PENALTY
+    if gender and other.gender and gender[:1].lower() != other.gender[:1].lower():
+        score -= MISMATCH_PENALTY
+    return round(max(0.0, score), 3)
+
+
+def may_match(digits: str, other_digits: str, threshold: float) -> bool:
+    """False if two different contact numbers already keep a pair below threshold.
+
+    Lets the index skip namesakes without scoring their names.
+    """
+    return threshold <= NAME_WEIGHT or not digits or not other_digits or digits == other_digits
+
+
+def _same_sounding(tokens: str, other_tokens: str) -> bool:
+    return (sorted(soundex(t) for t in tokens.split()) ==
+            sorted(soundex(t) for t in other_tokens.split()))
+
+
+class DuplicateIndex:
+    """Patients grouped by blocking key.
+
+    A registration is only scored against the patients sharing one of its
+    keys, so checking for duplicates costs the size of a few small blocks
+    rather than a pass over every patient.
+    """
+
+    # Sections the index is derived from
+    SECTIONS = ('patients',)
+
+    def __init__(self):
+        self._blocks: Dict[tuple, Dict[int, object]] = {}
+        # patient id -> keys it was filed under
+        self._keys: Dict[int, Set[tuple]] = {}
+        self._digits: Dict[int, str] = {}
+
+    def build(self, patients):
+        self._blocks = {}
+        self._keys = {}
+        self._digits = {}
+        for patient in patients:
+            self.add(patient)
+
+    def add(self, patient):
+        if patient.is_deleted:
+            return
+        keys = self._keys[patient.person_id] = blocking_keys(patient.name, patient.contact)
+        self._digits[patient.person_id] = contact_digits(patient.contact)
+        for key in keys:
+            self._blocks.setdefault(key, {})[patient.person_id] = patient
+
+    def discard(self, patient):
+        self._digits.pop(patient.person_id, None)
+        for key in self._keys.pop(patient.person_id, ()):
+            block = self._blocks[key]
+            block.pop(patient.person_id, None)
+            if not block:
+                del self._blocks[key]
+
+    def sync(self, patient):
+        """Re-file a patient after its name, contact or tombstone changed"""
+        self.discard(patient)
+        self.add(patient)
+
+    def candidates(self, name: str, contact: str) -> Dict[int, object]:
+        """Patients sharing a blocking key with a registration, by id"""
+        found = {}
+        for key in blocking_keys(name, contact):
+            found.update(self._blocks.get(key, {}))
+        return found
+
+    def matches(self, name: str, contact: str, age: Optional[int] = None,
+                gender: Optional[str] = None,
+                threshold: float = DUPLICATE_THRESHOLD) -> List[Tuple[object, float]]:
+        """Likely duplicates of a registration as (patient, score), best first"""
+        digits = contact_digits(contact)
+        scored = [(patient, similarity(name, contact, age, gender, patient))
+                  for patient_id, patient in self.candidates(name, contact).items()
+                  if may_match(digits, self._digits[patient_id], threshold)]
+        scored = [(patient, score) for patient, score in scored if score >= threshold]
+        scored.sort(key=lambda match: (-match[1], match[0].person_id))
+        return scored
+
+    def groups(self, threshold: float = DUPLICATE_THRESHOLD) -> List[List[int]]:
+        """Ids of patients that look like the same person, oldest first per group.
+
+        Pairs are only scored within blocks and linked transitively. Patients
+        with different contact numbers cannot reach a threshold above
+        NAME_WEIGHT, so name blocks only pair up patients lacking one (pairs
+        with the same number meet in their contact block). In a block larger
+        than BLOCK_WINDOW, patients sorted by name are only compared with
+        their BLOCK_WINDOW nearest neighbours.
+        """
+        parent: Dict[int, int] = {}
+
+        def root(patient_id: int) -> int:
+            while parent.get(patient_id, patient_id) != patient_id:
+                patient_id = parent[patient_id]
+            return patient_id
+
+        scored = set()
+        for key, block in self._blocks.items():
+            for first, second in self._block_pairs(key, block, threshold):
+                pair = (min(first.person_id, second.person_id),
+                        max(first.person_id, second.person_id))
+                if pair in scored:
+                    continue
+                scored.add(pair)
+                if similarity(first.name, first.contact, first.age, first.gender,
+                              second) >= threshold:
+                    a, b = root(pair[0]), root(pair[1])
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+        groups: Dict[int, List[int]] = {}
+        for patient_id in parent:
+            groups.setdefault(root(patient_id), []).append(patient_id)
+        return sorted(sorted({group_root} | set(members))
+                      for group_root, members in groups.items())
+
+    def _block_pairs(self, key: tuple, block: Dict[int, object], threshold: float):
+        if len(block) > BLOCK_WINDOW:
+            patients = sorted(block.values(), key=lambda p: (name_tokens(p.name), p.person_id))
+        else:
+            patients = list(block.values())
+        if key[0] == 'name' and threshold > NAME_WEIGHT:
+            for i, first in enumerate(patients):
+                if not self._digits[first.person_id]:
+                    for second in patients[max(0, i - BLOCK_WINDOW):i + BLOCK_WINDOW + 1]:
+                        if second is not first:
+                            yield first, second
+            return
+        for i, first in enumerate(patients):
+            for second in patients[i + 1:i + 1 + BLOCK_WINDOW]:
+                yield first, second
@@ -10,6 +10,10 @@ from person import Person
 class Doctor(Person):
     """Doctor class with specialization and availability"""
     
+    # Serialized field order, shared by to_dict and to_record
+    FIELDS = ('doctor_id', 'name', 'age', 'gender', 'contact',
+              'specialization', 'availability')
+    
     def __init__(self, doctor_id: int, name: str, age: int, gender: str, 
                  contact: str, specialization: str, availability: str):
         super().__init__(doctor_id, name, age, gender, contact)
@@ -24,6 +28,12 @@ class Doctor(Person):
     def availability(self):
         return self._availability
     
+    @availability.setter
+    def availability(self, value):
+        self.before_change()
+        self._availability = value
+        self.mark_dirty()
+    
     def check_availability(self, day: str) -> bool:
         """Check if doctor is available on given day"""
         return day.lower() in self._availability.lower()
@@ -59,3 +69,15 @@ class Doctor(Person):
             data['availability']
         )
     
+    def to_record(self) -> tuple:
+        """Convert doctor object to a compact tuple in FIELDS order"""
+        return (self._person_id, self._name, self._age, self._gender,
+                self._contact, self._specialization, self._availability)
+    
+    @staticmethod
+    def from_record(record) -> 'Doctor':
+        """Create doctor object from a tuple produced by to_record"""
+        doctor = Doctor.__new__(Doctor)
+        (doctor._person_id, doctor._name, doctor._age, doctor._gender,
+         doctor._contact, doctor._specialization, doctor._availability) = record
+        return doctor
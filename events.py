@@ -0,0 +1,146 @@
+"""
+Change feed publishing record-level events to subscribers
+"""
+
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+# Operations carried by change events
+OPERATIONS = ('create', 'update', 'delete', 'restore', 'archive', 'purge')
+
+
+class ChangeEvent:
+    """One change to one record"""
+
+    __slots__ = ('seq', 'section', 'record_id', 'operation', 'fields', 'timestamp')
+
+    def __init__(self, seq: int, section: str, record_id: int, operation: str,
+                 fields: tuple = (), timestamp: float = None):
+        self.seq = seq
+        self.section = section
+        self.record_id = record_id
+        self.operation = operation
+        # Names of the changed fields for updates, empty otherwise
+        self.fields = fields
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def to_dict(self) -> Dict:
+        return {
+            'seq': self.seq,
+            'section': self.section,
+            'record_id': self.record_id,
+            'operation': self.operation,
+            'fields': list(self.fields),
+            'timestamp': self.timestamp
+        }
+
+    def __repr__(self) -> str:
+        return (f"ChangeEvent({self.seq}, {self.section}, {self.record_id}, "
+                f"{self.operation}, {self.fields})")
+
+
+class MissedEventsError(LookupError):
+    """Raised when a consumer resumes from a sequence number no longer buffered"""
+
+    def __init__(self, since: int, oldest: int):
+        super().__init__(f"Events after {since} were dropped; oldest buffered is {oldest}")
+        self.since = since
+        self.oldest = oldest
+
+
+class ChangeFeed:
+    """Numbered change events kept in a bounded ring buffer.
+
+    Subscribers are called synchronously, in order, from the thread that
+    made the change. A consumer that was away can catch up with
+    `since(seq)` as long as the events are still in the buffer; otherwise
+    it gets MissedEventsError and must reload from scratch.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        if capacity <= 0:
+            raise ValueError("Change feed capacity must be positive")
+        self._buffer = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.RLock()
+        self._subscribers: Dict[int, tuple] = {}
+        self._tokens = itertools.count(1)
+        self.errors = 0
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the newest event (0 before the first)"""
+        return self._seq
+
+    @property
+    def capacity(self) -> int:
+        return self._buffer.maxlen
+
+    def publish(self, section: str, record_ids: Iterable[int], operation: str,
+                fields: tuple = ()) -> List[ChangeEvent]:
+        """Record one event per id and deliver them to subscribers"""
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown change operation: {operation}")
+        with self._lock:
+            now = time.time()
+            events = []
+            for record_id in record_ids:
+                self._seq += 1
+                events.append(ChangeEvent(self._seq, section, record_id,
+                                          operation, fields, now))
+            self._buffer.extend(events)
+            subscribers = list(self._subscribers.values())
+            for callback, sections in subscribers:
+                for event in events:
+                    if sections is None or event.section in sections:
+                        self._deliver(callback, event)
+        return events
+
+    def since(self, seq: int, sections: Optional[Iterable[str]] = None) -> List[ChangeEvent]:
+        """Buffered events newer than `seq`, oldest first"""
+        with self._lock:
+            if seq < self._seq and (not self._buffer or self._buffer[0].seq > seq + 1):
+                oldest = self._buffer[0].seq if self._buffer else self._seq + 1
+                raise MissedEventsError(seq, oldest)
+            if seq >= self._seq:
+                return []
+            wanted = set(sections) if sections is not None else None
+            # Sequence numbers are contiguous, so skip straight to the start
+            start = max(0, len(self._buffer) - (self._seq - seq))
+            return [event for event in itertools.islice(self._buffer, start, None)
+                    if wanted is None or event.section in wanted]
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None],
+                  sections: Optional[Iterable[str]] = None,
+                  since: Optional[int] = None) -> int:
+        """Call `callback` for every new event; returns a token for unsubscribe.
+
+        With `since`, buffered events after that sequence number are
+        replayed first, with no gap before live delivery starts.
+        """
+        wanted = frozenset(sections) if sections is not None else None
+        with self._lock:
+            if since is not None:
+                for event in self.since(since, wanted):
+                    self._deliver(callback, event)
+            token = next(self._tokens)
+            self._subscribers[token] = (callback, wanted)
+        return token
+
+    def unsubscribe(self, token: int) -> bool:
+        with self._lock:
+            return self._subscribers.pop(token, None) is not None
+
+    def _deliver(self, callback, event: ChangeEvent):
+        # A failing listener must not break the change that triggered it
+        try:
+            callback(event)
+        except Exception as e:
+            self.errors += 1
+            # Kept off stdout, which may carry machine-read output (cli.py)
+            print(f"Change listener failed on {event}: {e}", file=sys.stderr)
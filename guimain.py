@@ -1,6 +1,9 @@
+import threading
+from bisect import bisect_left
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-from hospital_system import HospitalSystem
+
+from viewmodel import COLUMNS, ViewModel
 
 class MediCareGUI:
     def __init__(self, root):
@@ -8,8 +11,11 @@ class MediCareGUI:
         self.root.title("MediCare Hospital Management System")
         self.root.geometry("1200x800")
         
-        # Initialize backend
-        self.system = HospitalSystem()
+        # Backend is imported and loaded on a background thread, see start_loading
+        self.system = None
+        self.view = None
+        self._load_progress = (0, 1)
+        self._load_error = None
         
         # --- Color Palette ---
         self.COLOR_PRIMARY = "#0056b3"   # Medical Blue
@@ -26,7 +32,68 @@ class MediCareGUI:
                       foreground=[("selected", self.COLOR_PRIMARY)])
         
         self.root.configure(bg=self.COLOR_BG)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.setup_ui()
+        self.start_loading()
+
+    def on_close(self):
+        # Make sure deferred writes reach the disk before exiting
+        self._loader.join()
+        if self.system is not None:
+            try:
+                self.system.close()
+            except Exception as e:
+                if not messagebox.askyesno("Error", f"{e}\n\nQuit without saving?"):
+                    return
+        self.root.destroy()
+
+    # ==================== BACKGROUND LOADING ====================
+    def start_loading(self):
+        self._loader = threading.Thread(target=self._load_system, daemon=True)
+        self._loader.start()
+        self.root.after(50, self._poll_loading)
+
+    def _load_system(self):
+        # Runs off the Tk thread, so it must not touch any widget
+        try:
+            from hospital_system import HospitalSystem
+            # Saves are written by a background thread, not on each click
+            system = HospitalSystem(load=False, durability="deferred")
+            system.load_data(progress=self._on_load_progress)
+            system.prepare_indexes()
+            self.view = ViewModel(system)
+            self.system = system
+        except Exception as e:
+            self._load_error = e
+
+    def _on_load_progress(self, stage, done, total):
+        self._load_progress = (done, total)
+
+    def _poll_loading(self):
+        if self._loader.is_alive():
+            done, total = self._load_progress
+            self.progress["value"] = done * 100 / total
+            self.root.after(50, self._poll_loading)
+            return
+        self.status_bar.pack_forget()
+        if self.system is None:
+            messagebox.showerror("Error", f"Could not load data: {self._load_error}")
+            return
+        for tab in self.tabs.tabs():
+            self.tabs.tab(tab, state="normal")
+        self.on_tab_changed()
+
+    def on_tab_changed(self, event=None):
+        # Tabs are built and filled the first time they are opened
+        tab = self.tabs.select()
+        if self.system is None:
+            return
+        if tab in self._built:
+            if tab == str(self.tab_dash) and self.view.statistics_stale:
+                self.update_stats()
+            return
+        self._built.add(tab)
+        self._tab_init[tab]()
 
     def setup_ui(self):
         # Header
@@ -35,6 +102,13 @@ class MediCareGUI:
         tk.Label(header, text="🏥 MediCare HMS", font=("Helvetica", 26, "bold"), 
                  bg=self.COLOR_PRIMARY, fg=self.COLOR_WHITE).pack(pady=15)
 
+        # Loading indicator, removed once the data is in
+        self.status_bar = tk.Frame(self.root, bg=self.COLOR_BG)
+        self.status_bar.pack(fill="x", padx=20, pady=(10, 0))
+        tk.Label(self.status_bar, text="Loading data...", bg=self.COLOR_BG).pack(side="left")
+        self.progress = ttk.Progressbar(self.status_bar, mode="determinate", maximum=100)
+        self.progress.pack(side="left", fill="x", expand=True, padx=10)
+
         # Tab Control
         self.tabs = ttk.Notebook(self.root)
         self.tabs.pack(fill="both", expand=True, padx=20, pady=20)
@@ -47,16 +121,31 @@ class MediCareGUI:
         self.tab_billing = tk.Frame(self.tabs, bg=self.COLOR_WHITE)
 
         self.tabs.add(self.tab_dash, text=" Dashboard ")
-        self.tabs.add(self.tab_patients, text=" Patients ")
-        self.tabs.add(self.tab_doctors, text=" Doctors ")
-        self.tabs.add(self.tab_appts, text=" Appointments ")
-        self.tabs.add(self.tab_billing, text=" Billing ")
-
-        self.init_dashboard()
-        self.init_patient_tab()
-        self.init_doctor_tab()
-        self.init_appointment_tab()
-        self.init_billing_tab()
+        self.tabs.add(self.tab_patients, text=" Patients ", state="disabled")
+        self.tabs.add(self.tab_doctors, text=" Doctors ", state="disabled")
+        self.tabs.add(self.tab_appts, text=" Appointments ", state="disabled")
+        self.tabs.add(self.tab_billing, text=" Billing ", state="disabled")
+
+        # Tab widget name -> function building it, and one refilling it
+        self._tab_init = {
+            str(self.tab_dash): self.init_dashboard,
+            str(self.tab_patients): self.init_patient_tab,
+            str(self.tab_doctors): self.init_doctor_tab,
+            str(self.tab_appts): self.init_appointment_tab,
+            str(self.tab_billing): self.init_billing_tab
+        }
+        self._tab_refresh = {
+            str(self.tab_dash): self.update_stats,
+            str(self.tab_patients): lambda: self.fill_tree('patients'),
+            str(self.tab_doctors): lambda: self.fill_tree('doctors'),
+            str(self.tab_appts): lambda: self.fill_tree('appointments'),
+            str(self.tab_billing): lambda: self.fill_tree('bills')
+        }
+        self._built = set()
+        # Section -> its table, and the highest id listed in it
+        self._trees = {}
+        self._last_ids = {}
+        self.tabs.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
     # ==================== DASHBOARD ====================
     def init_dashboard(self):
@@ -72,7 +161,7 @@ class MediCareGUI:
         self.update_stats()
 
     def update_stats(self):
-        s = self.system.get_statistics()
+        s = self.view.statistics()
         text = (f"Total Patients:      {s['total_patients']}\n"
                 f"Total Doctors:       {s['total_doctors']}\n"
                 f"Active Appointments: {s['scheduled_appointments']}\n"
@@ -94,7 +183,7 @@ class MediCareGUI:
 
         tk.Button(f, text="Add Patient", command=self.add_patient_logic, bg="#28a745", fg="white").grid(row=1, column=5, padx=10)
 
-        self.p_tree = self.create_tree(self.tab_patients, ("ID", "Name", "Age", "Gender", "Disease", "Admitted"))
+        self.p_tree = self.create_tree(self.tab_patients, 'patients')
         
         self.p_menu = tk.Menu(self.root, tearoff=0)
         self.p_menu.add_command(label="Update Disease", command=self.update_patient_ui)
@@ -102,36 +191,39 @@ class MediCareGUI:
         self.p_menu.add_command(label="Delete Patient", command=self.delete_patient_logic, foreground="red")
         
         self.p_tree.bind("<Button-3>", lambda e: self.p_menu.post(e.x_root, e.y_root))
-        self.refresh_p_list()
+        self.fill_tree('patients')
 
     def add_patient_logic(self):
         try:
             self.system.add_patient(self.p_name.get(), int(self.p_age.get()), self.p_gen.get(), 
                                     self.p_con.get(), self.p_dis.get())
+            self.apply_changes()
             messagebox.showinfo("Success", "Patient Registered")
-            self.refresh_all()
         except: messagebox.showerror("Error", "Check Inputs")
 
     def update_patient_ui(self):
         selected = self.p_tree.selection()
         if not selected: return
         p_id = self.p_tree.item(selected[0])['values'][0]
+        patient = self.system.get_patient(p_id)
+        if not patient: return
+        # Someone may change the patient while the dialog is open
+        version = patient.version
         new_dis = simpledialog.askstring("Update", "Enter new disease:")
         if new_dis:
-            for p in self.system._patients:
-                if p.person_id == p_id:
-                    p.disease = new_dis
-                    self.system.save_data()
-                    self.refresh_all()
+            try:
+                self.system.update_patient(p_id, expected_version=version, disease=new_dis)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+            self.apply_changes()
 
     def delete_patient_logic(self):
         selected = self.p_tree.selection()
         if not selected: return
         p_id = self.p_tree.item(selected[0])['values'][0]
         if messagebox.askyesno("Confirm", "Delete Patient?"):
-            self.system._patients = [p for p in self.system._patients if p.person_id != p_id]
-            self.system.save_data()
-            self.refresh_all()
+            self.system.delete_patient(p_id)
+            self.apply_changes()
 
     # ==================== DOCTORS (NEW FUNCTIONALITY) ====================
     def init_doctor_tab(self):
@@ -148,7 +240,7 @@ class MediCareGUI:
         tk.Button(f, text="Add Doctor", command=self.add_doctor_logic, bg="#28a745", fg="white").grid(row=1, column=5, padx=10)
 
         # Table
-        self.d_tree = self.create_tree(self.tab_doctors, ("ID", "Name", "Specialty", "Availability", "Contact"))
+        self.d_tree = self.create_tree(self.tab_doctors, 'doctors')
         
         # Menu for Update/Delete
         self.d_menu = tk.Menu(self.root, tearoff=0)
@@ -157,37 +249,39 @@ class MediCareGUI:
         self.d_menu.add_command(label="Delete Doctor", command=self.delete_doctor_logic, foreground="red")
         
         self.d_tree.bind("<Button-3>", lambda e: self.d_menu.post(e.x_root, e.y_root))
-        self.refresh_d_list()
+        self.fill_tree('doctors')
 
     def add_doctor_logic(self):
         try:
             # Note: Ensure your hospital_system.py has an add_doctor method
             self.system.add_doctor(self.d_name.get(), int(self.d_age.get()), "M/F", 
                                    self.d_con.get(), self.d_spec.get(), self.d_avail.get())
+            self.apply_changes()
             messagebox.showinfo("Success", "Doctor Registered")
-            self.refresh_all()
         except: messagebox.showerror("Error", "Check Inputs")
 
     def update_doctor_ui(self):
         selected = self.d_tree.selection()
         if not selected: return
         d_id = self.d_tree.item(selected[0])['values'][0]
+        doctor = self.system.get_doctor(d_id)
+        if not doctor: return
+        version = doctor.version
         new_avail = simpledialog.askstring("Update", "Enter new availability (e.g. Mon-Fri):")
         if new_avail:
-            for d in self.system._doctors:
-                if d.person_id == d_id:
-                    d._availability = new_avail # Accessing private member for quick update
-                    self.system.save_data()
-                    self.refresh_all()
+            try:
+                self.system.update_doctor(d_id, expected_version=version, availability=new_avail)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+            self.apply_changes()
 
     def delete_doctor_logic(self):
         selected = self.d_tree.selection()
         if not selected: return
         d_id = self.d_tree.item(selected[0])['values'][0]
         if messagebox.askyesno("Confirm", "Delete Doctor?"):
-            self.system._doctors = [d for d in self.system._doctors if d.person_id != d_id]
-            self.system.save_data()
-            self.refresh_all()
+            self.system.delete_doctor(d_id)
+            self.apply_changes()
 
     # ==================== APPOINTMENTS ====================
     def init_appointment_tab(self):
@@ -198,14 +292,14 @@ class MediCareGUI:
         self.a_date = self.create_input(f, "Date:", 0, 4)
         tk.Button(f, text="Book", command=self.book_appt_logic, bg=self.COLOR_PRIMARY, fg="white").grid(row=0, column=6, padx=10)
 
-        self.a_tree = self.create_tree(self.tab_appts, ("Appt ID", "Pat ID", "Doc ID", "Date", "Status"))
-        self.refresh_a_list()
+        self.a_tree = self.create_tree(self.tab_appts, 'appointments')
+        self.fill_tree('appointments')
 
     def book_appt_logic(self):
         try:
             self.system.schedule_appointment(int(self.a_pid.get()), int(self.a_did.get()), self.a_date.get(), "10:00 AM")
-            self.refresh_all()
         except: messagebox.showerror("Error", "Check IDs")
+        self.apply_changes()
 
     # ==================== BILLING ====================
     def init_billing_tab(self):
@@ -216,22 +310,25 @@ class MediCareGUI:
         self.b_med = self.create_input(f, "Meds Fee:", 0, 4)
         tk.Button(f, text="Invoice", command=self.billing_logic, bg=self.COLOR_PRIMARY, fg="white").grid(row=0, column=6, padx=10)
 
-        self.b_tree = self.create_tree(self.tab_billing, ("Bill ID", "Pat ID", "Date", "Total", "Status"))
+        self.b_tree = self.create_tree(self.tab_billing, 'bills')
         tk.Button(self.tab_billing, text="Mark Paid", command=self.pay_bill_logic, bg="#17a2b8", fg="white").pack(pady=5)
-        self.refresh_b_list()
+        self.fill_tree('bills')
 
     def billing_logic(self):
         try:
             self.system.generate_bill(int(self.b_pid.get()), float(self.b_con.get()), float(self.b_med.get()))
-            self.refresh_all()
         except: messagebox.showerror("Error", "Invalid Input")
+        self.apply_changes()
 
     def pay_bill_logic(self):
         selected = self.b_tree.selection()
         if selected:
             bid = self.b_tree.item(selected[0])['values'][0]
-            self.system.mark_bill_as_paid(bid)
-            self.refresh_all()
+            try:
+                self.system.mark_bill_paid(bid)
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+            self.apply_changes()
 
     # ==================== HELPERS & REFRESH ====================
     def create_input(self, parent, label, r, c):
@@ -240,40 +337,51 @@ class MediCareGUI:
         ent.grid(row=r, column=c+1, padx=5, pady=5)
         return ent
 
-    def create_tree(self, parent, cols):
+    def create_tree(self, parent, section):
+        cols = COLUMNS[section]
         tree = ttk.Treeview(parent, columns=cols, show='headings')
         for col in cols:
             tree.heading(col, text=col)
             tree.column(col, width=120, anchor="center")
         tree.pack(fill="both", expand=True, padx=20, pady=10)
+        self._trees[section] = tree
+        self.view.watch(section)
         return tree
 
     def refresh_all(self):
-        self.update_stats()
-        self.refresh_p_list()
-        self.refresh_d_list()
-        self.refresh_a_list()
-        self.refresh_b_list()
-
-    def refresh_p_list(self):
-        for i in self.p_tree.get_children(): self.p_tree.delete(i)
-        for p in self.system.get_all_patients():
-            self.p_tree.insert("", "end", values=(p.person_id, p.name, p.age, p.gender, p.disease, p.admission_date))
-
-    def refresh_d_list(self):
-        for i in self.d_tree.get_children(): self.d_tree.delete(i)
-        for d in self.system.get_all_doctors():
-            self.d_tree.insert("", "end", values=(d.person_id, d.name, d.specialization, d.availability, d.contact))
-
-    def refresh_a_list(self):
-        for i in self.a_tree.get_children(): self.a_tree.delete(i)
-        for a in self.system._appointments:
-            self.a_tree.insert("", "end", values=(a.appointment_id, a.patient_id, a.doctor_id, a.date, a.status))
-
-    def refresh_b_list(self):
-        for i in self.b_tree.get_children(): self.b_tree.delete(i)
-        for b in self.system.get_all_bills():
-            self.b_tree.insert("", "end", values=(b.bill_id, b.patient_id, b.date, f"${b.total}", b.payment_status))
+        # Tabs never opened are filled when they are
+        for tab in self._built:
+            self._tab_refresh[tab]()
+
+    def fill_tree(self, section):
+        # Rows are keyed by record id, so changes can find them later
+        tree = self._trees[section]
+        tree.delete(*tree.get_children())
+        rows = self.view.rows(section)
+        for row in rows:
+            tree.insert("", "end", iid=str(row[0]), values=row)
+        self._last_ids[section] = rows[-1][0] if rows else 0
+
+    def apply_changes(self):
+        # Redraw only the rows the last action touched, not whole tables
+        for section, changes in self.view.take_changes().items():
+            tree = self._trees[section]
+            for record_id, row in changes:
+                iid = str(record_id)
+                if row is None:
+                    if tree.exists(iid):
+                        tree.delete(iid)
+                elif tree.exists(iid):
+                    tree.item(iid, values=row)
+                elif record_id > self._last_ids[section]:
+                    tree.insert("", "end", iid=iid, values=row)
+                    self._last_ids[section] = record_id
+                else:
+                    # A restored record goes back in id order
+                    ids = [int(child) for child in tree.get_children()]
+                    tree.insert("", bisect_left(ids, record_id), iid=iid, values=row)
+        if self.tabs.select() == str(self.tab_dash):
+            self.update_stats()
 
 if __name__ == "__main__":
     root = tk.Tk()
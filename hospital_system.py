@@ -4,108 +4,513 @@
 Main Hospital System class - Central management system
 """
 
-import json
 import os
-from typing import List, Optional
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Set
 
 from patient import Patient
 from doctor import Doctor
 from appointment import Appointment
 from billing import Billing
+from payment import Payment
+from invoice import Invoice
+from serializers import SECTIONS, Serializer, get_serializer, detect_serializer
+from persistence import GroupCommitter, atomic_write
+from storage import SplitStore
+from archive import Archive, AppointmentArchive
+from cache import LRUCache
+from pagination import Page, bisect_id, id_ordered, iso_date, merge_by_id, paginate
+from references import ReferenceIndex
+from events import ChangeEvent, ChangeFeed
+from snapshot import Snapshot
+from ledger import Ledger
+from encryption import PASSPHRASE_ENV, DecryptionError
+from audit import SEGMENT_BYTES, AuditLog
+from record import StaleRecordError
+from schedule import ACTIVE_STATUSES, Rota, SlotIndex, slot_day
+from dedupe import DUPLICATE_THRESHOLD, DuplicateIndex
+from search import DiseaseIndex
+
+if TYPE_CHECKING:
+    # Loaded on demand by enable_instrumentation
+    from instrumentation import Instrumentation
+
+
+# Attribute holding the id of each section's records
+ID_ATTRIBUTES = {
+    'patients': 'person_id',
+    'doctors': 'person_id',
+    'appointments': 'appointment_id',
+    'bills': 'bill_id',
+    'payments': 'payment_id',
+    'invoices': 'invoice_id'
+}
+
+
+# Reverse-reference indexes: name -> (owner section, referring section,
+# attribute holding the owner's id)
+REFERENCES = {
+    'patient_appointments': ('patients', 'appointments', 'patient_id'),
+    'doctor_appointments': ('doctors', 'appointments', 'doctor_id'),
+    'patient_bills': ('patients', 'bills', 'patient_id'),
+    'patient_payments': ('patients', 'payments', 'patient_id'),
+    'patient_invoices': ('patients', 'invoices', 'patient_id'),
+    'appointment_invoices': ('appointments', 'invoices', 'appointment_id')
+}
+
+
+# Consultation fee per doctor specialization used by batch invoicing
+CONSULTATION_FEES = {
+    'Cardiology': 150.0,
+    'Neurology': 150.0,
+    'Pediatrics': 80.0,
+    'General': 50.0
+}
+DEFAULT_CONSULTATION_FEE = 60.0
+
+
+# Lock stripes for compare-and-set updates; records hash onto one of them
+RECORD_LOCKS = 64
+
+
+# Tombstones a section may hold before compact_ratio applies
+COMPACT_MIN_TOMBSTONES = 1000
+
+
+# Sort keys accepted by the page_* methods; 'id' is the stored order
+SORT_KEYS = {
+    'patients': {
+        'id': None,
+        'name': lambda p: p.name.lower(),
+        'age': lambda p: p.age,
+        'admission_date': lambda p: p.admission_date
+    },
+    'doctors': {
+        'id': None,
+        'name': lambda d: d.name.lower(),
+        'specialization': lambda d: d.specialization.lower()
+    },
+    'appointments': {
+        'id': None,
+        'date': lambda a: (iso_date(a.date), a.time),
+        'patient_id': lambda a: a.patient_id,
+        'doctor_id': lambda a: a.doctor_id,
+        'status': lambda a: a.status
+    },
+    'bills': {
+        'id': None,
+        'date': lambda b: b.date,
+        'total': lambda b: b.total,
+        'patient_id': lambda b: b.patient_id,
+        'status': lambda b: b.payment_status
+    }
+}
+
+
+# How each entity type renders itself for display
+RENDERERS = {
+    Patient: ('patients', Patient.display_info),
+    Doctor: ('doctors', Doctor.display_info),
+    Appointment: ('appointments', Appointment.display_details),
+    Billing: ('bills', Billing.display_bill),
+    Payment: ('payments', Payment.display_payment),
+    Invoice: ('invoices', Invoice.display_invoice)
+}
+
+
+def _login_name() -> str:
+    """Default audit actor: the operating system user running the process"""
+    try:
+        import getpass
+        return getpass.getuser()
+    except Exception:
+        return "unknown"
+
+
+def _section_property(name: str):
+    """Entity list of one data section, loaded on first access"""
+    def getter(self) -> list:
+        if name not in self._loaded:
+            self._load_section(name)
+        return self._sections[name]
+    
+    def setter(self, value: list):
+        self._sections[name] = value
+        self._loaded.add(name)
+        # Indexes built over the old list no longer apply
+        self._forget_references(name)
+        self._tombstones.pop(name, None)
+        if name in Ledger.SECTIONS:
+            self._ledger = None
+        if name in SlotIndex.SECTIONS:
+            self._slots = None
+        if name in Rota.SECTIONS:
+            self._rota = None
+        if name in DuplicateIndex.SECTIONS:
+            self._duplicates = None
+        if name in DiseaseIndex.SECTIONS:
+            self._diseases = None
+    
+    return property(getter, setter)
 
 
 class HospitalSystem:
     """Main hospital management system coordinating all modules"""
     
-    def __init__(self, data_file: str = "hospital_data.json"):
-        self._patients: List[Patient] = []
-        self._doctors: List[Doctor] = []
-        self._appointments: List[Appointment] = []
-        self._bills: List[Billing] = []
+    _patients: List[Patient] = _section_property('patients')
+    _doctors: List[Doctor] = _section_property('doctors')
+    _appointments: List[Appointment] = _section_property('appointments')
+    _bills: List[Billing] = _section_property('bills')
+    _payments: List[Payment] = _section_property('payments')
+    _invoices: List[Invoice] = _section_property('invoices')
+    
+    def __init__(self, data_file: str = "hospital_data.json",
+                 data_format: str = "json", durability: str = "strict",
+                 commit_window: float = 0.05, fsync: bool = True,
+                 storage: str = "single", partition_by_month: bool = False,
+                 cache_size: int = 10000, compact_ratio: Optional[float] = 0.5,
+                 event_buffer: int = 10000, load: bool = True,
+                 passphrase: Optional[str] = None, audit: bool = True,
+                 audit_segment_bytes: int = SEGMENT_BYTES,
+                 audit_segments: Optional[int] = None):
+        self._sections: Dict[str, list] = {name: [] for name in SECTIONS}
+        self._loaded: Set[str] = set(SECTIONS)
+        # Built on first use, see _refs
+        self._references: Dict[str, ReferenceIndex] = {}
+        # Deleted records per section, awaiting compaction
+        self._tombstones: Dict[str, list] = {}
+        self._compact_ratio = compact_ratio
+        self._last_stamp = 0
+        # Built on first use, see ledger
+        self._ledger: Optional[Ledger] = None
+        self._slots: Optional[SlotIndex] = None
+        self._rota: Optional[Rota] = None
+        self._duplicates: Optional[DuplicateIndex] = None
+        self._diseases: Optional[DiseaseIndex] = None
         self._data_file = data_file
-        self.load_data()
+        # The data file as it was last loaded or written, checked before each
+        # write once load_data has run (single-file storage only)
+        self._disk_stamp: Optional[tuple] = None
+        self._check_disk = False
+        # Only used by the encrypted format; defaults to $MEDICARE_PASSPHRASE
+        self._passphrase = passphrase
+        self._serializer: Serializer = get_serializer(data_format, passphrase)
+        self._fsync = fsync
+        if storage == "split":
+            self._store: Optional[SplitStore] = SplitStore(
+                os.path.splitext(data_file)[0], partition_by_month, fsync)
+        elif storage == "single":
+            self._store = None
+        else:
+            raise ValueError(f"Unknown storage mode: {storage}")
+        self._committer = GroupCommitter(self._write_data, durability,
+                                         commit_window)
+        # Striped so updates to different records rarely wait on each other
+        self._record_locks = [threading.RLock() for _ in range(RECORD_LOCKS)]
+        # Per thread: nesting depth of batch() blocks, and whether a save
+        # was held back, so one thread's batch never holds back another's saves
+        self._batches = threading.local()
+        self._archive = Archive(os.path.splitext(data_file)[0])
+        # Last id handed out per section, computed on first use
+        self._last_ids: Dict[str, int] = {}
+        self._instrumentation: Optional['Instrumentation'] = None
+        # Rendered display strings and query results
+        self._row_cache = LRUCache(cache_size, "rows")
+        self._query_cache = LRUCache(max(1, cache_size // 10), "queries")
+        self._feed = ChangeFeed(event_buffer)
+        # Every change is logged next to the data file, encrypted along with it
+        self._audit: Optional[AuditLog] = None
+        if audit:
+            self._audit = AuditLog(os.path.splitext(data_file)[0] + ".audit",
+                                   audit_segment_bytes, audit_segments,
+                                   passphrase or os.environ.get(PASSPHRASE_ENV),
+                                   lambda: self._serializer.encrypted)
+        # Name recorded in the audit log per thread, see acting_as
+        self._actors = threading.local()
+        self.default_actor = _login_name()
+        # With load=False the caller runs load_data, e.g. on a background
+        # thread while the interface comes up
+        if load:
+            self.load_data()
     
     # ==================== PATIENT MANAGEMENT ====================
     
     def add_patient(self, name: str, age: int, gender: str, contact: str, 
-                   disease: str) -> Patient:
-        """Add a new patient to the system"""
-        patient_id = len(self._patients) + 1
+                   disease: str, allow_duplicates: bool = True) -> Patient:
+        """Add a new patient to the system.
+        
+        With allow_duplicates=False, ValueError is raised instead if the
+        registration looks like an existing patient.
+        """
+        if not allow_duplicates:
+            matches = self.find_possible_duplicates(name, contact, age, gender)
+            if matches:
+                ids = ", ".join(str(patient.person_id) for patient, _ in matches)
+                raise ValueError(f"Possible duplicate of patient ID {ids}")
+        patient_id = self._next_id('patients')
         patient = Patient(patient_id, name, age, gender, contact, disease)
         self._patients.append(patient)
+        self._invalidate_name_searches(patient)
+        self._update_duplicates([patient])
+        self._update_diseases([patient])
+        self._publish('patients', [patient], 'create')
         self.save_data()
         return patient
     
     def get_patient(self, patient_id: int) -> Optional[Patient]:
         """Get patient by ID"""
-        for patient in self._patients:
-            if patient.person_id == patient_id:
-                return patient
-        return None
+        return self._find('patients', patient_id)
     
     def get_all_patients(self) -> List[Patient]:
         """Get all patients"""
-        return self._patients
+        return self._live('patients')
     
-    def update_patient(self, patient_id: int, **kwargs) -> bool:
-        """Update patient information"""
+    def update_patient(self, patient_id: int, expected_version: int = None,
+                       **kwargs) -> bool:
+        """Update patient information.
+        
+        With expected_version (the patient's version when it was read),
+        StaleRecordError is raised if anyone changed it since.
+        """
         patient = self.get_patient(patient_id)
         if patient:
-            if 'disease' in kwargs:
-                patient.disease = kwargs['disease']
-            self.save_data()
+            with self._record_lock('patients', patient_id):
+                patient.check_version(expected_version)
+                changed = ()
+                if 'disease' in kwargs and kwargs['disease'] != patient.disease:
+                    patient.disease = kwargs['disease']
+                    self._update_diseases([patient])
+                    changed += ('disease',)
+            if changed:
+                self._publish('patients', [patient], 'update', changed)
+                self.save_data()
             return True
         return False
     
-    def delete_patient(self, patient_id: int) -> bool:
-        """Delete a patient"""
-        patient = self.get_patient(patient_id)
-        if patient:
-            self._patients.remove(patient)
-            self.save_data()
-            return True
-        return False
+    def delete_patient(self, patient_id: int, cascade: bool = True) -> bool:
+        """Delete a patient along with their active appointments and bills.
+        
+        Deleted records are only hidden until compact() runs, so
+        restore_patient can bring them back. With cascade=False a patient
+        who still has any is kept and ValueError is raised. Archived
+        records stay as history.
+        """
+        return self.delete_patients([patient_id], cascade) == 1
+    
+    def delete_patients(self, patient_ids, cascade: bool = True) -> int:
+        """Delete many patients in one pass; returns how many were found"""
+        patients = self._find_all('patients', patient_ids)
+        deleted = self._delete_owners('patients', patients, cascade)
+        if deleted:
+            self._invalidate_name_searches(*patients)
+        return deleted
+    
+    def restore_patient(self, patient_id: int) -> bool:
+        """Undo a patient delete, with the records it cascaded to"""
+        patient = self._restore_owner('patients', patient_id)
+        if patient is None:
+            return False
+        self._invalidate_name_searches(patient)
+        return True
     
     def search_patient_by_name(self, name: str) -> List[Patient]:
         """Search patients by name"""
-        return [p for p in self._patients if name.lower() in p.name.lower()]
+        needle = name.lower()
+        return self._cached_query(
+            ('patient_name', needle),
+            lambda: [p for p in self._patients
+                     if needle in p.name.lower() and not p.is_deleted])
+    
+    # ==================== DISEASE SEARCH ====================
+    
+    @property
+    def diseases(self) -> DiseaseIndex:
+        """Patients by disease word, built on first use"""
+        if self._diseases is None:
+            diseases = DiseaseIndex()
+            diseases.build(self._patients)
+            self._diseases = diseases
+        return self._diseases
+    
+    def _update_diseases(self, patients: list):
+        if self._diseases is not None:
+            for patient in patients:
+                self._diseases.sync(patient)
+    
+    def search_patients_by_disease(self, query: str,
+                                   limit: Optional[int] = None) -> List[Patient]:
+        """Patients whose disease matches a query, in id order.
+        
+        Words are combined with AND (the default), OR and NOT, e.g.
+        "diabetes or hypertension"; see DiseaseIndex. QueryError (a
+        ValueError) is raised for a malformed query.
+        """
+        return [self._find('patients', patient_id)
+                for patient_id in self.diseases.ids(query, limit)]
+    
+    def count_patients_by_disease(self, query: str) -> Dict:
+        """Number of patients matching a query, and per word in it"""
+        diseases = self.diseases
+        return {'count': diseases.count(query), 'words': diseases.word_counts(query)}
+    
+    # ==================== DUPLICATE PATIENTS ====================
+    
+    @property
+    def duplicates(self) -> DuplicateIndex:
+        """Patients by phonetic name and contact keys, built on first use"""
+        if self._duplicates is None:
+            duplicates = DuplicateIndex()
+            duplicates.build(self._patients)
+            self._duplicates = duplicates
+        return self._duplicates
+    
+    def _update_duplicates(self, patients: list):
+        if self._duplicates is not None:
+            for patient in patients:
+                self._duplicates.sync(patient)
+    
+    def find_possible_duplicates(self, name: str, contact: str, age: int = None,
+                                 gender: str = None,
+                                 threshold: float = DUPLICATE_THRESHOLD) -> List[tuple]:
+        """Existing patients that look like a registration, as (patient, score)"""
+        return self.duplicates.matches(name, contact, age, gender, threshold)
+    
+    def find_duplicate_patients(self, threshold: float = DUPLICATE_THRESHOLD
+                                ) -> List[List[Patient]]:
+        """Groups of registrations that look like the same person, oldest first"""
+        return [[self._find('patients', patient_id) for patient_id in group]
+                for group in self.duplicates.groups(threshold)]
+    
+    def merge_patients(self, keep_id: int, duplicate_ids) -> int:
+        """Move the records of duplicate patients to one patient and delete the duplicates.
+        
+        Active appointments, bills, payments and invoices are re-pointed;
+        archived ones stay with the old id. Returns the number of records
+        moved. The duplicates can be restored, but without their records.
+        """
+        keep = self.get_patient(keep_id)
+        if keep is None:
+            raise ValueError("Patient not found")
+        duplicates = [p for p in self._find_all('patients', duplicate_ids) if p is not keep]
+        moved: Dict[str, list] = {}
+        for duplicate in duplicates:
+            for ref_section, records in self.get_dependents('patients',
+                                                            duplicate.person_id).items():
+                self._reassign_patient(ref_section, records, keep_id)
+                moved.setdefault(ref_section, []).extend(records)
+        with self.batch():
+            self._rebalance([keep_id] + [duplicate.person_id for duplicate in duplicates])
+            self.delete_patients([duplicate.person_id for duplicate in duplicates])
+            for ref_section, records in moved.items():
+                self._publish(ref_section, records, 'update', ('patient_id',))
+        return sum(len(records) for records in moved.values())
+    
+    def _reassign_patient(self, section: str, records: list, patient_id: int):
+        indexes = [self._references[name] for name, (_, ref_section, owner_attr)
+                   in REFERENCES.items()
+                   if ref_section == section and owner_attr == 'patient_id' and
+                   name in self._references]
+        self._invalidate_records(section, records)
+        for record in records:
+            for index in indexes:
+                index.discard(record)
+            record.reassign_patient(patient_id)
+            for index in indexes:
+                index.add(record)
+        self._invalidate_records(section, records)
+    
+    def dedupe_patients(self, threshold: float = DUPLICATE_THRESHOLD,
+                        merge: bool = False) -> dict:
+        """Find every group of duplicate patients and optionally merge each into its oldest.
+        
+        Everything is saved with one write. Returns the groups found (as
+        ids), the duplicates merged away, the records moved and the time.
+        """
+        start = time.perf_counter()
+        groups = self.duplicates.groups(threshold)
+        merged = moved = 0
+        if merge:
+            with self.batch():
+                for group in groups:
+                    moved += self.merge_patients(group[0], group[1:])
+                    merged += len(group) - 1
+        return {'groups': groups, 'merged': merged, 'moved': moved,
+                'ms': round((time.perf_counter() - start) * 1000, 3)}
     
     # ==================== DOCTOR MANAGEMENT ====================
     
     def add_doctor(self, name: str, age: int, gender: str, contact: str, 
                   specialization: str, availability: str) -> Doctor:
         """Add a new doctor to the system"""
-        doctor_id = len(self._doctors) + 1
+        doctor_id = self._next_id('doctors')
         doctor = Doctor(doctor_id, name, age, gender, contact, 
                        specialization, availability)
         self._doctors.append(doctor)
+        self._invalidate_specialization_searches(doctor)
+        self._update_rota([doctor])
+        self._publish('doctors', [doctor], 'create')
         self.save_data()
         return doctor
     
     def get_doctor(self, doctor_id: int) -> Optional[Doctor]:
         """Get doctor by ID"""
-        for doctor in self._doctors:
-            if doctor.person_id == doctor_id:
-                return doctor
-        return None
+        return self._find('doctors', doctor_id)
     
     def get_all_doctors(self) -> List[Doctor]:
         """Get all doctors"""
-        return self._doctors
+        return self._live('doctors')
     
-    def delete_doctor(self, doctor_id: int) -> bool:
-        """Delete a doctor"""
+    def update_doctor(self, doctor_id: int, expected_version: int = None,
+                      **kwargs) -> bool:
+        """Update doctor information, compare-and-set like update_patient"""
         doctor = self.get_doctor(doctor_id)
         if doctor:
-            self._doctors.remove(doctor)
-            self.save_data()
+            with self._record_lock('doctors', doctor_id):
+                doctor.check_version(expected_version)
+                changed = ()
+                if 'availability' in kwargs and kwargs['availability'] != doctor.availability:
+                    doctor.availability = kwargs['availability']
+                    self._update_rota([doctor])
+                    changed += ('availability',)
+            if changed:
+                self._publish('doctors', [doctor], 'update', changed)
+                self.save_data()
             return True
         return False
     
+    def delete_doctor(self, doctor_id: int, cascade: bool = True) -> bool:
+        """Delete a doctor along with their active appointments.
+        
+        Works like delete_patient; restore_doctor undoes it until compact().
+        """
+        return self.delete_doctors([doctor_id], cascade) == 1
+    
+    def delete_doctors(self, doctor_ids, cascade: bool = True) -> int:
+        """Delete many doctors in one pass; returns how many were found"""
+        doctors = self._find_all('doctors', doctor_ids)
+        deleted = self._delete_owners('doctors', doctors, cascade)
+        if deleted:
+            self._invalidate_specialization_searches(*doctors)
+        return deleted
+    
+    def restore_doctor(self, doctor_id: int) -> bool:
+        """Undo a doctor delete, with the appointments it cascaded to"""
+        doctor = self._restore_owner('doctors', doctor_id)
+        if doctor is None:
+            return False
+        self._invalidate_specialization_searches(doctor)
+        return True
+    
     def search_doctor_by_specialization(self, specialization: str) -> List[Doctor]:
         """Search doctors by specialization"""
-        return [d for d in self._doctors 
-                if specialization.lower() in d.specialization.lower()]
+        needle = specialization.lower()
+        return self._cached_query(
+            ('specialization', needle),
+            lambda: [d for d in self._doctors 
+                     if needle in d.specialization.lower() and not d.is_deleted])
     
     # ==================== APPOINTMENT MANAGEMENT ====================
     
@@ -117,45 +522,191 @@ class HospitalSystem:
         if not self.get_doctor(doctor_id):
             raise ValueError("Doctor not found")
         
-        # Check for conflicts
-        for appt in self._appointments:
-            if (appt.doctor_id == doctor_id and appt._date == date and 
-                appt._time == time and appt.status == "Scheduled"):
+        # The doctor's lock keeps two bookings (or a booking and a move)
+        # from taking the same slot, as in reschedule_appointment
+        with self._record_lock('doctors', doctor_id):
+            if not self.slots.is_free(doctor_id, date, time):
                 raise ValueError("Time slot already booked for this doctor")
-        
-        appointment_id = len(self._appointments) + 1
-        appointment = Appointment(appointment_id, patient_id, doctor_id, date, time)
-        self._appointments.append(appointment)
+            
+            appointment_id = self._next_id('appointments')
+            appointment = Appointment(appointment_id, patient_id, doctor_id, date, time)
+            self._appointments.append(appointment)
+            self._index_record('appointments', appointment)
+            self._slots.add(appointment)
+        self._query_cache.invalidate(('patient_appointments', patient_id))
+        self._query_cache.invalidate(('doctor_appointments', doctor_id))
+        self._publish('appointments', [appointment], 'create')
         self.save_data()
         return appointment
     
     def get_appointment(self, appointment_id: int) -> Optional[Appointment]:
-        """Get appointment by ID"""
-        for appt in self._appointments:
-            if appt.appointment_id == appointment_id:
-                return appt
-        return None
+        """Get appointment by ID (archived ones are read-only copies)"""
+        appointment = self._find('appointments', appointment_id)
+        if appointment is not None:
+            return appointment
+        return self._archive.appointments.get(appointment_id)
     
     def get_all_appointments(self) -> List[Appointment]:
-        """Get all appointments"""
-        return self._appointments
+        """Get all active (not archived) appointments"""
+        return self._live('appointments')
     
-    def cancel_appointment(self, appointment_id: int) -> bool:
-        """Cancel an appointment"""
+    def cancel_appointment(self, appointment_id: int, expected_version: int = None) -> bool:
+        """Cancel an appointment, compare-and-set like update_patient"""
         appointment = self.get_appointment(appointment_id)
-        if appointment:
-            appointment.cancel_appointment()
+        if appointment and appointment_id not in self._archive.appointments:
+            with self._record_lock('appointments', appointment_id):
+                appointment.check_version(expected_version)
+                appointment.cancel_appointment()
+                self._sync_slots([appointment])
+            self._publish('appointments', [appointment], 'update', ('status',))
             self.save_data()
             return True
         return False
     
+    def reschedule_appointment(self, appointment_id: int, date: str, time: str,
+                               expected_version: int = None) -> Appointment:
+        """Move an active appointment to a free slot of the same doctor"""
+        appointment = self._find('appointments', appointment_id)
+        if appointment is None:
+            raise ValueError("Appointment not found")
+        # The doctor's lock keeps two moves from taking the same slot
+        with self._record_locks_held(('doctors', appointment.doctor_id),
+                                     ('appointments', appointment_id)):
+            appointment.check_version(expected_version)
+            if appointment.status not in ACTIVE_STATUSES:
+                raise ValueError(f"Cannot reschedule a {appointment.status.lower()} appointment")
+            if not self.slots.is_free(appointment.doctor_id, date, time, ignore=appointment):
+                raise ValueError("Time slot already booked for this doctor")
+            self._slots.discard(appointment)
+            appointment.reschedule(date, time)
+            self._slots.add(appointment)
+        self._publish('appointments', [appointment], 'update', ('date', 'time', 'status'))
+        self.save_data()
+        return appointment
+    
+    def complete_appointment(self, appointment_id: int, expected_version: int = None) -> bool:
+        """Mark an active appointment as completed, freeing its slot"""
+        appointment = self._find('appointments', appointment_id)
+        if appointment is None:
+            return False
+        with self._record_lock('appointments', appointment_id):
+            appointment.check_version(expected_version)
+            if appointment.status not in ACTIVE_STATUSES:
+                return False
+            appointment.complete_appointment()
+            self._sync_slots([appointment])
+        self._publish('appointments', [appointment], 'update', ('status',))
+        self.save_data()
+        return True
+    
+    def complete_doctor_day(self, doctor_id: int, date: str = None) -> List[Appointment]:
+        """Complete every active appointment of a doctor on one day (default today).
+        
+        The day's appointments come straight from the slot index and are
+        saved with one write. Each is completed under its record lock, so
+        one cancelled or moved meanwhile is left alone. Returns the
+        appointments completed.
+        """
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")
+        completed = []
+        for appointment in self.slots.day(doctor_id, date):
+            with self._record_lock('appointments', appointment.appointment_id):
+                if appointment.status not in ACTIVE_STATUSES or \
+                        slot_day(appointment.date) != slot_day(date):
+                    continue
+                appointment.complete_appointment()
+                self._sync_slots([appointment])
+            completed.append(appointment)
+        if completed:
+            self._publish('appointments', completed, 'update', ('status',))
+            self.save_data()
+        return completed
+    
     def get_patient_appointments(self, patient_id: int) -> List[Appointment]:
-        """Get all appointments for a patient"""
-        return [a for a in self._appointments if a.patient_id == patient_id]
+        """Get all appointments for a patient, archived ones first"""
+        return self._cached_query(
+            ('patient_appointments', patient_id),
+            lambda: (self._archive.appointments.find('patient_id', patient_id) +
+                     self._refs('patient_appointments').get(patient_id)))
     
     def get_doctor_appointments(self, doctor_id: int) -> List[Appointment]:
-        """Get all appointments for a doctor"""
-        return [a for a in self._appointments if a.doctor_id == doctor_id]
+        """Get all appointments for a doctor, archived ones first"""
+        return self._cached_query(
+            ('doctor_appointments', doctor_id),
+            lambda: (self._archive.appointments.find('doctor_id', doctor_id) +
+                     self._refs('doctor_appointments').get(doctor_id)))
+    
+    @property
+    def slots(self) -> SlotIndex:
+        """Doctor slot occupancy, built from the appointments on first use"""
+        if self._slots is None:
+            slots = SlotIndex()
+            slots.build(self._appointments, self._archive.appointments.completed_by_day())
+            self._slots = slots
+        return self._slots
+    
+    def _sync_slots(self, appointments: list):
+        """Re-index appointments whose status or tombstone changed"""
+        if self._slots is not None:
+            for appointment in appointments:
+                self._slots.sync(appointment)
+    
+    # ==================== DOCTOR LOAD ====================
+    
+    @property
+    def rota(self) -> Rota:
+        """Parsed doctor availability by specialization, built on first use"""
+        if self._rota is None:
+            rota = Rota()
+            rota.build(self._doctors)
+            self._rota = rota
+        return self._rota
+    
+    def _update_rota(self, doctors: list):
+        if self._rota is not None:
+            for doctor in doctors:
+                self._rota.update(doctor)
+    
+    def get_doctor_utilization(self, doctor_id: int, date_from: str,
+                               date_to: str = None) -> dict:
+        """Booked slots against working capacity for a doctor over a range of days.
+        
+        Completed appointments, archived ones included, count as booked.
+        Returns totals plus a per-day breakdown; each day is two counter
+        lookups. Utilization is a percentage, None without working hours.
+        """
+        first = datetime.strptime(self._day(date_from), "%Y-%m-%d")
+        last = datetime.strptime(self._day(date_to or date_from), "%Y-%m-%d")
+        days = {}
+        booked = capacity = 0
+        while first <= last:
+            day = first.strftime("%Y-%m-%d")
+            load = days[day] = self.rota.load(self.slots, doctor_id, day)
+            booked += load['booked']
+            capacity += load['capacity']
+            first += timedelta(days=1)
+        return {'booked': booked, 'capacity': capacity,
+                'utilization': round(100.0 * booked / capacity, 1) if capacity else None,
+                'days': days}
+    
+    def get_utilization(self, date: str, specialization: str = None) -> Dict[int, dict]:
+        """Load of every active doctor (of a specialization) on one day"""
+        day = self._day(date)
+        return {doctor_id: self.rota.load(self.slots, doctor_id, day)
+                for doctor_id in sorted(self.rota.specialists(specialization))}
+    
+    def least_loaded_doctor(self, specialization: str, date: str) -> Optional[Doctor]:
+        """Doctor of a specialization with the lowest utilization and a free slot on a day"""
+        doctor_id = self.rota.least_loaded(self.slots, specialization, self._day(date))
+        return self.get_doctor(doctor_id) if doctor_id is not None else None
+    
+    @staticmethod
+    def _day(date: str) -> str:
+        day = iso_date(date)
+        if not day:
+            raise ValueError(f"Invalid date: {date}")
+        return day
     
     # ==================== BILLING MANAGEMENT ====================
     
@@ -168,86 +719,1007 @@ class HospitalSystem:
         if consultation_fee < 0 or medication_fee < 0:
             raise ValueError("Fees cannot be negative")
         
-        bill_id = len(self._bills) + 1
+        bill_id = self._next_id('bills')
         bill = Billing(bill_id, patient_id, consultation_fee, medication_fee)
         self._bills.append(bill)
+        self._index_record('bills', bill)
+        if self._ledger is not None:
+            self._ledger.charge(bill)
+        self._query_cache.invalidate(('patient_bills', patient_id))
+        self._publish('bills', [bill], 'create')
         self.save_data()
         return bill
     
     def get_bill(self, bill_id: int) -> Optional[Billing]:
-        """Get bill by ID"""
-        for bill in self._bills:
-            if bill.bill_id == bill_id:
-                return bill
-        return None
+        """Get bill by ID (archived ones are read-only copies)"""
+        bill = self._find('bills', bill_id)
+        if bill is not None:
+            return bill
+        return self._archive.bills.get(bill_id)
     
     def get_all_bills(self) -> List[Billing]:
-        """Get all bills"""
-        return self._bills
+        """Get all active (not archived) bills"""
+        return self._live('bills')
     
     def get_patient_bills(self, patient_id: int) -> List[Billing]:
-        """Get all bills for a patient"""
-        return [bill for bill in self._bills if bill.patient_id == patient_id]
+        """Get all bills for a patient, archived ones first"""
+        return self._cached_query(
+            ('patient_bills', patient_id),
+            lambda: (self._archive.bills.find('patient_id', patient_id) +
+                     self._refs('patient_bills').get(patient_id)))
     
-    def mark_bill_paid(self, bill_id: int) -> bool:
-        """Mark a bill as paid"""
+    def mark_bill_paid(self, bill_id: int, expected_version: int = None) -> bool:
+        """Mark a bill as paid, compare-and-set like update_patient"""
+        if bill_id in self._archive.bills:
+            # Only paid bills are archived
+            return True
         bill = self.get_bill(bill_id)
         if bill:
-            bill.mark_as_paid()
+            with self._record_lock('bills', bill_id):
+                bill.check_version(expected_version)
+                if bill.payment_status != "Paid" and self._ledger is not None:
+                    self._ledger.settle(bill)
+                bill.mark_as_paid()
+            self._publish('bills', [bill], 'update', ('payment_status',))
             self.save_data()
             return True
         return False
     
+    # ==================== LEDGER ====================
+    
+    @property
+    def ledger(self) -> Ledger:
+        """Per-patient balances, built from the bills and payments on first use"""
+        if self._ledger is None:
+            ledger = Ledger()
+            ledger.build(self._bills, self._payments,
+                         self._archive.bills.paid_by_patient)
+            self._ledger = ledger
+        return self._ledger
+    
+    def record_payment(self, bill_id: int, amount: float) -> Payment:
+        """Record a payment, possibly partial, against an unpaid bill.
+        
+        The bill is marked as paid once its payments cover the total.
+        """
+        bill = self._find('bills', bill_id)
+        if bill is None:
+            if bill_id in self._archive.bills:
+                raise ValueError("Bill is already paid")
+            raise ValueError("Bill not found")
+        amount = round(amount, 2)
+        if amount <= 0:
+            raise ValueError("Payment amount must be positive")
+        ledger = self.ledger
+        # Two payments on one bill must not both fit in what is still due
+        with self._record_lock('bills', bill_id):
+            if bill.payment_status == "Paid":
+                raise ValueError("Bill is already paid")
+            remaining = round(bill.total - ledger.received(bill_id), 2)
+            if amount > remaining:
+                raise ValueError(f"Payment exceeds the ${remaining:.2f} still due")
+            
+            payment = Payment(self._next_id('payments'), bill_id, bill.patient_id, amount)
+            self._payments.append(payment)
+            self._index_record('payments', payment)
+            self._query_cache.invalidate(('patient_payments', bill.patient_id))
+            ledger.receive(bill, amount)
+            if amount == remaining:
+                ledger.settle(bill)
+                bill.mark_as_paid()
+        self._publish('payments', [payment], 'create')
+        if bill.payment_status == "Paid":
+            self._publish('bills', [bill], 'update', ('payment_status',))
+        self.save_data()
+        return payment
+    
+    def get_all_payments(self) -> List[Payment]:
+        """Get all payments"""
+        return self._live('payments')
+    
+    def get_patient_payments(self, patient_id: int) -> List[Payment]:
+        """Get all payments received from a patient"""
+        return self._cached_query(
+            ('patient_payments', patient_id),
+            lambda: self._refs('patient_payments').get(patient_id))
+    
+    def get_bill_balance(self, bill_id: int) -> float:
+        """Amount still due on a bill (0 once paid)"""
+        bill = self._find('bills', bill_id)
+        if bill is None or bill.payment_status == "Paid":
+            return 0.0
+        return round(bill.total - self.ledger.received(bill_id), 2)
+    
+    def get_patient_balance(self, patient_id: int) -> Dict[str, float]:
+        """Outstanding and paid totals of a patient, archived bills included"""
+        ledger = self.ledger
+        return {'outstanding': ledger.outstanding(patient_id),
+                'paid': ledger.paid(patient_id)}
+    
+    def top_debtors(self, k: int = 100) -> List[tuple]:
+        """The k patients owing the most, as (patient id, outstanding) pairs"""
+        return self.ledger.top(k)
+    
+    def _rebalance(self, patient_ids):
+        """Recompute ledger totals of patients whose records were deleted or restored"""
+        if self._ledger is None:
+            return
+        archived = self._archive.bills.paid_by_patient
+        for patient_id in patient_ids:
+            self._ledger.rebuild_patient(
+                patient_id,
+                self._refs('patient_bills').get(patient_id, include_deleted=True),
+                self._refs('patient_payments').get(patient_id, include_deleted=True),
+                archived.get(patient_id, 0.0))
+    
+    # ==================== INVOICING ====================
+    
+    def invoice_completed_appointments(self, date_from: str = None, date_to: str = None,
+                                       fees: Optional[Dict[str, float]] = None,
+                                       doctor_fees: Optional[Dict[int, float]] = None) -> Dict:
+        """Bill every completed appointment in a date range that has no bill yet.
+        
+        The consultation fee is the doctor's entry in `doctor_fees`, else
+        the fee for their specialization in `fees` (over CONSULTATION_FEES).
+        Each bill is linked to its appointment by an invoice, so re-running
+        a range never bills twice. Everything is saved with one write.
+        Returns counts, the amount billed and the throughput.
+        """
+        start = time.perf_counter()
+        schedule = dict(CONSULTATION_FEES)
+        schedule.update(fees or {})
+        doctor_fees = doctor_fees or {}
+        invoiced = self._refs('appointment_invoices')
+        ledger = self._ledger
+        fee_of: Dict[int, float] = {}
+        bills = []
+        invoices = []
+        scanned = already_billed = skipped = 0
+        for appointment in self.iter_appointments(status="Completed", date_from=date_from,
+                                                  date_to=date_to):
+            scanned += 1
+            if invoiced.get(appointment.appointment_id, include_deleted=True):
+                already_billed += 1
+                continue
+            patient_id = appointment.patient_id
+            if self._find('patients', patient_id) is None:
+                skipped += 1
+                continue
+            doctor_id = appointment.doctor_id
+            fee = fee_of.get(doctor_id)
+            if fee is None:
+                doctor = self._find('doctors', doctor_id, include_deleted=True)
+                fee = fee_of[doctor_id] = doctor_fees.get(
+                    doctor_id, schedule.get(doctor.specialization, DEFAULT_CONSULTATION_FEE)
+                    if doctor else DEFAULT_CONSULTATION_FEE)
+            bill = Billing(self._next_id('bills'), patient_id, fee, 0.0)
+            invoice = Invoice(self._next_id('invoices'), appointment.appointment_id,
+                              bill.bill_id, patient_id)
+            self._bills.append(bill)
+            self._index_record('bills', bill)
+            self._invoices.append(invoice)
+            self._index_record('invoices', invoice)
+            if ledger is not None:
+                ledger.charge(bill)
+            bills.append(bill)
+            invoices.append(invoice)
+        if bills:
+            for patient_id in {bill.patient_id for bill in bills}:
+                self._query_cache.invalidate(('patient_bills', patient_id))
+            self._publish('bills', bills, 'create')
+            self._publish('invoices', invoices, 'create')
+            self.save_data()
+        seconds = time.perf_counter() - start
+        return {
+            'scanned': scanned,
+            'billed': len(bills),
+            'already_billed': already_billed,
+            'skipped': skipped,
+            'amount': sum(bill.total for bill in bills),
+            'ms': seconds * 1000,
+            'per_second': scanned / seconds if seconds else 0.0
+        }
+    
+    def get_appointment_bill(self, appointment_id: int) -> Optional[Billing]:
+        """Bill issued for an appointment by batch invoicing, if any"""
+        for invoice in self._refs('appointment_invoices').get(appointment_id):
+            return self.get_bill(invoice.bill_id)
+        return None
+    
+    # ==================== REFERENCES & DELETION ====================
+    
+    def get_dependents(self, section: str, owner_id: int) -> Dict[str, list]:
+        """Active records referring to a patient or doctor, per section"""
+        return {ref_section: self._refs(name).get(owner_id)
+                for name, (owner_section, ref_section, _) in REFERENCES.items()
+                if owner_section == section}
+    
+    def _refs(self, name: str) -> ReferenceIndex:
+        """Reverse-reference index, built from its section on first use"""
+        index = self._references.get(name)
+        if index is None:
+            _, section, owner_attr = REFERENCES[name]
+            index = ReferenceIndex(owner_attr, ID_ATTRIBUTES[section])
+            index.build(getattr(self, '_' + section))
+            self._references[name] = index
+        return index
+    
+    def _index_record(self, section: str, record):
+        """Add a new record to the built indexes over its section"""
+        for name, (_, ref_section, _) in REFERENCES.items():
+            index = self._references.get(name)
+            if index is not None and ref_section == section:
+                index.add(record)
+    
+    def _forget_references(self, section: str):
+        for name, (_, ref_section, _) in REFERENCES.items():
+            if ref_section == section:
+                self._references.pop(name, None)
+    
+    def _find(self, section: str, record_id: int, include_deleted: bool = False):
+        """Bisect an id-sorted section for one record"""
+        entities = getattr(self, '_' + section)
+        id_attr = ID_ATTRIBUTES[section]
+        i = bisect_id(entities, id_attr, record_id)
+        if i < len(entities) and getattr(entities[i], id_attr) == record_id:
+            record = entities[i]
+            if include_deleted or not record.is_deleted:
+                return record
+        return None
+    
+    def _find_all(self, section: str, record_ids) -> list:
+        found = (self._find(section, record_id) for record_id in set(record_ids))
+        return [record for record in found if record is not None]
+    
+    def _delete_owners(self, section: str, owners: list, cascade: bool) -> int:
+        """Tombstone patients or doctors and the records referring to them.
+        
+        Dependents come from the reverse indexes and nothing is moved, so
+        the cost follows the number of records deleted rather than the
+        size of the tables.
+        """
+        if not owners:
+            return 0
+        dependents: Dict[str, list] = {}
+        for owner in owners:
+            for ref_section, records in self.get_dependents(section, owner.person_id).items():
+                if records and not cascade:
+                    raise ValueError(f"{owner.name} (ID {owner.person_id}) still has "
+                                     f"{len(records)} active {ref_section}")
+                dependents.setdefault(ref_section, []).extend(records)
+        stamp = self._next_stamp()
+        self._tombstone(section, owners, stamp)
+        for ref_section, records in dependents.items():
+            self._tombstone(ref_section, records, stamp)
+        if section == 'patients':
+            self._rebalance(owner.person_id for owner in owners)
+        self._publish(section, owners, 'delete')
+        for ref_section, records in dependents.items():
+            self._publish(ref_section, records, 'delete')
+        self.save_data()
+        self._maybe_compact()
+        return len(owners)
+    
+    def _restore_owner(self, section: str, owner_id: int):
+        """Restore a deleted patient or doctor and what was deleted with it"""
+        owner = self._find(section, owner_id, include_deleted=True)
+        if owner is None or not owner.is_deleted:
+            return None
+        stamp = owner._deleted
+        restored = {section: [owner]}
+        for name, (owner_section, ref_section, _) in REFERENCES.items():
+            if owner_section == section:
+                restored.setdefault(ref_section, []).extend(
+                    record for record in self._refs(name).get(owner_id, include_deleted=True)
+                    if record._deleted == stamp)
+        for restored_section, records in restored.items():
+            for record in records:
+                record.restore()
+            if restored_section == 'appointments':
+                # A slot booked again meanwhile stays with its new holder
+                self._sync_slots(records)
+            elif restored_section == 'doctors':
+                self._update_rota(records)
+            elif restored_section == 'patients':
+                self._update_duplicates(records)
+                self._update_diseases(records)
+            kept = {id(record) for record in records}
+            self._tombstones[restored_section] = [
+                record for record in self._deleted_records(restored_section)
+                if id(record) not in kept]
+            self._invalidate_records(restored_section, records)
+        if section == 'patients':
+            self._rebalance([owner_id])
+        for restored_section, records in restored.items():
+            self._publish(restored_section, records, 'restore')
+        self.save_data()
+        return owner
+    
+    def _next_stamp(self) -> int:
+        """Tombstone stamp shared by the records of one delete"""
+        self._last_stamp = max(self._last_stamp + 1, time.time_ns() // 1000)
+        return self._last_stamp
+    
+    def _tombstone(self, section: str, records: list, stamp: int):
+        tombstones = self._deleted_records(section)
+        for record in records:
+            record.mark_deleted(stamp)
+            tombstones.append(record)
+        if section == 'appointments':
+            self._sync_slots(records)
+        elif section == 'doctors':
+            self._update_rota(records)
+        elif section == 'patients':
+            self._update_duplicates(records)
+            self._update_diseases(records)
+        self._invalidate_records(section, records)
+    
+    def _deleted_records(self, section: str) -> list:
+        """Tombstoned records of a section, found by one scan after loading"""
+        tombstones = self._tombstones.get(section)
+        if tombstones is None:
+            tombstones = self._tombstones[section] = [
+                e for e in getattr(self, '_' + section) if e.is_deleted]
+        return tombstones
+    
+    def _live(self, section: str) -> list:
+        """A section without its tombstones (the list itself if it has none)"""
+        entities = getattr(self, '_' + section)
+        if not self._deleted_records(section):
+            return entities
+        return [e for e in entities if not e.is_deleted]
+    
+    def _live_count(self, section: str) -> int:
+        return len(getattr(self, '_' + section)) - len(self._deleted_records(section))
+    
+    # ==================== COMPACTION ====================
+    
+    def deleted_counts(self) -> Dict[str, int]:
+        """Deleted records per loaded section still awaiting compaction"""
+        return {section: len(self._deleted_records(section))
+                for section in SECTIONS if section in self._loaded}
+    
+    def compact(self) -> Dict[str, int]:
+        """Drop deleted records from memory and the data file for good.
+        
+        Returns the number removed per section; they can no longer be
+        restored afterwards.
+        """
+        removed = {section: 0 for section in SECTIONS}
+        purged = {}
+        for section in SECTIONS:
+            if section not in self._loaded:
+                continue
+            doomed = self._deleted_records(section)
+            if doomed:
+                self._remove_records(section, doomed)
+                removed[section] = len(doomed)
+                purged[section] = doomed
+                self._tombstones[section] = []
+        for section, records in purged.items():
+            self._publish(section, records, 'purge')
+        if purged:
+            self.save_data()
+        return removed
+    
+    def _maybe_compact(self):
+        """Compact once tombstones pass compact_ratio of any section.
+        
+        Each compaction is a linear pass paid for by the deletes since the
+        last one, so deleting stays amortized O(1).
+        """
+        if self._compact_ratio is None:
+            return
+        for section, tombstones in self._tombstones.items():
+            if (len(tombstones) >= COMPACT_MIN_TOMBSTONES and
+                    len(tombstones) > self._compact_ratio *
+                    len(getattr(self, '_' + section))):
+                self.compact()
+                return
+    
+    def _remove_records(self, section: str, records: list):
+        """Remove records from a section and every index and cache entry for them"""
+        if not records:
+            return
+        entities = getattr(self, '_' + section)
+        id_attr = ID_ATTRIBUTES[section]
+        if len(records) > 16:
+            # One filtering pass beats shifting the list once per record
+            doomed = {id(record) for record in records}
+            entities[:] = [e for e in entities if id(e) not in doomed]
+        else:
+            for record in records:
+                i = bisect_id(entities, id_attr, getattr(record, id_attr))
+                if i < len(entities) and entities[i] is record:
+                    del entities[i]
+        self._serializer.invalidate(section)
+        for name, (_, ref_section, _) in REFERENCES.items():
+            index = self._references.get(name)
+            if index is not None and ref_section == section:
+                for record in records:
+                    index.discard(record)
+        self._invalidate_records(section, records)
+    
+    def _invalidate_records(self, section: str, records: list):
+        """Drop cached rows and listings that include any of the records"""
+        for name, (_, ref_section, owner_attr) in REFERENCES.items():
+            if ref_section == section:
+                for record in records:
+                    self._query_cache.invalidate((name, getattr(record, owner_attr)))
+        id_attr = ID_ATTRIBUTES[section]
+        for record in records:
+            self._row_cache.invalidate((section, getattr(record, id_attr)))
+    
+    # ==================== STREAMING & PAGINATION ====================
+    
+    def iter_patients(self, name: str = None, disease: str = None,
+                      after: int = None, descending: bool = False) -> Iterator[Patient]:
+        """Stream patients in id order, optionally filtered by name/disease substring"""
+        name = name.lower() if name else None
+        disease = disease.lower() if disease else None
+        for patient in id_ordered(self._patients, 'person_id', after, descending):
+            if patient.is_deleted:
+                continue
+            if name and name not in patient.name.lower():
+                continue
+            if disease and disease not in patient.disease.lower():
+                continue
+            yield patient
+    
+    def iter_doctors(self, specialization: str = None, after: int = None,
+                     descending: bool = False) -> Iterator[Doctor]:
+        """Stream doctors in id order, optionally filtered by specialization"""
+        needle = specialization.lower() if specialization else None
+        for doctor in id_ordered(self._doctors, 'person_id', after, descending):
+            if doctor.is_deleted:
+                continue
+            if needle is None or needle in doctor.specialization.lower():
+                yield doctor
+    
+    def iter_appointments(self, status: str = None, doctor_id: int = None,
+                          patient_id: int = None, date_from: str = None,
+                          date_to: str = None, include_archived: bool = True,
+                          after: int = None,
+                          descending: bool = False) -> Iterator[Appointment]:
+        """Stream active and archived appointments in id order.
+        
+        Filters combine; dates are inclusive and may be DD-MM-YYYY or
+        YYYY-MM-DD. Archived records are decoded one at a time, so memory
+        stays constant however many are skipped.
+        """
+        streams = [id_ordered(self._appointments, 'appointment_id', after, descending)]
+        archive = self._archive.appointments
+        if include_archived and (status is None or status in AppointmentArchive.STATUSES):
+            if doctor_id is not None or patient_id is not None:
+                column = 'doctor_id' if doctor_id is not None else 'patient_id'
+                value = doctor_id if doctor_id is not None else patient_id
+                matches = sorted(archive.find(column, value),
+                                 key=lambda a: a.appointment_id)
+                streams.append(id_ordered(matches, 'appointment_id', after, descending))
+            else:
+                streams.append(archive.iter_ordered(after, descending))
+        in_range = self._date_filter(date_from, date_to)
+        for appt in merge_by_id(streams, 'appointment_id', descending):
+            if appt.is_deleted:
+                continue
+            if status is not None and appt.status != status:
+                continue
+            if doctor_id is not None and appt.doctor_id != doctor_id:
+                continue
+            if patient_id is not None and appt.patient_id != patient_id:
+                continue
+            if in_range is None or in_range(appt.date):
+                yield appt
+    
+    def iter_bills(self, status: str = None, patient_id: int = None,
+                   date_from: str = None, date_to: str = None,
+                   include_archived: bool = True, after: int = None,
+                   descending: bool = False) -> Iterator[Billing]:
+        """Stream active and archived bills in id order, filtered like iter_appointments"""
+        streams = [id_ordered(self._bills, 'bill_id', after, descending)]
+        archive = self._archive.bills
+        if include_archived and status in (None, "Paid"):
+            if patient_id is not None:
+                matches = sorted(archive.find('patient_id', patient_id),
+                                 key=lambda b: b.bill_id)
+                streams.append(id_ordered(matches, 'bill_id', after, descending))
+            else:
+                streams.append(archive.iter_ordered(after, descending))
+        in_range = self._date_filter(date_from, date_to)
+        for bill in merge_by_id(streams, 'bill_id', descending):
+            if bill.is_deleted:
+                continue
+            if status is not None and bill.payment_status != status:
+                continue
+            if patient_id is not None and bill.patient_id != patient_id:
+                continue
+            if in_range is None or in_range(bill.date):
+                yield bill
+    
+    def page_patients(self, limit: int = 20, offset: int = 0, cursor: tuple = None,
+                      sort_by: str = 'id', descending: bool = False,
+                      **filters) -> Page:
+        """One page of patients; pass the previous page's next_cursor to continue"""
+        return self._page('patients', self.iter_patients, filters, limit, offset,
+                          cursor, sort_by, descending)
+    
+    def page_doctors(self, limit: int = 20, offset: int = 0, cursor: tuple = None,
+                     sort_by: str = 'id', descending: bool = False,
+                     **filters) -> Page:
+        """One page of doctors; pass the previous page's next_cursor to continue"""
+        return self._page('doctors', self.iter_doctors, filters, limit, offset,
+                          cursor, sort_by, descending)
+    
+    def page_appointments(self, limit: int = 20, offset: int = 0, cursor: tuple = None,
+                          sort_by: str = 'id', descending: bool = False,
+                          **filters) -> Page:
+        """One page of appointments; filters are those of iter_appointments"""
+        return self._page('appointments', self.iter_appointments, filters, limit,
+                          offset, cursor, sort_by, descending)
+    
+    def page_bills(self, limit: int = 20, offset: int = 0, cursor: tuple = None,
+                   sort_by: str = 'id', descending: bool = False,
+                   **filters) -> Page:
+        """One page of bills; filters are those of iter_bills"""
+        return self._page('bills', self.iter_bills, filters, limit, offset,
+                          cursor, sort_by, descending)
+    
+    def _page(self, section: str, iterate: Callable, filters: dict, limit: int,
+              offset: int, cursor: Optional[tuple], sort_by: str,
+              descending: bool) -> Page:
+        """Page in id order by bisecting to the cursor, otherwise via a bounded heap"""
+        if sort_by not in SORT_KEYS[section]:
+            raise ValueError(f"Cannot sort {section} by {sort_by}")
+        id_attr = ID_ATTRIBUTES[section]
+        if sort_by == 'id':
+            stream = iterate(after=cursor[0] if cursor else None,
+                             descending=descending, **filters)
+            return paginate(stream, limit, lambda e: (getattr(e, id_attr),),
+                            offset, presorted=True)
+        value = SORT_KEYS[section][sort_by]
+        return paginate(iterate(**filters), limit,
+                        lambda e: (value(e), getattr(e, id_attr)),
+                        offset, descending, cursor)
+    
+    @staticmethod
+    def _date_filter(date_from: Optional[str], date_to: Optional[str]):
+        """Predicate for an inclusive date range, or None if unbounded"""
+        if not date_from and not date_to:
+            return None
+        bounds = []
+        for text in (date_from, date_to):
+            day = iso_date(text) if text else ""
+            if text and not day:
+                raise ValueError(f"Invalid date: {text}")
+            bounds.append(day)
+        low, high = bounds
+        
+        def in_range(text: str) -> bool:
+            day = iso_date(text)
+            return bool(day) and (not low or day >= low) and (not high or day <= high)
+        
+        return in_range
+    
     # ==================== DATA PERSISTENCE ====================
     
+    @property
+    def serializer(self) -> Serializer:
+        return self._serializer
+    
+    def set_data_format(self, data_format: str):
+        """Switch the format used by the next save (json, compact-json, binary, encrypted)"""
+        self._serializer = get_serializer(data_format, self._passphrase)
+    
+    @property
+    def committer(self) -> GroupCommitter:
+        return self._committer
+    
     def save_data(self):
-        """Save all data to JSON file"""
-        data = {
-            'patients': [p.to_dict() for p in self._patients],
-            'doctors': [d.to_dict() for d in self._doctors],
-            'appointments': [a.to_dict() for a in self._appointments],
-            'bills': [b.to_dict() for b in self._bills]
-        }
+        """Persist all data according to the configured durability mode.
+        
+        Mutators publish a change before saving it, so its audit entry is
+        in the log flush that precedes the data write. If the save fails
+        the change stays in memory, published and audited, and goes out
+        with the next save.
+        """
+        if getattr(self._batches, 'depth', 0):
+            self._batches.pending = True
+            return
+        self._committer.request()
+    
+    @contextmanager
+    def batch(self):
+        """Hold back every save made inside the block and save once at its end.
+        
+        For scripted runs of many operations from one thread; a crash inside
+        the block loses everything done in it. Only saves of the calling
+        thread are held back; other threads keep their durability mode.
+        """
+        batches = self._batches
+        batches.depth = getattr(batches, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            batches.depth -= 1
+            if not batches.depth and getattr(batches, 'pending', False):
+                batches.pending = False
+                self.save_data()
+    
+    def _record_lock(self, section: str, record_id: int) -> threading.RLock:
+        """Lock guarding compare-and-set updates of one record"""
+        return self._record_locks[hash((section, record_id)) % RECORD_LOCKS]
+    
+    @contextmanager
+    def _record_locks_held(self, *records):
+        """Hold the locks of several (section, id) records at once.
+        
+        Stripes are taken in index order, and each only once, so two
+        callers locking crossing stripes cannot deadlock.
+        """
+        with ExitStack() as stack:
+            for stripe in sorted({hash(record) % RECORD_LOCKS for record in records}):
+                stack.enter_context(self._record_locks[stripe])
+            yield
+    
+    def flush(self):
+        """Write any deferred changes to disk now"""
+        self._committer.flush()
+    
+    def close(self):
+        """Flush pending changes and stop the background writer"""
+        self._committer.close()
+        self._archive.close()
+        if self._audit is not None:
+            self._audit.close()
+    
+    def _next_id(self, section: str) -> int:
+        """Next unused id for a section, never reusing deleted or archived ids"""
+        last = self._last_ids.get(section)
+        if last is None:
+            # Sections are kept in id order, see _find
+            entities = getattr(self, '_' + section)
+            last = getattr(entities[-1], ID_ATTRIBUTES[section]) if entities else 0
+            if section == 'appointments':
+                last = max(last, self._archive.appointments.max_id)
+            elif section == 'bills':
+                last = max(last, self._archive.bills.max_id)
+        self._last_ids[section] = last + 1
+        return last + 1
+    
+    def _write_data(self):
+        """Atomically replace the data file(s) with the current state"""
+        if self._audit is not None:
+            # The trail of a change reaches the disk no later than the change
+            self._audit.flush(self._fsync)
+        if self._store is not None:
+            # Sections never loaded cannot have changed
+            written = self._store.save(self._serializer,
+                                       {name: self._sections[name] for name in SECTIONS
+                                        if name in self._loaded})
+        else:
+            raw = self._serializer.encode_cached(self._sections)
+            if self._check_disk and self._stat_data_file() != self._disk_stamp:
+                # Another process saved since; writing would silently drop its changes
+                raise StaleRecordError("The data file was changed by another process "
+                                       "since it was loaded; reload before saving")
+            atomic_write(self._data_file, raw, self._fsync)
+            self._disk_stamp = self._stat_data_file()
+            written = len(raw)
+        if self._instrumentation is not None:
+            self._instrumentation.record_bytes(written)
+    
+    def _stat_data_file(self) -> Optional[tuple]:
+        """Identity of the data file on disk; atomic replaces change the inode"""
         try:
-            with open(self._data_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving data: {e}")
+            stat = os.stat(self._data_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    @property
+    def loaded_sections(self) -> Set[str]:
+        return set(self._loaded)
     
-    def load_data(self):
-        """Load all data from JSON file"""
+    def load_data(self, progress: Callable[[str, int, int], None] = None):
+        """Load all data from the data file, whatever format it was saved in.
+        
+        With split storage, sections are only read on first use. A single
+        data file left by earlier versions is loaded once and then migrated
+        to split files by the next save. `progress(stage, done, total)` is
+        called as each step finishes, for a loading indicator.
+        """
+        steps = ['read', 'decode'] + list(SECTIONS) + ['done']
+        
+        def advance(stage: str):
+            if progress is not None:
+                progress(stage, steps.index(stage) + 1, len(steps))
+        
+        if self._store is not None and self._store.exists():
+            self._sections = {name: [] for name in SECTIONS}
+            self._loaded = set()
+            advance('done')
+            return
+        # Taken before reading, so a save racing the read is caught too
+        self._disk_stamp = self._stat_data_file()
+        self._check_disk = True
         if os.path.exists(self._data_file):
             try:
-                with open(self._data_file, 'r') as f:
-                    data = json.load(f)
+                with open(self._data_file, 'rb') as f:
+                    raw = f.read()
+                advance('read')
                 
-                self._patients = [Patient.from_dict(p) 
-                                 for p in data.get('patients', [])]
-                self._doctors = [Doctor.from_dict(d) 
-                                for d in data.get('doctors', [])]
-                self._appointments = [Appointment.from_dict(a) 
-                                     for a in data.get('appointments', [])]
-                self._bills = [Billing.from_dict(b) 
-                              for b in data.get('bills', [])]
+                reader = detect_serializer(raw, self._passphrase, self._serializer)
+                sections = reader.decode(raw)
+                if reader.encrypted and not self._serializer.encrypted:
+                    # Never write an encrypted file back in plaintext unless
+                    # set_data_format asks for it after loading
+                    self._serializer = reader
+                advance('decode')
+                for name in SECTIONS:
+                    entities = sections[name]
+                    if name in ('appointments', 'bills'):
+                        entities = self._drop_archived(name, entities)
+                    setattr(self, '_' + name, self._sort_by_id(name, entities))
+                    advance(name)
+            except DecryptionError:
+                # Carrying on empty would overwrite the file on the next save
+                raise
             except Exception as e:
                 print(f"Error loading data: {e}")
+        advance('done')
+    
+    def prepare_indexes(self):
+        """Build what bookings and deletes otherwise build on first use.
+        
+        For interactive front ends, to run on the loading thread so the
+        first such action does not stall for seconds on a large data set.
+        """
+        self.slots
+        for name in REFERENCES:
+            self._refs(name)
+        for section in SECTIONS:
+            self._deleted_records(section)
+    
+    def _load_section(self, name: str):
+        """Read one section from split storage.
+        
+        A section that fails to load stays unloaded, so saves leave its
+        files alone, and the error reaches the caller.
+        """
+        entities = self._store.load_section(self._serializer, name)
+        if name in ('appointments', 'bills'):
+            entities = self._drop_archived(name, entities)
+        self._sections[name] = self._sort_by_id(name, entities)
+        self._loaded.add(name)
+    
+    def _drop_archived(self, section: str, entities: list) -> list:
+        """Remove records that reached the archive before a crash kept them active"""
+        archived = self._archive.archived_ids(section, entities)
+        if not archived:
+            return entities
+        id_attr = ID_ATTRIBUTES[section]
+        return [e for e in entities if getattr(e, id_attr) not in archived]
+    
+    @staticmethod
+    def _sort_by_id(section: str, entities: list) -> list:
+        """Put a loaded section in id order, which the streaming APIs bisect.
+        
+        New ids always exceed existing ones, so appends keep the order;
+        only monthly partitions are read back out of order.
+        """
+        id_attr = ID_ATTRIBUTES[section]
+        if any(getattr(entities[i], id_attr) > getattr(entities[i + 1], id_attr)
+               for i in range(len(entities) - 1)):
+            entities.sort(key=lambda e: getattr(e, id_attr))
+        return entities
+    
+    # ==================== ARCHIVE ====================
+    
+    @property
+    def archive(self) -> Archive:
+        return self._archive
+    
+    def archive_closed(self) -> dict:
+        """Move completed/cancelled appointments and paid bills to the archive.
+        
+        Archived records are served read-only from a memory-mapped file and
+        no longer kept as objects. Returns the number archived per section.
+        """
+        closed_appts = [a for a in self._appointments
+                        if Archive.is_closed_appointment(a) and not a.is_deleted]
+        closed_bills = [b for b in self._bills
+                        if Archive.is_closed_bill(b) and not b.is_deleted]
+        # The archive is written durably first; a crash before the data file
+        # is saved leaves duplicates that load_data drops again
+        archived_appts = self._archive.appointments.append(closed_appts)
+        archived_bills = self._archive.bills.append(closed_bills)
+        moved_appts = {id(a) for a in archived_appts}
+        moved_bills = {id(b) for b in archived_bills}
+        if moved_appts:
+            self._appointments = [a for a in self._appointments if id(a) not in moved_appts]
+        if moved_bills:
+            self._bills = [b for b in self._bills if id(b) not in moved_bills]
+        if moved_appts or moved_bills:
+            # Cached listings hold the objects that were just archived
+            self._query_cache.invalidate_where(
+                lambda key: key[0] in ('patient_appointments', 'doctor_appointments',
+                                       'patient_bills'))
+            self._publish('appointments', archived_appts, 'archive')
+            self._publish('bills', archived_bills, 'archive')
+            self.save_data()
+        return {'appointments': len(moved_appts), 'bills': len(moved_bills)}
+    
+    def iter_archived_appointments(self):
+        """Yield archived appointments one at a time as read-only copies"""
+        return iter(self._archive.appointments)
+    
+    def iter_archived_bills(self):
+        """Yield archived bills one at a time as read-only copies"""
+        return iter(self._archive.bills)
+    
+    # ==================== SNAPSHOTS ====================
+    
+    def snapshot(self) -> Snapshot:
+        """Take a consistent read-only view of all data for a long report.
+        
+        Costs one pointer copy of each section list; writers carry on
+        against the live data and copy a record only the first time they
+        change it while the snapshot is held. The snapshot's version is the
+        change-feed sequence number it reflects.
+        """
+        sections = {name: getattr(self, '_' + name) for name in SECTIONS}
+        return Snapshot(sections, self._archive, self._feed.last_seq)
+    
+    # ==================== CHANGE FEED ====================
+    
+    @property
+    def changes(self) -> ChangeFeed:
+        return self._feed
+    
+    def subscribe(self, callback: Callable[[ChangeEvent], None],
+                  sections=None, since: Optional[int] = None) -> int:
+        """Receive a ChangeEvent for every create/update/delete/restore/archive/purge.
+        
+        Events carry the section, record id, operation and changed fields.
+        Pass `since` (a previous event's seq) to replay what was missed
+        first. Returns a token for unsubscribe.
+        """
+        return self._feed.subscribe(callback, sections, since)
+    
+    def unsubscribe(self, token: int) -> bool:
+        return self._feed.unsubscribe(token)
+    
+    def _publish(self, section: str, records: list, operation: str,
+                 fields: tuple = ()):
+        if records:
+            id_attr = ID_ATTRIBUTES[section]
+            record_ids = [getattr(r, id_attr) for r in records]
+            self._feed.publish(section, record_ids, operation, fields)
+            if self._audit is not None:
+                self._audit.append(section, record_ids, operation, self.actor,
+                                   self._audit_values(records, operation, fields),
+                                   time.time())
+    
+    @staticmethod
+    def _audit_values(records: list, operation: str, fields: tuple) -> List[tuple]:
+        """(field position, value) pairs logged per record: all of them when
+        created, the changed ones when updated"""
+        if operation == 'create':
+            return [tuple(enumerate(r.to_record())) for r in records]
+        if not fields:
+            return [()] * len(records)
+        positions = [type(records[0]).FIELDS.index(name) for name in fields]
+        return [tuple((i, row[i]) for i in positions)
+                for row in (r.to_record() for r in records)]
+    
+    # ==================== AUDIT LOG ====================
+    
+    @property
+    def audit_log(self) -> Optional[AuditLog]:
+        return self._audit
+    
+    @property
+    def actor(self) -> str:
+        """Who the current thread's changes are logged as"""
+        return getattr(self._actors, 'name', None) or self.default_actor
+    
+    @contextmanager
+    def acting_as(self, actor: str):
+        """Log changes made by this thread inside the block as `actor`"""
+        previous = getattr(self._actors, 'name', None)
+        self._actors.name = actor
+        try:
+            yield self
+        finally:
+            self._actors.name = previous
+    
+    def get_history(self, section: str, record_id: int,
+                    field: Optional[str] = None) -> List[dict]:
+        """Logged changes of one record, oldest first, e.g. who changed a
+        patient's disease and when with get_history('patients', id, 'disease').
+        
+        Each entry has time, actor, operation and the new values it set.
+        """
+        if section not in ID_ATTRIBUTES:
+            raise ValueError(f"Unknown section: {section}")
+        if self._audit is None:
+            return []
+        history = self._audit.history(section, record_id)
+        if field is not None:
+            history = [entry for entry in history if field in entry['changes']]
+        return history
+    
+    # ==================== CACHING ====================
+    
+    def format_record(self, entity) -> str:
+        """Display string of any entity, served from the row cache.
+        
+        Entries are keyed by record id and only reused for the same object
+        at the same revision, so any mutation invalidates them.
+        """
+        section, render = RENDERERS[type(entity)]
+        key = (section, getattr(entity, ID_ATTRIBUTES[section]))
+        revision = entity._revision
+        cached = self._row_cache.get(
+            key, valid=lambda c: c[0] is entity and c[1] == revision)
+        if cached is not None:
+            return cached[2]
+        text = render(entity)
+        self._row_cache.put(key, (entity, revision, text))
+        return text
+    
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the row and query caches"""
+        return {'rows': self._row_cache.stats(),
+                'queries': self._query_cache.stats()}
+    
+    def _cached_query(self, key: tuple, compute) -> list:
+        result = self._query_cache.get(key)
+        if result is None:
+            result = compute()
+            self._query_cache.put(key, result)
+        # Callers get their own list so they cannot corrupt the cache
+        return list(result)
+    
+    def _invalidate_name_searches(self, *patients: Patient):
+        names = [patient.name.lower() for patient in patients]
+        self._query_cache.invalidate_where(
+            lambda key: key[0] == 'patient_name' and
+            any(key[1] in name for name in names))
+    
+    def _invalidate_specialization_searches(self, *doctors: Doctor):
+        specializations = [doctor.specialization.lower() for doctor in doctors]
+        self._query_cache.invalidate_where(
+            lambda key: key[0] == 'specialization' and
+            any(key[1] in specialization for specialization in specializations))
+    
+    # ==================== INSTRUMENTATION ====================
+    
+    @property
+    def instrumentation(self) -> Optional['Instrumentation']:
+        return self._instrumentation
+    
+    def enable_instrumentation(self) -> 'Instrumentation':
+        """Start collecting per-method call counts, latencies and bytes"""
+        if self._instrumentation is None:
+            from instrumentation import Instrumentation
+            self._instrumentation = Instrumentation()
+            self._instrumentation.attach(self)
+        return self._instrumentation
+    
+    def disable_instrumentation(self):
+        """Stop collecting metrics and remove the method wrappers"""
+        if self._instrumentation is not None:
+            self._instrumentation.detach(self)
+            self._instrumentation = None
     
     # ==================== STATISTICS ====================
     
     def get_statistics(self) -> dict:
-        """Get system statistics"""
-        total_revenue = sum(bill.total for bill in self._bills)
-        paid_bills = sum(1 for bill in self._bills 
-                        if bill.payment_status == "Paid")
+        """Get system statistics, including archived records.
         
-        return {
-            'total_patients': len(self._patients),
-            'total_doctors': len(self._doctors),
-            'total_appointments': len(self._appointments),
-            'scheduled_appointments': sum(1 for a in self._appointments 
-                                         if a.status == "Scheduled"),
-            'total_bills': len(self._bills),
-            'paid_bills': paid_bills,
-            'total_revenue': total_revenue
-        }
-    
\ No newline at end of file
+        Computed on a snapshot, so concurrent writers neither block it nor
+        change the lists under it.
+        """
+        with self.snapshot() as snapshot:
+            return snapshot.get_statistics()
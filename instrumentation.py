@@ -0,0 +1,214 @@
+"""
+Instrumentation and profiling hooks for the Hospital Management System
+"""
+
+import bisect
+import json
+import threading
+import time
+from functools import wraps
+from typing import Dict, List, Optional
+
+
+# Upper bounds (in milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000]
+
+
+class MethodStats:
+    """Call counter, latency histogram and persisted bytes for one method"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.bytes_persisted = 0
+        # One extra bucket for calls slower than the last bound
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, elapsed_ms: float, failed: bool = False):
+        """Record a single call"""
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+    def to_dict(self) -> Dict:
+        """Convert stats to dictionary for JSON export"""
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS]
+        labels.append(f">{LATENCY_BUCKETS_MS[-1]}ms")
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.avg_ms, 3),
+            'max_ms': round(self.max_ms, 3),
+            'bytes_persisted': self.bytes_persisted,
+            'histogram': dict(zip(labels, self.histogram))
+        }
+
+
+class Instrumentation:
+    """Wraps the public methods of a HospitalSystem to collect metrics.
+
+    Wrappers are installed on the instance only while instrumentation is
+    attached, so a system without it pays nothing beyond one ``None``
+    check in ``save_data``.
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, MethodStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wrapped: List[str] = []
+        self._profiler: Optional['cProfile.Profile'] = None
+        self._profile_until = 0.0
+        self._profile_output: Optional[str] = None
+        self.last_profile = ""
+        self.started_at = time.time()
+
+    # ==================== ATTACH / DETACH ====================
+
+    def attach(self, system):
+        """Install timing wrappers for every public method of the system"""
+        for name in dir(type(system)):
+            if name.startswith('_'):
+                continue
+            attr = getattr(type(system), name)
+            if not callable(attr) or isinstance(attr, property):
+                continue
+            setattr(system, name, self._wrap(name, getattr(system, name)))
+            self._wrapped.append(name)
+
+    def detach(self, system):
+        """Remove the wrappers installed by attach"""
+        for name in self._wrapped:
+            system.__dict__.pop(name, None)
+        self._wrapped = []
+        self._finish_profile()
+
+    def _wrap(self, name: str, func):
+        stats = self._get_stats(name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            stack.append(stats)
+            failed = False
+            start = time.perf_counter()
+            try:
+                if self._profiler is not None and len(stack) == 1:
+                    return self._profiled_call(func, *args, **kwargs)
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                stack.pop()
+                with self._lock:
+                    stats.record(elapsed_ms, failed)
+
+        return wrapper
+
+    def _stack(self) -> List[MethodStats]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _get_stats(self, name: str) -> MethodStats:
+        with self._lock:
+            if name not in self._stats:
+                self._stats[name] = MethodStats(name)
+            return self._stats[name]
+
+    # ==================== RECORDING ====================
+
+    def record_bytes(self, nbytes: int):
+        """Attribute persisted bytes to every method currently on the call stack"""
+        stack = self._stack()
+        if not stack:
+            # Written by the background group-commit thread
+            stack = [self._get_stats('background_commit')]
+        with self._lock:
+            for stats in stack:
+                stats.bytes_persisted += nbytes
+
+    def reset(self):
+        """Clear all collected metrics"""
+        with self._lock:
+            for stats in self._stats.values():
+                stats.__init__(stats.name)
+            self.started_at = time.time()
+
+    # ==================== PROFILING ====================
+
+    def start_profiling(self, seconds: float, output_file: Optional[str] = None):
+        """Profile every top-level system call made in the next `seconds`"""
+        # Profiling modules are only loaded when profiling is used
+        import cProfile
+        self._profiler = cProfile.Profile()
+        self._profile_until = time.perf_counter() + seconds
+        self._profile_output = output_file
+
+    def stop_profiling(self) -> str:
+        """Stop profiling now and return the formatted report"""
+        self._finish_profile()
+        return self.last_profile
+
+    @property
+    def profiling(self) -> bool:
+        return self._profiler is not None
+
+    def _profiled_call(self, func, *args, **kwargs):
+        if time.perf_counter() > self._profile_until:
+            self._finish_profile()
+            return func(*args, **kwargs)
+        return self._profiler.runcall(func, *args, **kwargs)
+
+    def _finish_profile(self):
+        profiler = self._profiler
+        if profiler is None:
+            return
+        self._profiler = None
+        if self._profile_output:
+            profiler.dump_stats(self._profile_output)
+        import io
+        import pstats
+        out = io.StringIO()
+        try:
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+        except TypeError:
+            # No calls were made during the window
+            out.write("No calls were profiled.\n")
+        self.last_profile = out.getvalue()
+
+    # ==================== EXPORT ====================
+
+    def get_metrics(self) -> Dict:
+        """Get all metrics as a dictionary"""
+        if self._profiler is not None and time.perf_counter() > self._profile_until:
+            self._finish_profile()
+        with self._lock:
+            methods = {name: s.to_dict() for name, s in sorted(self._stats.items())
+                       if s.calls or s.bytes_persisted}
+        return {
+            'since': time.strftime("%Y-%m-%d %H:%M:%S",
+                                   time.localtime(self.started_at)),
+            'profiling': self.profiling,
+            'methods': methods
+        }
+
+    def export_json(self, path: str):
+        """Write all metrics to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump(self.get_metrics(), f, indent=2)
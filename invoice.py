@@ -0,0 +1,89 @@
+"""
+Invoice class for the Hospital Management System
+"""
+
+from datetime import datetime
+from typing import Dict
+from record import Record
+
+
+class Invoice(Record):
+    """Link from a billed appointment to the bill issued for it"""
+    
+    # Serialized field order, shared by to_dict and to_record
+    FIELDS = ('invoice_id', 'appointment_id', 'bill_id', 'patient_id', 'date')
+    
+    def __init__(self, invoice_id: int, appointment_id: int, bill_id: int,
+                 patient_id: int):
+        self._invoice_id = invoice_id
+        self._appointment_id = appointment_id
+        self._bill_id = bill_id
+        self._patient_id = patient_id
+        self._date = datetime.now().strftime("%Y-%m-%d %H:%M")
+    
+    @property
+    def invoice_id(self):
+        return self._invoice_id
+    
+    @property
+    def appointment_id(self):
+        return self._appointment_id
+    
+    @property
+    def bill_id(self):
+        return self._bill_id
+    
+    @property
+    def patient_id(self):
+        return self._patient_id
+    
+    @property
+    def date(self):
+        return self._date
+    
+    def reassign_patient(self, patient_id: int):
+        """Move this invoice to another patient, e.g. when merging duplicates"""
+        self.before_change()
+        self._patient_id = patient_id
+        self.mark_dirty()
+    
+    def display_invoice(self) -> str:
+        """Display formatted invoice"""
+        return (f"Invoice ID: {self._invoice_id}, Appointment ID: {self._appointment_id}, "
+                f"Bill ID: {self._bill_id}, Patient ID: {self._patient_id}, "
+                f"Date: {self._date}")
+    
+    def to_dict(self) -> Dict:
+        """Convert invoice object to dictionary"""
+        return {
+            'invoice_id': self._invoice_id,
+            'appointment_id': self._appointment_id,
+            'bill_id': self._bill_id,
+            'patient_id': self._patient_id,
+            'date': self._date
+        }
+    
+    @staticmethod
+    def from_dict(data: Dict) -> 'Invoice':
+        """Create invoice object from dictionary"""
+        invoice = Invoice(
+            data['invoice_id'],
+            data['appointment_id'],
+            data['bill_id'],
+            data['patient_id']
+        )
+        invoice._date = data.get('date', datetime.now().strftime("%Y-%m-%d %H:%M"))
+        return invoice
+    
+    def to_record(self) -> tuple:
+        """Convert invoice object to a compact tuple in FIELDS order"""
+        return (self._invoice_id, self._appointment_id, self._bill_id,
+                self._patient_id, self._date)
+    
+    @staticmethod
+    def from_record(record) -> 'Invoice':
+        """Create invoice object from a tuple produced by to_record"""
+        invoice = Invoice.__new__(Invoice)
+        (invoice._invoice_id, invoice._appointment_id, invoice._bill_id,
+         invoice._patient_id, invoice._date) = record
+        return invoice
@@ -0,0 +1,145 @@
+"""
+Patient billing ledger: outstanding and paid balances per patient
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Tuple
+
+
+class Ledger:
+    """Running outstanding and paid totals per patient.
+
+    Totals are adjusted as bills are charged, partly paid and settled, so
+    a balance lookup is a dict read. The largest outstanding balances sit
+    on a max-heap; entries are pushed on every change and stale ones are
+    skipped (and dropped) when the top is read, so updates stay O(log n).
+    """
+
+    # Sections the totals are derived from
+    SECTIONS = ('bills', 'payments')
+
+    def __init__(self):
+        self._outstanding: Dict[int, float] = {}
+        self._paid: Dict[int, float] = {}
+        # bill id -> amount received so far on a bill not yet fully paid
+        self._received: Dict[int, float] = {}
+        # (-outstanding, patient id); may hold outdated entries
+        self._heap: List[Tuple[float, int]] = []
+
+    def build(self, bills: Iterable, payments: Iterable,
+              archived_paid: Dict[int, float]):
+        """Compute every total from the live bills and payments"""
+        self._outstanding = {}
+        self._paid = dict(archived_paid)
+        self._received = {}
+        self._add(bills, payments)
+        self._heap = [(-balance, patient_id)
+                      for patient_id, balance in self._outstanding.items()]
+        heapq.heapify(self._heap)
+
+    def rebuild_patient(self, patient_id: int, bills: list, payments: list,
+                        archived_paid: float = 0.0):
+        """Recompute one patient from all their bills and payments, deleted or not"""
+        for bill in bills:
+            self._received.pop(bill.bill_id, None)
+        self._outstanding.pop(patient_id, None)
+        self._paid.pop(patient_id, None)
+        if archived_paid:
+            self._paid[patient_id] = archived_paid
+        self._add(bills, payments)
+        self._push(patient_id)
+
+    def _add(self, bills: Iterable, payments: Iterable):
+        outstanding = self._outstanding
+        paid = self._paid
+        unpaid = {}
+        for bill in bills:
+            if bill.is_deleted:
+                continue
+            patient_id = bill.patient_id
+            if bill.payment_status == "Paid":
+                paid[patient_id] = paid.get(patient_id, 0.0) + bill.total
+            else:
+                unpaid[bill.bill_id] = bill
+                outstanding[patient_id] = outstanding.get(patient_id, 0.0) + bill.total
+        for payment in payments:
+            if payment.is_deleted or payment.bill_id not in unpaid:
+                # Payments on bills since settled are part of their total
+                continue
+            patient_id = payment.patient_id
+            self._received[payment.bill_id] = (self._received.get(payment.bill_id, 0.0) +
+                                               payment.amount)
+            outstanding[patient_id] -= payment.amount
+            paid[patient_id] = paid.get(patient_id, 0.0) + payment.amount
+        for patient_id in {bill.patient_id for bill in unpaid.values()}:
+            self._set_outstanding(patient_id, outstanding[patient_id])
+
+    # ==================== UPDATES ====================
+
+    def charge(self, bill):
+        """A new unpaid bill"""
+        self._set_outstanding(bill.patient_id,
+                              self._outstanding.get(bill.patient_id, 0.0) + bill.total)
+        self._push(bill.patient_id)
+
+    def receive(self, bill, amount: float):
+        """A partial payment against an unpaid bill"""
+        patient_id = bill.patient_id
+        self._received[bill.bill_id] = self._received.get(bill.bill_id, 0.0) + amount
+        self._paid[patient_id] = round(self._paid.get(patient_id, 0.0) + amount, 2)
+        self._set_outstanding(patient_id, self._outstanding.get(patient_id, 0.0) - amount)
+        self._push(patient_id)
+
+    def settle(self, bill):
+        """A bill paid in full, counting whatever was received on it before"""
+        patient_id = bill.patient_id
+        remaining = bill.total - self._received.pop(bill.bill_id, 0.0)
+        self._paid[patient_id] = round(self._paid.get(patient_id, 0.0) + remaining, 2)
+        self._set_outstanding(patient_id, self._outstanding.get(patient_id, 0.0) - remaining)
+        self._push(patient_id)
+
+    def _set_outstanding(self, patient_id: int, balance: float):
+        # Amounts are money: keep cents so float drift never leaves dust
+        balance = round(balance, 2)
+        if balance > 0:
+            self._outstanding[patient_id] = balance
+        else:
+            self._outstanding.pop(patient_id, None)
+
+    def _push(self, patient_id: int):
+        balance = self._outstanding.get(patient_id)
+        if balance is not None:
+            heapq.heappush(self._heap, (-balance, patient_id))
+        if len(self._heap) > 2 * len(self._outstanding) + 64:
+            # Mostly outdated entries: start over from the current totals
+            self._heap = [(-b, p) for p, b in self._outstanding.items()]
+            heapq.heapify(self._heap)
+
+    # ==================== QUERIES ====================
+
+    def outstanding(self, patient_id: int) -> float:
+        return self._outstanding.get(patient_id, 0.0)
+
+    def paid(self, patient_id: int) -> float:
+        return self._paid.get(patient_id, 0.0)
+
+    def received(self, bill_id: int) -> float:
+        """Amount paid so far towards a bill that is not fully paid"""
+        return self._received.get(bill_id, 0.0)
+
+    def total_outstanding(self) -> float:
+        return round(sum(self._outstanding.values()), 2)
+
+    def top(self, k: int) -> List[Tuple[int, float]]:
+        """The k largest outstanding balances as (patient id, balance)"""
+        heap = self._heap
+        top = []
+        while heap and len(top) < k:
+            negative, patient_id = heapq.heappop(heap)
+            entry = (patient_id, -negative)
+            # Equal duplicates pop one after another
+            if self._outstanding.get(patient_id) == -negative and (not top or top[-1] != entry):
+                top.append(entry)
+        for patient_id, balance in top:
+            heapq.heappush(heap, (-balance, patient_id))
+        return top
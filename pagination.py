@@ -0,0 +1,109 @@
+"""
+Pagination and streaming helpers for the Hospital Management System
+"""
+
+import heapq
+import re
+from functools import lru_cache
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+
+
+_DAY_MONTH_YEAR = re.compile(r"^\s*(\d{1,2})-(\d{1,2})-(\d{4})")
+_YEAR_MONTH_DAY = re.compile(r"^\s*(\d{4})-(\d{1,2})-(\d{1,2})")
+
+
+@lru_cache(maxsize=4096)
+def iso_date(text: str) -> str:
+    """Normalize a DD-MM-YYYY or YYYY-MM-DD[ HH:MM] date to YYYY-MM-DD ('' if unknown)"""
+    match = _YEAR_MONTH_DAY.match(text)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = _DAY_MONTH_YEAR.match(text)
+        if not match:
+            return ""
+        day, month, year = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+class Page:
+    """One page of results plus the cursor to fetch the next one"""
+
+    def __init__(self, items: list, next_cursor: Optional[tuple], offset: int = 0):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.offset = offset
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def bisect_id(entities: list, id_attr: str, record_id: int,
+              right: bool = False) -> int:
+    """Position of the first record with id >= record_id (> with `right`)"""
+    lo, hi = 0, len(entities)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        value = getattr(entities[mid], id_attr)
+        if value < record_id or (right and value == record_id):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def id_ordered(entities: list, id_attr: str, after: Optional[int] = None,
+               descending: bool = False) -> Iterator:
+    """Iterate an id-sorted list from just past `after`, found by bisection"""
+    if descending:
+        start = len(entities) if after is None else bisect_id(entities, id_attr, after)
+        return (entities[i] for i in range(start - 1, -1, -1))
+    start = 0 if after is None else bisect_id(entities, id_attr, after, right=True)
+    return (entities[i] for i in range(start, len(entities)))
+
+
+def paginate(stream: Iterable, limit: int, key: Callable, offset: int = 0,
+             descending: bool = False, cursor: Optional[tuple] = None,
+             presorted: bool = False) -> Page:
+    """Take one page from a stream of records.
+
+    `key` must give each record a unique tuple (end it with the record id);
+    the key of a page's last record is the cursor for the next page. A
+    `presorted` stream is already in page order and positioned past the
+    cursor, so only as much of it as the page needs is read. Otherwise the
+    page is picked with a bounded heap: one pass over the stream in
+    O(offset + limit) memory.
+    """
+    if limit <= 0:
+        raise ValueError("Page size must be positive")
+    if offset < 0:
+        raise ValueError("Offset cannot be negative")
+    if presorted:
+        items = list(islice(stream, offset, offset + limit + 1))
+    else:
+        if cursor is not None:
+            if descending:
+                stream = (x for x in stream if key(x) < cursor)
+            else:
+                stream = (x for x in stream if key(x) > cursor)
+        select = heapq.nlargest if descending else heapq.nsmallest
+        items = select(offset + limit + 1, stream, key=key)[offset:]
+    if len(items) <= limit:
+        return Page(items, None, offset)
+    items = items[:limit]
+    return Page(items, key(items[-1]), offset)
+
+
+def merge_by_id(streams: List[Iterable], id_attr: str,
+                descending: bool = False) -> Iterator:
+    """Merge id-ordered streams into one id-ordered stream"""
+    return heapq.merge(*streams, key=lambda e: getattr(e, id_attr),
+                       reverse=descending)
@@ -11,6 +11,10 @@ from person import Person
 class Patient(Person):
     """Patient class with medical information"""
     
+    # Serialized field order, shared by to_dict and to_record
+    FIELDS = ('patient_id', 'name', 'age', 'gender', 'contact', 'disease',
+              'admission_date')
+    
     def __init__(self, patient_id: int, name: str, age: int, gender: str, 
                  contact: str, disease: str):
         super().__init__(patient_id, name, age, gender, contact)
@@ -23,7 +27,9 @@ class Patient(Person):
     
     @disease.setter
     def disease(self, value):
+        self.before_change()
         self._disease = value
+        self.mark_dirty()
     
     @property
     def admission_date(self):
@@ -59,4 +65,17 @@ class Patient(Person):
         )
         patient._admission_date = data.get('admission_date', 
                                           datetime.now().strftime("%Y-%m-%d"))
+        return patient
+    
+    def to_record(self) -> tuple:
+        """Convert patient object to a compact tuple in FIELDS order"""
+        return (self._person_id, self._name, self._age, self._gender,
+                self._contact, self._disease, self._admission_date)
+    
+    @staticmethod
+    def from_record(record) -> 'Patient':
+        """Create patient object from a tuple produced by to_record"""
+        patient = Patient.__new__(Patient)
+        (patient._person_id, patient._name, patient._age, patient._gender,
+         patient._contact, patient._disease, patient._admission_date) = record
         return patient
\ No newline at end of file
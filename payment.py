@@ -0,0 +1,89 @@
+"""
+Payment class for the Hospital Management System
+"""
+
+from datetime import datetime
+from typing import Dict
+from record import Record
+
+
+class Payment(Record):
+    """A payment, possibly partial, received against a bill"""
+    
+    # Serialized field order, shared by to_dict and to_record
+    FIELDS = ('payment_id', 'bill_id', 'patient_id', 'amount', 'date')
+    
+    def __init__(self, payment_id: int, bill_id: int, patient_id: int,
+                 amount: float):
+        self._payment_id = payment_id
+        self._bill_id = bill_id
+        self._patient_id = patient_id
+        self._amount = amount
+        self._date = datetime.now().strftime("%Y-%m-%d %H:%M")
+    
+    @property
+    def payment_id(self):
+        return self._payment_id
+    
+    @property
+    def bill_id(self):
+        return self._bill_id
+    
+    @property
+    def patient_id(self):
+        return self._patient_id
+    
+    @property
+    def amount(self):
+        return self._amount
+    
+    @property
+    def date(self):
+        return self._date
+    
+    def reassign_patient(self, patient_id: int):
+        """Move this payment to another patient, e.g. when merging duplicates"""
+        self.before_change()
+        self._patient_id = patient_id
+        self.mark_dirty()
+    
+    def display_payment(self) -> str:
+        """Display formatted payment"""
+        return (f"Payment ID: {self._payment_id}, Bill ID: {self._bill_id}, "
+                f"Patient ID: {self._patient_id}, Amount: ${self._amount:.2f}, "
+                f"Date: {self._date}")
+    
+    def to_dict(self) -> Dict:
+        """Convert payment object to dictionary"""
+        return {
+            'payment_id': self._payment_id,
+            'bill_id': self._bill_id,
+            'patient_id': self._patient_id,
+            'amount': self._amount,
+            'date': self._date
+        }
+    
+    @staticmethod
+    def from_dict(data: Dict) -> 'Payment':
+        """Create payment object from dictionary"""
+        payment = Payment(
+            data['payment_id'],
+            data['bill_id'],
+            data['patient_id'],
+            data['amount']
+        )
+        payment._date = data.get('date', datetime.now().strftime("%Y-%m-%d %H:%M"))
+        return payment
+    
+    def to_record(self) -> tuple:
+        """Convert payment object to a compact tuple in FIELDS order"""
+        return (self._payment_id, self._bill_id, self._patient_id,
+                self._amount, self._date)
+    
+    @staticmethod
+    def from_record(record) -> 'Payment':
+        """Create payment object from a tuple produced by to_record"""
+        payment = Payment.__new__(Payment)
+        (payment._payment_id, payment._bill_id, payment._patient_id,
+         payment._amount, payment._date) = record
+        return payment
@@ -0,0 +1,188 @@
+"""
+Crash-safe persistence helpers for the Hospital Management System
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+
+DURABILITY_MODES = ("strict", "group", "deferred")
+
+
+class PersistenceError(OSError):
+    """Raised when data could not be written durably"""
+
+
+def atomic_write(path: str, data: bytes, fsync: bool = True):
+    """Write data to a temp file next to `path` and rename it into place.
+
+    A crash at any point leaves either the old or the new file, never a
+    truncated one. With fsync the rename is only done once the data is on
+    disk, and the directory entry is synced afterwards.
+    """
+    # Imported on first save rather than at startup
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path),
+                                    dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class GroupCommitter:
+    """Coalesces save requests into shared writes.
+
+    Durability modes:
+        strict   - every request writes synchronously (safest, slowest)
+        group    - requests wait until a shared write covering them is done;
+                   a request finding no write in flight starts one at once,
+                   and those arriving during a write share the next one
+        deferred - requests return at once and are written after the
+                   window; a crash can lose at most the last window
+    """
+
+    def __init__(self, write_fn: Callable[[], None], durability: str = "strict",
+                 window: float = 0.05):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self._write_fn = write_fn
+        self._durability = durability
+        self._window = window
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._requested = 0
+        self._durable = 0
+        # Last failed commit and the highest request it covered
+        self._error: Optional[PersistenceError] = None
+        self._error_target = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.requests = 0
+        self.commits = 0
+
+    @property
+    def durability(self) -> str:
+        return self._durability
+
+    @property
+    def pending(self) -> bool:
+        with self._cond:
+            return self._requested > self._durable
+
+    def request(self):
+        """Ask for the current state to be persisted"""
+        if self._durability == "strict":
+            self.requests += 1
+            self._commit()
+            return
+        with self._cond:
+            self._requested += 1
+            self.requests += 1
+            ticket = self._requested
+            self._ensure_thread()
+            self._cond.notify_all()
+            if self._durability == "group":
+                while self._durable < ticket:
+                    self._cond.wait()
+                if self._error is not None and ticket <= self._error_target:
+                    raise self._error
+            elif self._error is not None:
+                # Deferred writes report the last failure on the next save;
+                # this request is already queued so it will be retried
+                raise self._error
+
+    def flush(self):
+        """Write any pending requests now and wait until they are durable"""
+        with self._cond:
+            target = self._requested
+            if target <= self._durable and self._error is None:
+                return
+        try:
+            self._commit()
+        except PersistenceError as e:
+            self._finish(target, e)
+            raise
+        self._finish(target)
+
+    def close(self):
+        """Flush pending requests and stop the background writer"""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            atexit.unregister(self.close)
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def _commit(self):
+        # Commits are serialized so a newer state is never overwritten by an
+        # older one that was encoded earlier
+        with self._write_lock:
+            try:
+                self._write_fn()
+            except Exception as e:
+                raise PersistenceError(f"Error saving data: {e}") from e
+            self.commits += 1
+
+    def _finish(self, target: int, error: Optional[PersistenceError] = None):
+        with self._cond:
+            if error is not None:
+                self._error = error
+                self._error_target = max(self._error_target, target)
+            elif target >= self._error_target:
+                self._error = None
+            if self._durable < target:
+                self._durable = target
+            self._cond.notify_all()
+
+    def _ensure_thread(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="group-commit",
+                                            daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._requested <= self._durable and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            if self._durability == "deferred":
+                # Let more requests arrive before writing them all at once;
+                # group mode instead batches whatever arrives during a write
+                time.sleep(self._window)
+            with self._cond:
+                target = self._requested
+            try:
+                self._commit()
+            except PersistenceError as e:
+                self._finish(target, e)
+                continue
+            self._finish(target)
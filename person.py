@@ -3,7 +3,10 @@
 Base Person class for the Hospital Management System
 """
 
-class Person:
+from record import Record
+
+
+class Person(Record):
     """Base class for all persons in the system"""
     
     def __init__(self, person_id: int, name: str, age: int, gender: str, contact: str):
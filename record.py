@@ -0,0 +1,82 @@
+"""
+Base Record class for persisted entities of the Hospital Management System
+"""
+
+
+class StaleRecordError(ValueError):
+    """A compare-and-set update was based on an outdated version of a record"""
+
+
+class Record:
+    """Base class for entities stored in the data file.
+
+    Every mutation calls before_change() first, so live snapshots can keep
+    the old state, and mark_dirty() after. That bumps the in-memory
+    revision, which invalidates the serialized fragment cached by the last
+    save and queues the record on the section it was last saved in. It
+    also bumps the persisted version, so an update can require that the
+    record has not changed since it was read (see check_version).
+    """
+    
+    _revision = 0
+    # (revision, serializer name, encoded bytes) from the last save
+    _fragment = None
+    # Serializer section cache this record was last encoded into, and its
+    # position there
+    _section = None
+    _slot = 0
+    # Tombstone: 0 while live, otherwise the stamp of the delete that hid
+    # it (records deleted together share a stamp)
+    _deleted = 0
+    # Number of changes since the record was created; saved with it
+    _version = 0
+    # Snapshot registry while any snapshot is alive, and the newest
+    # snapshot epoch this record's current state was preserved for
+    _versions = None
+    _epoch = 0
+    
+    def before_change(self):
+        """Let live snapshots keep the current state; call before mutating"""
+        versions = self._versions
+        if versions is not None and self._epoch < versions.epoch:
+            versions.preserve(self)
+    
+    def mark_dirty(self):
+        """Record that this entity changed since it was last serialized"""
+        self._revision += 1
+        self._version += 1
+        section = self._section
+        if section is not None:
+            section.dirty.append(self)
+    
+    @property
+    def version(self) -> int:
+        return self._version
+    
+    def check_version(self, expected):
+        """Raise StaleRecordError unless expected is None or the current version"""
+        if expected is not None and expected != self._version:
+            raise StaleRecordError(
+                f"{type(self).__name__} was changed by someone else "
+                f"(version {self._version}, expected {expected}); reload and retry")
+    
+    @property
+    def is_dirty(self) -> bool:
+        fragment = self._fragment
+        return fragment is None or fragment[0] != self._revision
+    
+    @property
+    def is_deleted(self) -> bool:
+        return bool(self._deleted)
+    
+    def mark_deleted(self, stamp: int):
+        """Hide this record until it is restored or compacted away"""
+        self.before_change()
+        self._deleted = stamp
+        self.mark_dirty()
+    
+    def restore(self):
+        """Undo mark_deleted"""
+        self.before_change()
+        self._deleted = 0
+        self.mark_dirty()
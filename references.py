@@ -0,0 +1,43 @@
+"""
+Reverse-reference indexes from patients and doctors to their records
+"""
+
+from typing import Dict, List
+
+
+class ReferenceIndex:
+    """Maps an owner id to the records referring to it, e.g. patient -> bills.
+
+    Each owner's records sit in a dict keyed by record id, so adding or
+    removing a record is O(1) and listing an owner's records is O(degree).
+    """
+
+    def __init__(self, owner_attr: str, id_attr: str):
+        self._owner_attr = owner_attr
+        self._id_attr = id_attr
+        self._refs: Dict[int, Dict[int, object]] = {}
+
+    def build(self, records: list):
+        """Index every record of a freshly loaded section"""
+        self._refs = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        owner = getattr(record, self._owner_attr)
+        self._refs.setdefault(owner, {})[getattr(record, self._id_attr)] = record
+
+    def discard(self, record):
+        owner = getattr(record, self._owner_attr)
+        records = self._refs.get(owner)
+        if records is not None:
+            records.pop(getattr(record, self._id_attr), None)
+            if not records:
+                del self._refs[owner]
+
+    def get(self, owner_id: int, include_deleted: bool = False) -> List:
+        """Records referring to an owner, in the order they were added"""
+        records = self._refs.get(owner_id, {}).values()
+        if include_deleted:
+            return list(records)
+        return [record for record in records if not record.is_deleted]
@@ -0,0 +1,335 @@
+"""
+Parallel report engine for month-end reports over bills and appointments
+"""
+
+import mmap
+import multiprocessing
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from archive import AppointmentArchive, BillArchive
+from storage import date_month
+
+
+# Appointment statuses, encoded as their index in compact chunks
+STATUSES = ("Scheduled", "Completed", "Cancelled", "Rescheduled")
+_STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+
+# Snapshot being reported on. Set in the parent before forking workers,
+# so they inherit it and read their own range of it.
+_SNAPSHOT = None
+
+
+# ==================== WORKER TASKS ====================
+# Module-level so worker processes can import them. Each takes a range
+# of snapshot positions (read from the inherited snapshot), compact
+# column bytes, or an archive row range it maps itself, and returns
+# plain dicts of partial aggregates.
+
+def _bill_range_partials(start: int, stop: int, month: Optional[str]) -> tuple:
+    """Revenue and unpaid totals per patient over a range of snapshot bills.
+
+    Partial payments are subtracted from the unpaid totals by
+    _payment_range_partials.
+    """
+    revenue: Dict[int, float] = {}
+    unpaid: Dict[int, float] = {}
+    in_month = _month_filter(month) if month is not None else None
+    for bill in _SNAPSHOT.iter_range('bills', start, stop):
+        if in_month is not None and not in_month(bill.date):
+            continue
+        patient_id = bill.patient_id
+        revenue[patient_id] = revenue.get(patient_id, 0.0) + bill.total
+        if bill.payment_status != "Paid" and bill.total > 0:
+            unpaid[patient_id] = unpaid.get(patient_id, 0.0) + bill.total
+    return revenue, unpaid
+
+
+def _payment_range_partials(start: int, stop: int, month: Optional[str]) -> tuple:
+    """Partial payments received per patient on unpaid bills, as negative amounts"""
+    unpaid: Dict[int, float] = {}
+    in_month = _month_filter(month) if month is not None else None
+    for payment in _SNAPSHOT.iter_range('payments', start, stop):
+        bill = _SNAPSHOT.find('bills', 'bill_id', payment.bill_id)
+        if bill is None or bill.payment_status == "Paid":
+            continue
+        if in_month is not None and not in_month(bill.date):
+            continue
+        unpaid[bill.patient_id] = unpaid.get(bill.patient_id, 0.0) - payment.amount
+    return {}, unpaid
+
+
+def _appointment_range_partials(start: int, stop: int, month: Optional[str]) -> dict:
+    """Appointment counts per doctor and status code over a range of snapshot appointments"""
+    counts: Dict[int, List[int]] = {}
+    in_month = _month_filter(month) if month is not None else None
+    for appointment in _SNAPSHOT.iter_range('appointments', start, stop):
+        if in_month is not None and not in_month(appointment.date):
+            continue
+        row = counts.get(appointment.doctor_id)
+        if row is None:
+            row = counts[appointment.doctor_id] = [0] * len(STATUSES)
+        row[_STATUS_CODES.get(appointment.status, 0)] += 1
+    return counts
+
+
+def _bill_partials(patient_ids: bytes, totals: bytes, balances: bytes) -> tuple:
+    """Revenue and unpaid balance per patient for one chunk of bills"""
+    ids = array('I')
+    ids.frombytes(patient_ids)
+    amounts = array('d')
+    amounts.frombytes(totals)
+    due = array('d')
+    due.frombytes(balances)
+    revenue: Dict[int, float] = {}
+    unpaid: Dict[int, float] = {}
+    for patient_id, total, balance in zip(ids, amounts, due):
+        revenue[patient_id] = revenue.get(patient_id, 0.0) + total
+        if balance > 0:
+            unpaid[patient_id] = unpaid.get(patient_id, 0.0) + balance
+    return revenue, unpaid
+
+
+def _appointment_partials(doctor_ids: bytes, statuses: bytes) -> dict:
+    """Appointment counts per doctor and status code for one chunk"""
+    ids = array('I')
+    ids.frombytes(doctor_ids)
+    counts: Dict[int, List[int]] = {}
+    for doctor_id, status in zip(ids, statuses):
+        row = counts.get(doctor_id)
+        if row is None:
+            row = counts[doctor_id] = [0] * len(STATUSES)
+        row[status] += 1
+    return counts
+
+
+def _month_filter(month: str):
+    """Predicate on raw or decoded dates; dates repeat, so parse each once"""
+    months: Dict[object, bool] = {}
+
+    def in_month(date) -> bool:
+        found = months.get(date)
+        if found is None:
+            text = date.rstrip(b"\x00").decode() if isinstance(date, bytes) else date
+            found = months[date] = date_month(text) == month
+        return found
+    return in_month
+
+
+def _map_rows(path: str, offset: int, size: int):
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped, memoryview(mapped)[offset:offset + size]
+
+
+def _archived_bill_partials(path: str, offset: int, count: int,
+                            month: Optional[str]) -> tuple:
+    """Revenue per patient over a range of archive rows (all of them paid)"""
+    mapped, rows = _map_rows(path, offset, count * BillArchive.ROW.size)
+    revenue: Dict[int, float] = {}
+    in_month = _month_filter(month) if month is not None else None
+    try:
+        for row in BillArchive.ROW.iter_unpack(rows):
+            if in_month is not None and not in_month(row[5]):
+                continue
+            revenue[row[1]] = revenue.get(row[1], 0.0) + row[2]
+    finally:
+        rows.release()
+        mapped.close()
+    return revenue, {}
+
+
+def _archived_appointment_partials(path: str, offset: int, count: int,
+                                   month: Optional[str]) -> dict:
+    """Appointment counts per doctor over a range of archive rows"""
+    mapped, rows = _map_rows(path, offset, count * AppointmentArchive.ROW.size)
+    counts: Dict[int, List[int]] = {}
+    codes = {status.encode(): code for status, code in _STATUS_CODES.items()}
+    in_month = _month_filter(month) if month is not None else None
+    try:
+        for row in AppointmentArchive.ROW.iter_unpack(rows):
+            if in_month is not None and not in_month(row[3]):
+                continue
+            counts_row = counts.get(row[2])
+            if counts_row is None:
+                counts_row = counts[row[2]] = [0] * len(STATUSES)
+            counts_row[codes[row[5].rstrip(b"\x00")]] += 1
+    finally:
+        rows.release()
+        mapped.close()
+    return counts
+
+
+_TASKS = {
+    'bills': _bill_partials,
+    'appointments': _appointment_partials,
+    'bill_range': _bill_range_partials,
+    'payment_range': _payment_range_partials,
+    'appointment_range': _appointment_range_partials,
+    'archived_bills': _archived_bill_partials,
+    'archived_appointments': _archived_appointment_partials
+}
+
+
+def _run_task(task: tuple):
+    kind, args = task
+    return kind, _TASKS[kind](*args)
+
+
+# ==================== ENGINE ====================
+
+class ReportEngine:
+    """Computes month-end reports in parallel over a snapshot of the data.
+
+    Where processes can be forked, workers inherit the snapshot and each
+    reads its own range of bills, payments or appointments, so the parent
+    only hands out ranges. Elsewhere active records are reduced to typed
+    column arrays in the parent, chunk by chunk as the pool takes them,
+    and sent as raw bytes, never as pickled objects. Archived records are
+    read by the workers straight from the archive files. Partial
+    aggregates are merged in the parent.
+    """
+
+    def __init__(self, system, workers: Optional[int] = None,
+                 chunk_size: int = 100000):
+        self._system = system
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def month_end_report(self, month: Optional[str] = None) -> dict:
+        """Revenue by patient, unpaid balances and per-doctor utilization.
+
+        `month` (YYYY-MM) restricts the report to bills issued and
+        appointments dated in that month.
+        """
+        global _SNAPSHOT
+        timings = {}
+        start = time.perf_counter()
+        fork = self.workers == 1 or 'fork' in multiprocessing.get_all_start_methods()
+        with self._system.snapshot() as snapshot:
+            version = snapshot.version
+            if fork:
+                tasks = self._range_tasks(snapshot, month) + self._archive_tasks(snapshot, month)
+            else:
+                tasks = self._column_tasks(snapshot, month)
+            timings['prepare_ms'] = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            _SNAPSHOT = snapshot
+            try:
+                if self.workers == 1:
+                    results = [_run_task(task) for task in tasks]
+                else:
+                    context = multiprocessing.get_context('fork') if fork else None
+                    with ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=context) as pool:
+                        # Column chunks are submitted as they are built, so
+                        # workers start on the first while later ones are packed
+                        results = list(pool.map(_run_task, tasks))
+            finally:
+                _SNAPSHOT = None
+            timings['compute_ms'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        report = self._merge(results)
+        timings['merge_ms'] = (time.perf_counter() - start) * 1000
+        report.update({'month': month, 'version': version, 'workers': self.workers,
+                       'chunks': len(results), 'timings': timings})
+        return report
+
+    def _range_tasks(self, snapshot, month: Optional[str]) -> List[tuple]:
+        """Position ranges of the snapshot's sections, for forked workers"""
+        tasks = []
+        size = self.chunk_size
+        for kind, section in (('bill_range', 'bills'), ('payment_range', 'payments'),
+                              ('appointment_range', 'appointments')):
+            count = snapshot.section_size(section)
+            for first in range(0, count, size):
+                tasks.append((kind, (first, min(first + size, count), month)))
+        return tasks
+
+    def _column_tasks(self, snapshot, month: Optional[str]) -> Iterator[tuple]:
+        """Packed column chunks, built one at a time as they are taken"""
+        size = self.chunk_size
+        in_month = _month_filter(month) if month is not None else None
+
+        bills = [b for b in snapshot.iter_section('bills')
+                 if in_month is None or in_month(b.date)]
+        # Partial payments received on bills not yet fully paid
+        received: Dict[int, float] = {}
+        for payment in snapshot.iter_section('payments'):
+            received[payment.bill_id] = received.get(payment.bill_id, 0.0) + payment.amount
+        for i in range(0, len(bills), size):
+            chunk = bills[i:i + size]
+            yield ('bills', (
+                array('I', [b.patient_id for b in chunk]).tobytes(),
+                array('d', [b.total for b in chunk]).tobytes(),
+                array('d', [0.0 if b.payment_status == "Paid"
+                            else b.total - received.get(b.bill_id, 0.0)
+                            for b in chunk]).tobytes()))
+
+        appointments = [a for a in snapshot.iter_section('appointments')
+                        if in_month is None or in_month(a.date)]
+        for i in range(0, len(appointments), size):
+            chunk = appointments[i:i + size]
+            yield ('appointments', (
+                array('I', [a.doctor_id for a in chunk]).tobytes(),
+                bytes(_STATUS_CODES.get(a.status, 0) for a in chunk)))
+
+        yield from self._archive_tasks(snapshot, month)
+
+    def _archive_tasks(self, snapshot, month: Optional[str]) -> List[tuple]:
+        tasks = []
+        size = self.chunk_size
+        archived = snapshot.archived_counts
+        archive = snapshot.archive
+        for kind, archive_file in (('archived_bills', archive.bills),
+                                   ('archived_appointments', archive.appointments)):
+            count = archived[kind.split('_')[1]]
+            for first in range(0, count, size):
+                rows = min(size, count - first)
+                tasks.append((kind, (archive_file.path, archive_file.row_offset(first),
+                                     rows, month)))
+        return tasks
+
+    @staticmethod
+    def _merge(results: list) -> dict:
+        revenue: Dict[int, float] = {}
+        unpaid: Dict[int, float] = {}
+        counts: Dict[int, List[int]] = {}
+        for kind, partial in results:
+            if kind in ('bills', 'bill_range', 'payment_range', 'archived_bills'):
+                chunk_revenue, chunk_unpaid = partial
+                for patient_id, amount in chunk_revenue.items():
+                    revenue[patient_id] = revenue.get(patient_id, 0.0) + amount
+                for patient_id, amount in chunk_unpaid.items():
+                    unpaid[patient_id] = unpaid.get(patient_id, 0.0) + amount
+            else:
+                for doctor_id, row in partial.items():
+                    total = counts.get(doctor_id)
+                    if total is None:
+                        counts[doctor_id] = list(row)
+                    else:
+                        for code, n in enumerate(row):
+                            total[code] += n
+
+        utilization = {}
+        for doctor_id, row in counts.items():
+            booked = sum(row) - row[_STATUS_CODES["Cancelled"]]
+            entry = dict(zip(STATUSES, row))
+            entry['total'] = sum(row)
+            # Share of non-cancelled appointments that were completed
+            entry['utilization'] = (round(row[_STATUS_CODES["Completed"]] / booked, 4)
+                                    if booked else 0.0)
+            utilization[doctor_id] = entry
+        return {
+            'revenue_by_patient': revenue,
+            'unpaid_balances': unpaid,
+            'doctor_utilization': utilization,
+            'total_revenue': sum(revenue.values()),
+            'total_unpaid': sum(unpaid.values())
+        }
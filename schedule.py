@@ -0,0 +1,292 @@
+"""
+Doctor slot occupancy, working days and load for scheduling
+"""
+
+import re
+from datetime import date as Date
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from pagination import iso_date
+
+
+# Appointment statuses that hold a doctor's time slot
+ACTIVE_STATUSES = ("Scheduled", "Rescheduled")
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+# Working hours assumed when an availability string gives none (9-5)
+DEFAULT_HOURS = (9 * 60, 17 * 60)
+# Appointments are booked in one-hour slots
+SLOT_MINUTES = 60
+
+_DAY = r"(mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?"
+_DAY_RANGE = re.compile(_DAY + r"\s*(?:-|to)\s*" + _DAY)
+_DAY_NAME = re.compile(r"\b" + _DAY)
+_TIME = r"(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?"
+_HOURS = re.compile(_TIME + r"\s*(?:-|to)\s*" + _TIME)
+_DAY_WORDS = {
+    'daily': range(7),
+    'everyday': range(7),
+    'every day': range(7),
+    'weekdays': range(5),
+    'weekends': range(5, 7)
+}
+
+
+def slot_day(date: str) -> str:
+    """Day key of an appointment date, whichever way it was written"""
+    return iso_date(date) or date.strip()
+
+
+def _minutes(hour: str, minute: Optional[str], meridiem: Optional[str]) -> int:
+    hour = int(hour) % 24
+    if meridiem == "pm" and hour < 12:
+        hour += 12
+    elif meridiem == "am" and hour == 12:
+        hour = 0
+    return hour * 60 + int(minute or 0)
+
+
+@lru_cache(maxsize=1024)
+def parse_availability(text: str) -> Tuple[FrozenSet[int], int]:
+    """Working weekdays (0 = Monday) and daily slot count of an availability string.
+
+    Understands day ranges and lists ("Mon-Fri", "Mon, Wed, Fri",
+    "weekdays", "daily") and an hour range ("9-5", "10:00-14:30",
+    "8am-4pm"); a bare "9-5" ends in the afternoon. With no recognizable
+    days the doctor counts as working every day, and with no hours 9-5.
+    """
+    text = text.lower()
+    days: Set[int] = set()
+    for word, numbers in _DAY_WORDS.items():
+        if word in text:
+            days.update(numbers)
+    for first, last in _DAY_RANGE.findall(text):
+        start, end = WEEKDAYS.index(first), WEEKDAYS.index(last)
+        days.update(day % 7 for day in range(start, end + 1 if end >= start else end + 8))
+    days.update(WEEKDAYS.index(day) for day in _DAY_NAME.findall(_DAY_RANGE.sub(" ", text)))
+    if not days:
+        days = set(range(7))
+
+    start, end = DEFAULT_HOURS
+    hours = _HOURS.search(text)
+    if hours is not None:
+        start = _minutes(*hours.groups()[:3])
+        end = _minutes(*hours.groups()[3:])
+        if end <= start and hours.group(6) is None:
+            # "9-5": the end is in the afternoon
+            end += 12 * 60
+    return frozenset(days), max(0, end - start) // SLOT_MINUTES
+
+
+@lru_cache(maxsize=4096)
+def weekday(day: str) -> Optional[int]:
+    """Weekday (0 = Monday) of a normalized YYYY-MM-DD day, None if invalid"""
+    try:
+        return Date(int(day[:4]), int(day[5:7]), int(day[8:10])).weekday()
+    except ValueError:
+        return None
+
+
+class SlotIndex:
+    """Active appointments by doctor, day and time.
+
+    Each doctor's day is a dict keyed by time, so checking a slot is two
+    dict reads and listing a day costs only its own appointments. Only
+    Scheduled and Rescheduled appointments hold a slot; completed ones
+    free it but still count towards the day's booked total. An active
+    appointment whose slot is already held (e.g. one restored after its
+    slot was booked again) waits as a clash and takes the slot over once
+    it is freed.
+    """
+
+    # Sections the index is derived from
+    SECTIONS = ('appointments',)
+
+    def __init__(self):
+        # (doctor id, day) -> time -> appointment
+        self._days: Dict[Tuple[int, str], Dict[str, object]] = {}
+        # appointment id -> the (doctor id, day, time) it holds or waits for
+        self._keys: Dict[int, Tuple[int, str, str]] = {}
+        # (doctor id, day, time) -> active appointments waiting for the slot
+        self._clashes: Dict[Tuple[int, str, str], List] = {}
+        # (doctor id, day) -> active appointments, clashes included, and completed ones
+        self._booked: Dict[Tuple[int, str], int] = {}
+        # appointment id -> the (doctor id, day) a completed appointment is counted on
+        self._completed: Dict[int, Tuple[int, str]] = {}
+
+    def build(self, appointments, archived: Optional[Dict[Tuple[int, str], int]] = None):
+        """Index every active appointment of a freshly loaded section.
+
+        `archived` counts the completed appointments already moved to the
+        archive per (doctor id, date); they stay in the booked totals.
+        """
+        self._days = {}
+        self._keys = {}
+        self._clashes = {}
+        self._booked = {}
+        self._completed = {}
+        for (doctor_id, date), count in (archived or {}).items():
+            self._count((doctor_id, slot_day(date)), count)
+        for appointment in appointments:
+            self.add(appointment)
+
+    def add(self, appointment) -> bool:
+        """Occupy an appointment's slot; False if it is not active or the slot is taken"""
+        if appointment.is_deleted:
+            return False
+        if appointment.status == "Completed":
+            if appointment.appointment_id not in self._completed:
+                day = (appointment.doctor_id, slot_day(appointment.date))
+                self._completed[appointment.appointment_id] = day
+                self._count(day, 1)
+            return False
+        if appointment.status not in ACTIVE_STATUSES:
+            return False
+        key = (appointment.doctor_id, slot_day(appointment.date), appointment.time.strip())
+        slots = self._days.setdefault(key[:2], {})
+        holder = slots.get(key[2])
+        if holder is appointment:
+            return True
+        self._keys[appointment.appointment_id] = key
+        self._count(key[:2], 1)
+        if holder is not None:
+            self._clashes.setdefault(key, []).append(appointment)
+            return False
+        slots[key[2]] = appointment
+        return True
+
+    def discard(self, appointment):
+        """Free whatever slot the appointment held, or the count it made, when indexed"""
+        day = self._completed.pop(appointment.appointment_id, None)
+        if day is not None:
+            self._count(day, -1)
+        key = self._keys.pop(appointment.appointment_id, None)
+        if key is None:
+            return
+        self._count(key[:2], -1)
+        slots = self._days[key[:2]]
+        if slots.get(key[2]) is not appointment:
+            self._clashes[key].remove(appointment)
+        elif key in self._clashes:
+            slots[key[2]] = self._clashes[key].pop(0)
+        else:
+            del slots[key[2]]
+            if not slots:
+                del self._days[key[:2]]
+        if not self._clashes.get(key, True):
+            del self._clashes[key]
+
+    def _count(self, day: Tuple[int, str], change: int):
+        booked = self._booked.get(day, 0) + change
+        if booked:
+            self._booked[day] = booked
+        else:
+            self._booked.pop(day, None)
+
+    def sync(self, appointment):
+        """Re-index an appointment after its status, date or tombstone changed"""
+        self.discard(appointment)
+        self.add(appointment)
+
+    def occupant(self, doctor_id: int, date: str, time: str):
+        """The active appointment holding a slot, or None"""
+        return self._days.get((doctor_id, slot_day(date)), {}).get(time.strip())
+
+    def day(self, doctor_id: int, date: str) -> List:
+        """A doctor's active appointments on one day, by time, clashes included"""
+        day = slot_day(date)
+        slots = self._days.get((doctor_id, day), {})
+        appointments = []
+        for time in sorted(slots):
+            appointments.append(slots[time])
+            appointments.extend(self._clashes.get((doctor_id, day, time), ()))
+        return appointments
+
+    def is_free(self, doctor_id: int, date: str, time: str,
+                ignore: Optional[object] = None) -> bool:
+        occupant = self.occupant(doctor_id, date, time)
+        return occupant is None or occupant is ignore
+
+    def booked(self, doctor_id: int, date: str) -> int:
+        """Number of active and completed appointments a doctor has on one day"""
+        return self._booked.get((doctor_id, slot_day(date)), 0)
+
+
+class Rota:
+    """Parsed availability of every active doctor, grouped by specialization.
+
+    Together with the booked-slot counters of a SlotIndex this answers
+    utilization and least-loaded queries without touching appointments.
+    """
+
+    # Sections the rota is derived from
+    SECTIONS = ('doctors',)
+
+    def __init__(self):
+        # doctor id -> (working weekdays, slots per day)
+        self._shifts: Dict[int, Tuple[FrozenSet[int], int]] = {}
+        # lower-cased specialization -> doctor ids
+        self._specialists: Dict[str, Set[int]] = {}
+        self._specializations: Dict[int, str] = {}
+
+    def build(self, doctors):
+        self._shifts = {}
+        self._specialists = {}
+        self._specializations = {}
+        for doctor in doctors:
+            self.update(doctor)
+
+    def update(self, doctor):
+        """Add, refresh or (once deleted) drop one doctor"""
+        doctor_id = doctor.person_id
+        old = self._specializations.pop(doctor_id, None)
+        if old is not None:
+            self._specialists[old].discard(doctor_id)
+            if not self._specialists[old]:
+                del self._specialists[old]
+        self._shifts.pop(doctor_id, None)
+        if doctor.is_deleted:
+            return
+        specialization = doctor.specialization.strip().lower()
+        self._specializations[doctor_id] = specialization
+        self._specialists.setdefault(specialization, set()).add(doctor_id)
+        self._shifts[doctor_id] = parse_availability(doctor.availability)
+
+    def specialists(self, specialization: Optional[str] = None) -> Set[int]:
+        """Ids of active doctors of a specialization (all of them if None)"""
+        if specialization is None:
+            return set(self._shifts)
+        return self._specialists.get(specialization.strip().lower(), set())
+
+    def capacity(self, doctor_id: int, day: str) -> int:
+        """Slots a doctor works on a normalized day (0 off duty or unknown)"""
+        shift = self._shifts.get(doctor_id)
+        if shift is None:
+            return 0
+        days, slots = shift
+        return slots if weekday(day) in days else 0
+
+    def load(self, slots: SlotIndex, doctor_id: int, date: str) -> dict:
+        """Booked slots, capacity and utilization percentage of a doctor's day"""
+        day = slot_day(date)
+        booked = slots.booked(doctor_id, day)
+        capacity = self.capacity(doctor_id, day)
+        return {'booked': booked, 'capacity': capacity,
+                'utilization': round(100.0 * booked / capacity, 1) if capacity else None}
+
+    def least_loaded(self, slots: SlotIndex, specialization: str,
+                     date: str) -> Optional[int]:
+        """Doctor of a specialization with the lowest utilization and a free slot"""
+        day = slot_day(date)
+        best = None
+        for doctor_id in self.specialists(specialization):
+            capacity = self.capacity(doctor_id, day)
+            booked = slots.booked(doctor_id, day)
+            if booked >= capacity:
+                continue
+            # Ties go to the longer shift, then the lower id
+            key = (booked / capacity, -capacity, doctor_id)
+            if best is None or key < best:
+                best = key
+        return best[2] if best is not None else None
@@ -0,0 +1,212 @@
+"""
+Full-text search over patients' disease text: an inverted index with
+boolean queries
+"""
+
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Parentheses, or runs of anything else up to whitespace or a parenthesis
+_QUERY_PART = re.compile(r"[()]|[^\s()]+")
+_OPERATORS = {'and': 'and', '&': 'and', 'or': 'or', '|': 'or', 'not': 'not'}
+
+
+class QueryError(ValueError):
+    """Raised for a malformed search query"""
+
+
+def normalize(text: str) -> str:
+    """Lower-case text with accents removed ("Ménière's" -> "meniere's")"""
+    if text.isascii():
+        return text.lower()
+    folded = unicodedata.normalize('NFKD', text.lower())
+    return "".join(c for c in folded if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Searchable words of a text: letters and digits, normalized"""
+    return _WORD.findall(normalize(text))
+
+
+@lru_cache(maxsize=65536)
+def disease_words(disease: str) -> FrozenSet[str]:
+    """Distinct words of a disease text; most patients share a few texts"""
+    return frozenset(tokenize(disease))
+
+
+class DiseaseIndex:
+    """Patient ids by disease word.
+
+    Queries combine words with AND (also implied between words), OR and
+    NOT, with parentheses, and "diab*" matches every word starting with
+    "diab": e.g. "diabetes or hypertension", "asthma not (mild or
+    seasonal)". AND binds tighter than OR. Matching is on whole words, so
+    "flu" does not find "influenza" but "influ*" does. Results are sets
+    intersected or merged in C, so a query costs the size of its
+    postings, not a pass over every patient.
+    """
+
+    # Sections the index is derived from
+    SECTIONS = ('patients',)
+
+    def __init__(self):
+        self._postings: Dict[str, Set[int]] = {}
+        # patient id -> words it was filed under
+        self._words: Dict[int, FrozenSet[str]] = {}
+        # Sorted words for prefix queries, rebuilt after the vocabulary changes
+        self._vocabulary: Optional[List[str]] = None
+
+    def build(self, patients):
+        self._postings = {}
+        self._words = {}
+        self._vocabulary = None
+        for patient in patients:
+            self.add(patient)
+
+    def add(self, patient):
+        if patient.is_deleted:
+            return
+        words = self._words[patient.person_id] = disease_words(patient.disease)
+        for word in words:
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                self._vocabulary = None
+            posting.add(patient.person_id)
+
+    def discard(self, patient):
+        for word in self._words.pop(patient.person_id, ()):
+            posting = self._postings[word]
+            posting.discard(patient.person_id)
+            if not posting:
+                del self._postings[word]
+                self._vocabulary = None
+
+    def sync(self, patient):
+        """Re-file a patient after its disease or tombstone changed"""
+        self.discard(patient)
+        self.add(patient)
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    # ==================== QUERIES ====================
+
+    def count(self, query: str) -> int:
+        """Number of patients matching a query"""
+        return len(self._evaluate(query))
+
+    def ids(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """Ids of matching patients in ascending order, the first `limit` if given"""
+        matches = self._evaluate(query)
+        if limit is not None and limit < len(matches):
+            return heapq.nsmallest(limit, matches)
+        return sorted(matches)
+
+    def word_counts(self, query: str) -> Dict[str, int]:
+        """Patients per word (or expanded prefix) used in a query"""
+        counts = {}
+        for part in _QUERY_PART.findall(query):
+            if part in "()" or part.lower() in _OPERATORS:
+                continue
+            for word in self._expand(part):
+                counts[word] = len(self._postings.get(word, ()))
+        return counts
+
+    def top_words(self, n: int = 10) -> List[Tuple[str, int]]:
+        """Most common disease words, as (word, patients)"""
+        return Counter({word: len(ids) for word, ids in self._postings.items()}).most_common(n)
+
+    def _evaluate(self, query: str) -> Set[int]:
+        # Returned sets may be postings themselves and must not be modified
+        parts = _QUERY_PART.findall(query)
+        if not parts:
+            raise QueryError("Empty search query")
+        result, pos = self._parse_or(parts, 0)
+        if pos != len(parts):
+            raise QueryError(f"Unexpected '{parts[pos]}' in search query")
+        return result
+
+    def _parse_or(self, parts: List[str], pos: int) -> Tuple[Set[int], int]:
+        alternatives = []
+        while True:
+            matches, pos = self._parse_and(parts, pos)
+            alternatives.append(matches)
+            if pos < len(parts) and _OPERATORS.get(parts[pos].lower()) == 'or':
+                pos += 1
+                continue
+            break
+        if len(alternatives) == 1:
+            return alternatives[0], pos
+        return set().union(*alternatives), pos
+
+    def _parse_and(self, parts: List[str], pos: int) -> Tuple[Set[int], int]:
+        required = []
+        excluded = []
+        while pos < len(parts) and parts[pos] != ")":
+            operator = _OPERATORS.get(parts[pos].lower())
+            if operator == 'or':
+                break
+            if operator == 'and':
+                pos += 1
+                continue
+            negate = operator == 'not'
+            if negate:
+                pos += 1
+            matches, pos = self._parse_term(parts, pos)
+            (excluded if negate else required).append(matches)
+        if not required and not excluded:
+            raise QueryError("Search query is missing a word")
+        if required:
+            # Smallest first, so each intersection only walks a small set
+            required.sort(key=len)
+            result = required[0].intersection(*required[1:]) if len(required) > 1 else required[0]
+        else:
+            result = self._words.keys()
+        if excluded:
+            result = set(result).difference(*excluded)
+        return result, pos
+
+    def _parse_term(self, parts: List[str], pos: int) -> Tuple[Set[int], int]:
+        if pos >= len(parts):
+            raise QueryError("Search query ends with an operator")
+        part = parts[pos]
+        if part == "(":
+            matches, pos = self._parse_or(parts, pos + 1)
+            if pos >= len(parts) or parts[pos] != ")":
+                raise QueryError("Unbalanced parentheses in search query")
+            return matches, pos + 1
+        if _OPERATORS.get(part.lower()) is not None:
+            raise QueryError(f"Unexpected '{part}' in search query")
+        words = self._expand(part)
+        if part.endswith("*"):
+            return set().union(*(self._postings[word] for word in words)), pos + 1
+        # "type-2" is the words "type" and "2"
+        postings = sorted((self._postings.get(word, set()) for word in words), key=len)
+        if not postings:
+            raise QueryError(f"Nothing to search for in '{part}'")
+        if len(postings) == 1:
+            return postings[0], pos + 1
+        return postings[0].intersection(*postings[1:]), pos + 1
+
+    def _expand(self, part: str) -> List[str]:
+        """Index words a query word stands for"""
+        if not part.endswith("*"):
+            return tokenize(part)
+        prefix = "".join(tokenize(part[:-1]))
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        words = []
+        for i in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            if not vocabulary[i].startswith(prefix):
+                break
+            words.append(vocabulary[i])
+        return words
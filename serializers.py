@@ -0,0 +1,500 @@
+"""
+Pluggable serializers for the hospital data file
+"""
+
+import json
+import marshal
+import os
+import struct
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from patient import Patient
+from doctor import Doctor
+from appointment import Appointment
+from billing import Billing
+from payment import Payment
+from invoice import Invoice
+from encryption import PASSPHRASE_ENV, SALT_SIZE, DecryptionError, RecordCipher
+
+
+# Section name -> entity class, in file order
+SECTIONS = {
+    'patients': Patient,
+    'doctors': Doctor,
+    'appointments': Appointment,
+    'bills': Billing,
+    'payments': Payment,
+    'invoices': Invoice
+}
+
+
+def record_of(entity) -> tuple:
+    """Entity as a FIELDS-order tuple, followed by its tombstone if deleted or
+    changed, and by its version if changed"""
+    record = entity.to_record()
+    if entity._version:
+        record += (entity._deleted, entity._version)
+    elif entity._deleted:
+        record += (entity._deleted,)
+    return record
+
+
+def entity_of(cls, record):
+    """Inverse of record_of"""
+    width = len(cls.FIELDS)
+    if len(record) > width:
+        entity = cls.from_record(record[:width])
+        entity._deleted = record[width]
+        if len(record) > width + 1:
+            entity._version = record[width + 1]
+        return entity
+    return cls.from_record(record)
+
+
+class _SectionCache:
+    """Fragments of one section as of the last encode_cached call"""
+
+    __slots__ = ('entities', 'fragments', 'dirty', 'on_disk')
+
+    def __init__(self, entities: list):
+        self.entities = entities
+        self.fragments: List[bytes] = []
+        # Records marked dirty since the last save; a deque so records
+        # dirtied while a save is draining it are never lost
+        self.dirty = deque()
+        # Set by track(): number of records already stored unchanged on
+        # disk, before any fragment has been encoded
+        self.on_disk: Optional[int] = None
+
+
+class Serializer:
+    """Base class for data file formats.
+
+    Records are encoded one at a time into byte fragments and then joined
+    into a file, so callers can cache fragments of unchanged records.
+    """
+
+    name = "base"
+    extension = ".dat"
+    encrypted = False
+
+    def __init__(self):
+        # Records encoded and cached fragments reused by encode_cached
+        self.encoded = 0
+        self.reused = 0
+        self._sections: Dict[str, _SectionCache] = {}
+
+    @property
+    def tag(self):
+        """Fragments cached on records are reused by serializers with the same tag"""
+        return self.name
+
+    def encode_record(self, section: str, entity) -> bytes:
+        """Encode a single entity into a byte fragment"""
+        raise NotImplementedError
+
+    def join(self, fragments: Dict[str, List[bytes]]) -> bytes:
+        """Join per-section record fragments into a complete file"""
+        raise NotImplementedError
+
+    def decode(self, raw: bytes) -> Dict[str, list]:
+        """Decode a complete file into lists of entity objects per section"""
+        raise NotImplementedError
+
+    def encode(self, sections: Dict[str, list]) -> bytes:
+        """Encode lists of entity objects per section into a complete file"""
+        return self.join({name: [self.encode_record(name, e) for e in entities]
+                          for name, entities in sections.items()})
+
+    def encode_cached(self, sections: Dict[str, list]) -> bytes:
+        """Like encode, but only re-encodes records changed since the last call.
+
+        Each section remembers its fragments and the records dirtied since,
+        so a save costs one encode per changed or appended record plus the
+        final join. Removing records or replacing the list falls back to a
+        full pass that still reuses every record's own cached fragment.
+        """
+        return self.join({section: self.section_fragments(section, section,
+                                                          entities)[0]
+                          for section, entities in sections.items()})
+
+    def section_fragments(self, key: str, section: str, entities: list,
+                          force: bool = False) -> Tuple[List[bytes], bool]:
+        """Get cached fragments for a list of records of one section.
+
+        `key` identifies the list across calls, so one section can be cached
+        as several independent partitions. Also returns whether anything
+        changed since the previous call for the same key. `force` makes a
+        list registered with track() return its fragments even if unchanged.
+        """
+        cache = self._sections.get(key)
+        if cache is not None and cache.on_disk is not None:
+            if (not force and cache.entities is entities and not cache.dirty and
+                    len(entities) == cache.on_disk):
+                return [], False
+            cache = None
+        if (cache is not None and cache.entities is entities and
+                len(entities) >= len(cache.fragments)):
+            encoded, changed = self._update_section(section, cache)
+        else:
+            cache = self._sections[key] = _SectionCache(entities)
+            encoded, changed = self._rebuild_section(section, cache), True
+        self.encoded += encoded
+        self.reused += len(cache.fragments) - encoded
+        return cache.fragments, changed
+
+    def track(self, key: str, entities: list):
+        """Start tracking records just loaded from an up-to-date file.
+
+        Until one of them changes, section_fragments reports the list as
+        unchanged without encoding anything (and returns no fragments).
+        """
+        cache = self._sections[key] = _SectionCache(entities)
+        cache.on_disk = len(entities)
+        for slot, entity in enumerate(entities):
+            entity._section = cache
+            entity._slot = slot
+
+    def pending(self, key: str) -> list:
+        """Records marked dirty in a cached list since it was last encoded"""
+        cache = self._sections.get(key)
+        return list(cache.dirty) if cache is not None else []
+
+    def invalidate(self, section: str = None):
+        """Forget cached section layouts, e.g. after records were removed"""
+        if section is None:
+            self._sections.clear()
+            return
+        for key in list(self._sections):
+            if key == section or key.startswith(section + "@"):
+                del self._sections[key]
+
+    def _fragment(self, section: str, entity) -> bytes:
+        # The revision is read before encoding so a concurrent mutation
+        # leaves the cached fragment stale rather than wrong
+        revision = entity._revision
+        fragment = self.encode_record(section, entity)
+        entity._fragment = (revision, self.tag, fragment)
+        return fragment
+
+    def _rebuild_section(self, section: str, cache: _SectionCache) -> int:
+        name = self.tag
+        encoded = 0
+        records = cache.fragments
+        for slot, entity in enumerate(cache.entities):
+            entity._section = cache
+            entity._slot = slot
+            cached = entity._fragment
+            if (cached is not None and cached[0] == entity._revision and
+                    cached[1] == name):
+                records.append(cached[2])
+            else:
+                records.append(self._fragment(section, entity))
+                encoded += 1
+        return encoded
+
+    def _update_section(self, section: str, cache: _SectionCache) -> Tuple[int, bool]:
+        entities = cache.entities
+        records = cache.fragments
+        dirty = cache.dirty
+        encoded = 0
+        while dirty:
+            entity = dirty.popleft()
+            slot = entity._slot
+            if slot >= len(records) or entities[slot] is not entity:
+                # Positions shifted under us; start the section over
+                cache.fragments = []
+                cache.dirty.clear()
+                return self._rebuild_section(section, cache), True
+            cached = entity._fragment
+            if cached is None or cached[0] != entity._revision:
+                records[slot] = self._fragment(section, entity)
+                encoded += 1
+        changed = encoded > 0 or len(entities) > len(records)
+        for slot in range(len(records), len(entities)):
+            entity = entities[slot]
+            entity._section = cache
+            entity._slot = slot
+            records.append(self._fragment(section, entity))
+            encoded += 1
+        return encoded, changed
+
+
+class JsonSerializer(Serializer):
+    """Pretty-printed JSON, the original data file format"""
+
+    name = "json"
+    extension = ".json"
+
+    def __init__(self, indent: int = 2):
+        super().__init__()
+        self._indent = indent
+        self._prefix = "\n" + " " * (indent * 2)
+
+    def encode_record(self, section: str, entity) -> bytes:
+        data = entity.to_dict()
+        if entity._deleted:
+            data['deleted'] = entity._deleted
+        if entity._version:
+            data['version'] = entity._version
+        text = json.dumps(data, indent=self._indent)
+        return text.replace("\n", self._prefix).encode('utf-8')
+
+    def join(self, fragments: Dict[str, List[bytes]]) -> bytes:
+        pad = b" " * self._indent
+        sep = ("," + self._prefix).encode('utf-8')
+        parts = []
+        for name, records in fragments.items():
+            if records:
+                body = (self._prefix.encode('utf-8') + sep.join(records) +
+                        b"\n" + pad + b"]")
+            else:
+                body = b"]"
+            parts.append(pad + json.dumps(name).encode('utf-8') + b": [" + body)
+        return b"{\n" + b",\n".join(parts) + b"\n}"
+
+    def decode(self, raw: bytes) -> Dict[str, list]:
+        data = json.loads(raw)
+        sections = {}
+        for name, cls in SECTIONS.items():
+            fields = cls.FIELDS
+            entities = []
+            for d in data.get(name, []):
+                try:
+                    entity = cls.from_record([d[k] for k in fields])
+                except KeyError:
+                    # Older files may miss optional fields
+                    entity = cls.from_dict(d)
+                if 'deleted' in d:
+                    entity._deleted = d['deleted']
+                if 'version' in d:
+                    entity._version = d['version']
+                entities.append(entity)
+            sections[name] = entities
+        return sections
+
+
+class CompactJsonSerializer(JsonSerializer):
+    """Minified JSON with records stored as arrays in FIELDS order"""
+
+    name = "compact-json"
+
+    def __init__(self):
+        super().__init__(indent=0)
+
+    def encode_record(self, section: str, entity) -> bytes:
+        return json.dumps(record_of(entity), separators=(',', ':'),
+                          ensure_ascii=False).encode('utf-8')
+
+    def join(self, fragments: Dict[str, List[bytes]]) -> bytes:
+        parts = [json.dumps(name).encode('utf-8') + b":[" + b",".join(records) + b"]"
+                 for name, records in fragments.items()]
+        return b'{"format":"compact-json",' + b",".join(parts) + b"}"
+
+    def decode(self, raw: bytes) -> Dict[str, list]:
+        data = json.loads(raw)
+        if data.get('format') != self.name:
+            return JsonSerializer.decode(self, raw)
+        return {name: [entity_of(cls, r) for r in data.get(name, [])]
+                for name, cls in SECTIONS.items()}
+
+
+class BinarySerializer(Serializer):
+    """Length-prefixed marshal records per section behind a version header.
+
+    Layout: MAGIC, u16 version, then for each section a u8 name length,
+    the name, a u32 record count and that many (u32 length, record) pairs.
+    """
+
+    name = "binary"
+    extension = ".bin"
+    MAGIC = b"MCHMS\x00"
+    VERSION = 1
+
+    _u8 = struct.Struct("<B")
+    _u16 = struct.Struct("<H")
+    _u32 = struct.Struct("<I")
+
+    def encode_record(self, section: str, entity) -> bytes:
+        body = marshal.dumps(record_of(entity))
+        return self._u32.pack(len(body)) + body
+
+    def join(self, fragments: Dict[str, List[bytes]]) -> bytes:
+        parts = [self._header()]
+        for name, records in fragments.items():
+            encoded = name.encode('ascii')
+            parts.append(self._u8.pack(len(encoded)))
+            parts.append(encoded)
+            parts.append(self._u32.pack(len(records)))
+            parts.extend(records)
+        return b"".join(parts)
+
+    def decode(self, raw: bytes) -> Dict[str, list]:
+        view = memoryview(raw)
+        pos = self._read_header(raw)
+        unpack_u32 = self._u32.unpack_from
+        sections = {name: [] for name in SECTIONS}
+        while pos < len(raw):
+            name_len = raw[pos]
+            pos += 1
+            name = bytes(view[pos:pos + name_len]).decode('ascii')
+            pos += name_len
+            (count,) = unpack_u32(raw, pos)
+            pos += 4
+            cls = SECTIONS[name]
+            loads = self._loader(name)
+            from_record = cls.from_record
+            width = len(cls.FIELDS)
+            entities = sections[name]
+            for _ in range(count):
+                (size,) = unpack_u32(raw, pos)
+                pos += 4
+                record = loads(view[pos:pos + size])
+                if len(record) > width:
+                    entities.append(entity_of(cls, record))
+                else:
+                    entities.append(from_record(record))
+                pos += size
+        return sections
+
+    def _header(self) -> bytes:
+        return self.MAGIC + self._u16.pack(self.VERSION)
+
+    def _read_header(self, raw: bytes) -> int:
+        """Check the header and return the offset of the first section"""
+        if not raw.startswith(self.MAGIC):
+            raise ValueError(f"Not a {self.name} hospital data file")
+        pos = len(self.MAGIC)
+        (version,) = self._u16.unpack_from(raw, pos)
+        if version > self.VERSION:
+            raise ValueError(f"Unsupported data file version: {version}")
+        return pos + self._u16.size
+
+    def _loader(self, section: str) -> Callable[[memoryview], tuple]:
+        """Function turning one stored record of a section back into a tuple"""
+        return marshal.loads
+
+
+class EncryptedSerializer(BinarySerializer):
+    """The binary format with every record encrypted on its own.
+
+    The header adds the salt the keys were derived from and a check value
+    that tells a wrong passphrase from a corrupted file. Each record is
+    stored as its u32 id in the clear followed by the encrypted record,
+    whose tag covers that id, so a record cannot be passed off under
+    another id. As records are encrypted one by one, the fragment cache
+    keeps working: a save only encrypts the records changed since the last
+    one. Ids and record counts stay visible; names, contacts, diseases and
+    amounts do not. Archive files are not covered: paid bills moved there
+    by archive_closed keep their amounts in plaintext.
+    """
+
+    name = "encrypted"
+    extension = ".enc"
+    encrypted = True
+    MAGIC = b"MCHMSE"
+
+    def __init__(self, passphrase: Optional[str] = None):
+        super().__init__()
+        if passphrase is None:
+            passphrase = os.environ.get(PASSPHRASE_ENV)
+        self._passphrase = passphrase
+        # Adopted from the first file read, or made up on the first save
+        self._salt: Optional[bytes] = None
+        self._ciphers: Dict[bytes, RecordCipher] = {}
+        # Cipher of the file being decoded
+        self._reading: Optional[RecordCipher] = None
+
+    @property
+    def tag(self):
+        # Fragments encrypted under another salt cannot go into this file
+        return (self.name, self._salt)
+
+    def encode_record(self, section: str, entity) -> bytes:
+        record = record_of(entity)
+        body = self._u32.pack(record[0]) + self._cipher().encrypt(
+            marshal.dumps(record), section, record[0])
+        return self._u32.pack(len(body)) + body
+
+    def section_fragments(self, key: str, section: str, entities: list,
+                          force: bool = False) -> Tuple[List[bytes], bool]:
+        # The salt must be fixed before cached fragments are compared by tag
+        self._cipher()
+        return super().section_fragments(key, section, entities, force)
+
+    def _cipher(self, salt: Optional[bytes] = None) -> RecordCipher:
+        if self._passphrase is None:
+            raise DecryptionError(f"The data file is encrypted; set {PASSPHRASE_ENV} "
+                                  f"or pass a passphrase")
+        if salt is None:
+            if self._salt is None:
+                self._salt = os.urandom(SALT_SIZE)
+            salt = self._salt
+        cipher = self._ciphers.get(salt)
+        if cipher is None:
+            cipher = self._ciphers[salt] = RecordCipher(self._passphrase, salt)
+        return cipher
+
+    def _header(self) -> bytes:
+        cipher = self._cipher()
+        return super()._header() + self._salt + cipher.check
+
+    def _read_header(self, raw: bytes) -> int:
+        pos = super()._read_header(raw)
+        salt = bytes(raw[pos:pos + SALT_SIZE])
+        if self._salt is None:
+            self._salt = salt
+        cipher = self._cipher(salt)
+        pos += SALT_SIZE
+        if bytes(raw[pos:pos + len(cipher.check)]) != cipher.check:
+            raise DecryptionError("Wrong passphrase for the encrypted data file")
+        self._reading = cipher
+        return pos + len(cipher.check)
+
+    def _loader(self, section: str) -> Callable[[memoryview], tuple]:
+        decrypt = self._reading.decrypt
+        loads = marshal.loads
+        unpack_id = self._u32.unpack_from
+
+        def load(body: memoryview) -> tuple:
+            (record_id,) = unpack_id(body)
+            return loads(decrypt(body[4:], section, record_id))
+        return load
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    CompactJsonSerializer.name: CompactJsonSerializer,
+    BinarySerializer.name: BinarySerializer,
+    EncryptedSerializer.name: EncryptedSerializer
+}
+
+
+def get_serializer(name: str, passphrase: Optional[str] = None) -> Serializer:
+    """Get a serializer instance by format name"""
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown data format: {name}")
+    if name == EncryptedSerializer.name:
+        return EncryptedSerializer(passphrase)
+    return SERIALIZERS[name]()
+
+
+def detect_serializer(raw: bytes, passphrase: Optional[str] = None,
+                      current: Optional[Serializer] = None) -> Serializer:
+    """Pick the serializer that can read an existing data file.
+
+    `current` is returned when it is of the file's format, so an encrypted
+    file is read with the keys the session already derived.
+    """
+    if raw.startswith(EncryptedSerializer.MAGIC):
+        cls = EncryptedSerializer
+    elif raw.startswith(BinarySerializer.MAGIC):
+        cls = BinarySerializer
+    elif raw.startswith(b'{"format":"compact-json"'):
+        cls = CompactJsonSerializer
+    else:
+        cls = JsonSerializer
+    if type(current) is cls:
+        return current
+    return cls(passphrase) if cls is EncryptedSerializer else cls()
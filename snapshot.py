@@ -0,0 +1,201 @@
+"""
+Copy-on-write snapshots of the hospital data for long-running reports
+"""
+
+import itertools
+import threading
+import time
+import weakref
+from typing import Dict, Iterator, List, Optional
+
+from pagination import bisect_id
+from record import Record
+
+
+class SnapshotRegistry:
+    """Tracks live snapshots and preserves records for them before changes.
+
+    Every snapshot gets a new epoch. A record remembers the newest epoch
+    its current state was preserved for; on its first change after a
+    newer snapshot was taken, a detached copy of the old state is handed
+    to each live snapshot that has not seen one yet.
+    """
+
+    def __init__(self):
+        self.epoch = 0
+        self._live: "weakref.WeakSet[Snapshot]" = weakref.WeakSet()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def register(self, snapshot: 'Snapshot') -> int:
+        """Start preserving records for a new snapshot; returns its epoch"""
+        with self._lock:
+            self.epoch += 1
+            self._live.add(snapshot)
+            self._count += 1
+            Record._versions = self
+            epoch = self.epoch
+        # Runs once, on release() or when the snapshot is garbage collected
+        snapshot._finalizer = weakref.finalize(snapshot, self._released)
+        return epoch
+
+    def release(self, snapshot: 'Snapshot'):
+        with self._lock:
+            self._live.discard(snapshot)
+        snapshot._finalizer()
+
+    def _released(self):
+        with self._lock:
+            self._count -= 1
+            if not self._count:
+                # Writers skip the hook entirely while no snapshot is alive
+                Record._versions = None
+
+    def preserve(self, record: Record):
+        """Give live snapshots a copy of a record that is about to change"""
+        with self._lock:
+            if record._epoch >= self.epoch:
+                return
+            frozen = None
+            for snapshot in list(self._live):
+                if snapshot.epoch > record._epoch:
+                    if frozen is None:
+                        frozen = type(record).from_record(record.to_record())
+                        frozen._deleted = record._deleted
+                        frozen._version = record._version
+                    snapshot._preserved.setdefault(id(record), frozen)
+            record._epoch = self.epoch
+
+    @property
+    def live(self) -> int:
+        return self._count
+
+
+_REGISTRY = SnapshotRegistry()
+
+
+class Snapshot:
+    """Read-only view of every section as of one change-feed version.
+
+    Creating one copies the section lists (pointers only) and nothing
+    else; records changed afterwards are copied once, by the writer, the
+    first time they change. Readers never take a lock and never see a
+    list change under them. Release it (or use it as a context manager)
+    when done so writers stop paying for the copies.
+    """
+
+    def __init__(self, sections: Dict[str, list], archive, version: int):
+        start = time.perf_counter()
+        # id(record) -> detached copy of the record as of this snapshot
+        self._preserved: Dict[int, Record] = {}
+        self.epoch = _REGISTRY.register(self)
+        self.version = version
+        self.created_at = time.time()
+        self._sections = {name: list(entities) for name, entities in sections.items()}
+        self._archive = archive
+        self._archived = archive.counts()
+        self._archived_revenue = archive.bills.revenue
+        self.creation_ms = (time.perf_counter() - start) * 1000
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def release(self):
+        """Stop preserving records for this snapshot"""
+        _REGISTRY.release(self)
+
+    @property
+    def archive(self):
+        return self._archive
+
+    @property
+    def archived_counts(self) -> Dict[str, int]:
+        """Archived records per section as of the snapshot"""
+        return dict(self._archived)
+
+    @property
+    def preserved(self) -> int:
+        """Records copied because they changed after the snapshot was taken"""
+        return len(self._preserved)
+
+    def iter_section(self, section: str) -> Iterator:
+        """Records of a section as they were, skipping deleted ones"""
+        preserved = self._preserved
+        for entity in self._sections[section]:
+            entity = preserved.get(id(entity), entity)
+            if not entity._deleted:
+                yield entity
+
+    def section_size(self, section: str) -> int:
+        """Positions in a section, deleted records included (for iter_range)"""
+        return len(self._sections[section])
+
+    def iter_range(self, section: str, start: int, stop: int) -> Iterator:
+        """iter_section over list positions start..stop, for splitting work"""
+        preserved = self._preserved
+        for entity in self._sections[section][start:stop]:
+            entity = preserved.get(id(entity), entity)
+            if not entity._deleted:
+                yield entity
+
+    def find(self, section: str, id_attr: str, record_id: int) -> Optional[Record]:
+        """One record as it was, by id (sections are kept in id order)"""
+        entities = self._sections[section]
+        i = bisect_id(entities, id_attr, record_id)
+        if i < len(entities) and getattr(entities[i], id_attr) == record_id:
+            entity = self._preserved.get(id(entities[i]), entities[i])
+            if not entity._deleted:
+                return entity
+        return None
+
+    def get_all_patients(self) -> List:
+        return list(self.iter_section('patients'))
+
+    def get_all_doctors(self) -> List:
+        return list(self.iter_section('doctors'))
+
+    def get_all_appointments(self) -> List:
+        return list(self.iter_section('appointments'))
+
+    def get_all_bills(self) -> List:
+        return list(self.iter_section('bills'))
+
+    def iter_archived_appointments(self) -> Iterator:
+        """Archived appointments as of the snapshot (the archive only grows)"""
+        return itertools.islice(iter(self._archive.appointments),
+                                self._archived['appointments'])
+
+    def iter_archived_bills(self) -> Iterator:
+        """Archived bills as of the snapshot (the archive only grows)"""
+        return itertools.islice(iter(self._archive.bills), self._archived['bills'])
+
+    def get_statistics(self) -> dict:
+        """System statistics as of the snapshot, including archived records"""
+        patients = sum(1 for _ in self.iter_section('patients'))
+        doctors = sum(1 for _ in self.iter_section('doctors'))
+        appointments = 0
+        scheduled = 0
+        for appointment in self.iter_section('appointments'):
+            appointments += 1
+            if appointment.status == "Scheduled":
+                scheduled += 1
+        bills = 0
+        paid = 0
+        revenue = 0.0
+        for bill in self.iter_section('bills'):
+            bills += 1
+            revenue += bill.total
+            if bill.payment_status == "Paid":
+                paid += 1
+        return {
+            'total_patients': patients,
+            'total_doctors': doctors,
+            'total_appointments': appointments + self._archived['appointments'],
+            'scheduled_appointments': scheduled,
+            'total_bills': bills + self._archived['bills'],
+            'paid_bills': paid + self._archived['bills'],
+            'total_revenue': revenue + self._archived_revenue
+        }
@@ -0,0 +1,202 @@
+"""
+Split storage: one file per entity type, optionally one per month
+"""
+
+import os
+import re
+from typing import Dict, Optional, Set
+
+from persistence import atomic_write
+from encryption import DecryptionError
+from serializers import Serializer, detect_serializer
+
+
+_DAY_MONTH_YEAR = re.compile(r"^(\d{1,2})-(\d{1,2})-(\d{4})")
+_YEAR_MONTH = re.compile(r"^(\d{4})-(\d{1,2})")
+
+
+def date_month(date: str) -> str:
+    """YYYY-MM of a DD-MM-YYYY or YYYY-MM[-DD] date, or 'undated'"""
+    date = date.strip()
+    match = _DAY_MONTH_YEAR.match(date)
+    if match:
+        return f"{match.group(3)}-{int(match.group(2)):02d}"
+    match = _YEAR_MONTH.match(date)
+    if match:
+        return f"{match.group(1)}-{int(match.group(2)):02d}"
+    return "undated"
+
+
+def appointment_month(appointment) -> str:
+    """Partition key (YYYY-MM) of an appointment, from its DD-MM-YYYY date"""
+    return date_month(appointment.date)
+
+
+def bill_month(bill) -> str:
+    """Partition key (YYYY-MM) of a bill, from its issue date"""
+    match = _YEAR_MONTH.match(bill.date)
+    if match:
+        return f"{match.group(1)}-{int(match.group(2)):02d}"
+    return "undated"
+
+
+# Sections that can be split into monthly partitions
+MONTHLY_PARTITIONS = {
+    'appointments': appointment_month,
+    'bills': bill_month
+}
+
+
+class SplitStore:
+    """Stores each section in its own file(s) inside a directory.
+
+    Sections are loaded independently, and a save only rewrites the
+    partitions whose records changed. With `partition_by_month`,
+    appointments and bills go to one file per month, e.g.
+    ``bills-2026-10.bin``; everything else lives in ``<section><ext>``.
+    """
+
+    def __init__(self, directory: str, partition_by_month: bool = False,
+                 fsync: bool = True):
+        self._directory = directory
+        self._partition_by_month = partition_by_month
+        self._fsync = fsync
+        # section -> partition key -> records; None until laid out
+        self._partitions: Dict[str, Optional[Dict[str, list]]] = {}
+        # section -> (main list, length already placed in partitions)
+        self._placed: Dict[str, tuple] = {}
+        # section -> files currently holding that section
+        self._files: Dict[str, Set[str]] = {}
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def exists(self) -> bool:
+        """Whether the directory holds any section files yet"""
+        return bool(os.path.isdir(self._directory) and
+                    any(not name.startswith('.') for name in os.listdir(self._directory)))
+
+    def partition_key(self, section: str, entity) -> str:
+        """Partition a record belongs to ('' for unpartitioned sections)"""
+        if self._is_partitioned(section):
+            return MONTHLY_PARTITIONS[section](entity)
+        return ""
+
+    # ==================== LOADING ====================
+
+    def section_files(self, section: str) -> Dict[str, str]:
+        """Map partition key -> path of every file on disk for a section"""
+        files = {}
+        if not os.path.isdir(self._directory):
+            return files
+        for name in os.listdir(self._directory):
+            stem, _ = os.path.splitext(name)
+            if stem == section:
+                files[""] = os.path.join(self._directory, name)
+            elif stem.startswith(section + "-"):
+                files[stem[len(section) + 1:]] = os.path.join(self._directory, name)
+        return files
+
+    def load_section(self, serializer: Serializer, section: str) -> list:
+        """Load every file of one section, in partition order"""
+        files = self.section_files(section)
+        entities = []
+        partitions: Optional[Dict[str, list]] = {}
+        for key in sorted(files):
+            with open(files[key], 'rb') as f:
+                raw = f.read()
+            reader = detect_serializer(raw, current=serializer)
+            if reader.encrypted and not serializer.encrypted:
+                raise DecryptionError(f"{files[key]} is encrypted; open the store "
+                                      f"with data_format='encrypted'")
+            records = reader.decode(raw)[section]
+            entities.extend(records)
+            if partitions is not None and self._wants_key(section, key):
+                partitions[key] = records
+            else:
+                # Files were written with another layout; redo it on save
+                partitions = None
+        if partitions is not None and not self._is_partitioned(section):
+            partitions = {"": entities}
+        self._partitions[section] = partitions
+        self._placed[section] = (entities, len(entities))
+        self._files[section] = set(files.values())
+        if partitions is not None:
+            for key, records in partitions.items():
+                serializer.track(f"{section}@{key}", records)
+        return entities
+
+    def _is_partitioned(self, section: str) -> bool:
+        return self._partition_by_month and section in MONTHLY_PARTITIONS
+
+    def _wants_key(self, section: str, key: str) -> bool:
+        return (key != "") == self._is_partitioned(section)
+
+    # ==================== SAVING ====================
+
+    def save(self, serializer: Serializer, sections: Dict[str, list]) -> int:
+        """Rewrite the changed partitions of the given sections; returns bytes written"""
+        os.makedirs(self._directory, exist_ok=True)
+        written = 0
+        for section, entities in sections.items():
+            partitions = self._layout(serializer, section, entities)
+            paths = set()
+            for key, records in partitions.items():
+                path = self._path(serializer, section, key)
+                paths.add(path)
+                missing = path not in self._files.get(section, ())
+                fragments, changed = serializer.section_fragments(
+                    f"{section}@{key}", section, records, force=missing)
+                if changed or missing:
+                    raw = serializer.join({section: fragments})
+                    atomic_write(path, raw, self._fsync)
+                    written += len(raw)
+            for stale in self._files.get(section, set()) - paths:
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            self._files[section] = paths
+        return written
+
+    def _layout(self, serializer: Serializer, section: str,
+                entities: list) -> Dict[str, list]:
+        if not self._is_partitioned(section):
+            # The main list is the only partition
+            self._placed[section] = (entities, len(entities))
+            partitions = self._partitions[section] = {"": entities}
+            return partitions
+
+        partitions = self._partitions.get(section)
+        placed_list, placed = self._placed.get(section, (None, 0))
+        if partitions is None or placed_list is not entities or len(entities) < placed:
+            partitions = {}
+            for entity in entities:
+                partitions.setdefault(self.partition_key(section, entity), []).append(entity)
+        else:
+            for entity in entities[placed:]:
+                partitions.setdefault(self.partition_key(section, entity), []).append(entity)
+            self._move_changed(serializer, section, partitions)
+        self._partitions[section] = partitions
+        self._placed[section] = (entities, len(entities))
+        return partitions
+
+    def _move_changed(self, serializer: Serializer, section: str,
+                      partitions: Dict[str, list]):
+        """Move dirty records whose date now falls into another partition"""
+        for key in list(partitions):
+            for entity in serializer.pending(f"{section}@{key}"):
+                new_key = self.partition_key(section, entity)
+                if new_key != key and entity in partitions[key]:
+                    partitions[key].remove(entity)
+                    partitions.setdefault(new_key, []).append(entity)
+
+    def _path(self, serializer: Serializer, section: str, key: str) -> str:
+        stem = f"{section}-{key}" if key else section
+        return os.path.join(self._directory, stem + serializer.extension)
+
+    def partition_counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of records per partition of every laid-out section"""
+        return {section: {key: len(records) for key, records in partitions.items()}
+                for section, partitions in self._partitions.items() if partitions}
@@ -0,0 +1,106 @@
+"""
+Table rows and dashboard figures for the GUI, kept current from the change feed
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from events import ChangeEvent
+
+
+# Columns shown per section, and how a record fills them
+COLUMNS = {
+    'patients': ("ID", "Name", "Age", "Gender", "Disease", "Admitted"),
+    'doctors': ("ID", "Name", "Specialty", "Availability", "Contact"),
+    'appointments': ("Appt ID", "Pat ID", "Doc ID", "Date", "Status"),
+    'bills': ("Bill ID", "Pat ID", "Date", "Total", "Status")
+}
+ROWS: Dict[str, Callable[[object], tuple]] = {
+    'patients': lambda p: (p.person_id, p.name, p.age, p.gender, p.disease, p.admission_date),
+    'doctors': lambda d: (d.person_id, d.name, d.specialization, d.availability, d.contact),
+    'appointments': lambda a: (a.appointment_id, a.patient_id, a.doctor_id, a.date, a.status),
+    'bills': lambda b: (b.bill_id, b.patient_id, b.date, f"${b.total}", b.payment_status)
+}
+# Operations after which a record is no longer listed
+_REMOVALS = ('delete', 'archive', 'purge')
+
+
+class ViewModel:
+    """What the GUI tables and dashboard show, and what changed since they were drawn.
+
+    Tables start from `rows(section)`; after that the view only applies
+    `take_changes()`: the records touched since the last call, as a row
+    to insert or update, or None for one to remove. Several changes to a
+    record between two calls come out as one. Sections are only tracked
+    once `watch`ed, so tabs never opened cost nothing, and the dashboard
+    statistics are only recomputed when asked for after a change.
+    """
+
+    def __init__(self, system):
+        self._system = system
+        self._getters = {'patients': system.get_patient, 'doctors': system.get_doctor,
+                         'appointments': system.get_appointment, 'bills': system.get_bill}
+        self._lock = threading.Lock()
+        self._watched = set()
+        # section -> record id -> last operation seen
+        self._pending: Dict[str, Dict[int, str]] = {}
+        self._statistics: Optional[dict] = None
+        self._token = system.subscribe(self._on_change)
+
+    def close(self):
+        self._system.unsubscribe(self._token)
+
+    def watch(self, section: str):
+        """Start tracking a section's changes, e.g. when its tab is first built"""
+        with self._lock:
+            self._watched.add(section)
+
+    def rows(self, section: str) -> List[tuple]:
+        """Every row of a section's table, in id order"""
+        with self._lock:
+            self._pending.pop(section, None)
+        listing = {'patients': self._system.get_all_patients,
+                   'doctors': self._system.get_all_doctors,
+                   'appointments': self._system.get_all_appointments,
+                   'bills': self._system.get_all_bills}[section]
+        row = ROWS[section]
+        return [row(record) for record in listing()]
+
+    def take_changes(self) -> Dict[str, List[Tuple[int, Optional[tuple]]]]:
+        """(record id, new row or None if removed) per watched section"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        changes = {}
+        for section, operations in pending.items():
+            getter = self._getters[section]
+            row = ROWS[section]
+            updates = []
+            for record_id, operation in operations.items():
+                record = None if operation in _REMOVALS else getter(record_id)
+                if record is None or record.is_deleted:
+                    updates.append((record_id, None))
+                else:
+                    updates.append((record_id, row(record)))
+            changes[section] = updates
+        return changes
+
+    def statistics(self) -> dict:
+        """get_statistics(), recomputed only after something changed"""
+        statistics = self._statistics
+        if statistics is None:
+            statistics = self._statistics = self._system.get_statistics()
+        return statistics
+
+    @property
+    def statistics_stale(self) -> bool:
+        return self._statistics is None
+
+    def _on_change(self, event: ChangeEvent):
+        # Called on the thread making the change; only notes what to redraw
+        self._statistics = None
+        if event.section not in self._watched:
+            return
+        with self._lock:
+            # Ids keep the order they were first touched in, so new rows
+            # come out in id order
+            self._pending.setdefault(event.section, {})[event.record_id] = event.operation